@@ -10,7 +10,8 @@ parser = argparse.ArgumentParser(description='Run data loading for NVF')
 parser.add_argument(
     'task',
     type=str,
-    choices=['dates', 'dimdata', 'precincts', 'transform', 'load', 'history'],
+    choices=['dates', 'dimdata', 'precincts', 'transform', 'load', 'stream',
+             'history'],
     help='Designates what action will be run by the loader'
 )
 
@@ -48,6 +49,27 @@ parser.add_argument(
     help='If running load command, the key for the associated reporter'
 )
 
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=1,
+    help='If running stream command, the number of processes transforming and copying rows'
+)
+
+parser.add_argument(
+    '--copy_format',
+    choices=['binary', 'text'],
+    default='binary',
+    help='If running stream command, the COPY format rows are sent in'
+)
+
+parser.add_argument(
+    '--merge_voters',
+    action='store_true',
+    help='If running load command, work out voter versions by merging the '
+         'sorted file with VOTER_DIM instead of in SQL'
+)
+
 
 # Docker setup for local dev
 def populate_date_dim(opts, conf):
@@ -132,12 +154,14 @@ def run_transformer(opts, conf):
                                            state_path,
                                            state.transformer,
                                            state_transformer)
-    writer = CsvOutput(state_transformer)
+    writer = CsvOutput(state_transformer, dimensions=True)
     writer(state_preparer.process(), output_path)
 
 
 def load_data(opts, conf):
     from national_voter_file.us_states.all import load as load_states
+    from national_voter_file.transformers.dimensions import dimension_paths
+    from national_voter_file.transformers.postgres_output import load_csv
 
     if not opts.input_file:
         state = load_states([opts.state])[0]
@@ -149,14 +173,36 @@ def load_data(opts, conf):
     else:
         opts.input_file = os.path.join(conf['data_path'], opts.input_file)
 
-    subprocess.check_call([
-        os.path.join(conf['pdi_path'], 'kitchen.sh'),
-        '-file', os.path.join(conf['nvf_path'], 'src', 'main', 'pdi', 'ProcessPreparedVoterFile.kjb'),
-        '-param:reportDate={}'.format(opts.report_date),
-        '-param:reportFile={}'.format(opts.input_file),
-        # TODO: Should there be a default reporter by state if not specified?
-        '-param:reporterKey={}'.format(opts.reporter_key)
-    ])
+    # Written next to the output by transform, but not by older runs
+    paths = dict((name, path) for name, path in
+                 dimension_paths(opts.input_file).items()
+                 if os.path.exists(path))
+    load_csv(opts.input_file, conf['dsn'], opts.report_date, opts.reporter_key,
+             dimension_paths=paths, merge_voters=opts.merge_voters)
+
+
+# Transforms and loads without writing an output file in between
+def stream_data(opts, conf):
+    from national_voter_file.transformers.base import BasePreparer
+    from national_voter_file.us_states.all import load as load_states
+    from national_voter_file.transformers.postgres_output import PostgresOutput
+
+    state = load_states([opts.state])[0]
+    state_path = state.transformer.StatePreparer.state_path
+    input_path = os.path.join(conf['data_path'], opts.input_file)
+
+    state_transformer = state.transformer.StateTransformer()
+    state_preparer = getattr(state.transformer,
+                             'StatePreparer',
+                             BasePreparer)(input_path,
+                                           state_path,
+                                           state.transformer,
+                                           state_transformer)
+    workers = opts.workers if state_transformer.parallel_safe else 1
+    writer = PostgresOutput(state_transformer, opts.report_date,
+                            opts.reporter_key, workers=workers,
+                            copy_format=opts.copy_format)
+    writer(state_preparer.process(), conf['dsn'])
 
 
 if __name__ == '__main__':
@@ -168,10 +214,15 @@ if __name__ == '__main__':
     if opts.task != 'dates' and opts.state is None:
         raise Exception('--state is required for tasks other than "dates"')
 
+    if opts.task in ('load', 'stream') and opts.reporter_key is None:
+        raise Exception('--reporter_key is required for "{}"'.format(opts.task))
+
     opts.state = opts.state.lower() if opts.state is not None else None
 
     if opts.task == 'load':
         load_data(opts, conf)
+    elif opts.task == 'stream':
+        stream_data(opts, conf)
     elif opts.task == 'transform':
         run_transformer(opts, conf)
     elif opts.task == 'precincts':
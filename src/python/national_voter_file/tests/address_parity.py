@@ -0,0 +1,124 @@
+"""
+Reports how often fast_address.fast_tag agrees with usaddress on the
+address columns of the Faker schemas in faker_data.py, and on addresses with
+every USPS street type, directional and a few unit types, which Faker rarely
+makes ('6455 MAPLE ISLANDS EAST LOT 9').
+
+For each column, "fast path" is the share of (non-empty) addresses fast_tag
+handled itself and "agreement" the share of those where it returned exactly what
+usaddress does (same labels, values and address type).
+
+Usage: python -m national_voter_file.tests.address_parity [NUM_SAMPLES]
+"""
+import re
+import sys
+import random
+
+import usaddress
+
+from national_voter_file.tests import faker_data
+from national_voter_file.transformers.fast_address import fast_tag
+from national_voter_file.transformers.usps import (DIRECTIONALS,
+                                                   STREET_SUFFIXES)
+
+ADDRESS_COL = re.compile(r'addr|street|mail\d|apt', re.IGNORECASE)
+NOT_ADDRESS_COL = re.compile(r'city|state|zip|email|num|dir|type|name',
+                             re.IGNORECASE)
+UNIT_TYPES = ['APT', 'STE', 'UNIT', 'LOT', '#']
+
+
+def street_type_address():
+    """
+    Returns '<number> <name> <type> [directional] [unit]' with any of the
+    USPS street types and directionals
+    """
+    parts = [str(random.randint(1, 99999)), faker_data.fake.last_name().upper(),
+             random.choice(sorted(STREET_SUFFIXES))]
+    if random.random() < 0.5:
+        parts.append(random.choice(sorted(DIRECTIONALS)))
+    if random.random() < 0.4:
+        parts += [random.choice(UNIT_TYPES), str(random.randint(1, 999))]
+    return ' '.join(parts)
+
+
+def address_corpora():
+    """
+    Yields (corpus name, address generator) from faker_data's schemas, then
+    street_type_address
+    """
+    for schema_name in sorted(dir(faker_data)):
+        if not schema_name.endswith('_SCHEMA'):
+            continue
+        schema = getattr(faker_data, schema_name)
+        for col in sorted(schema):
+            if ADDRESS_COL.search(col) and not NOT_ADDRESS_COL.search(col):
+                yield '{}.{}'.format(schema_name, col), schema[col]
+    yield 'street_type_address', street_type_address
+
+
+def usaddress_tag(address_str):
+    """BaseTransformer.usaddress_tag without fast_tag or caching"""
+    try:
+        usaddress_dict = usaddress.tag(address_str)[0]
+    except usaddress.RepeatedLabelError:
+        return None, None
+    if 'USPSBoxID' in usaddress_dict:
+        return usaddress_dict, 'PO Box'
+    return usaddress_dict, 'Street Address'
+
+
+def run_parity(num_samples=1000, seed=0):
+    """
+    Returns [(corpus name, samples, fast path count, agreement count,
+    example disagreements)] for each address corpus
+    """
+    random.seed(seed)
+    if hasattr(faker_data.fake, 'seed_instance'):
+        faker_data.fake.seed_instance(seed)
+    else:
+        faker_data.fake.seed(seed)
+    results = []
+    for name, generate in address_corpora():
+        samples = handled = agreed = 0
+        disagreements = []
+        for _ in range(num_samples):
+            address_str = generate().strip()
+            if not address_str:
+                continue
+            samples += 1
+            tagged = fast_tag(address_str)
+            if tagged is None:
+                continue
+            handled += 1
+            expected = usaddress_tag(address_str)
+            if (list(tagged[0].items()), tagged[1]) == \
+                    (list((expected[0] or {}).items()), expected[1]):
+                agreed += 1
+            elif len(disagreements) < 3:
+                disagreements.append((address_str, tagged, expected))
+        results.append((name, samples, handled, agreed, disagreements))
+    return results
+
+
+def main(num_samples=1000):
+    results = run_parity(num_samples)
+    print('{:<50} {:>10} {:>10}'.format('corpus', 'fast path', 'agreement'))
+    total_samples = total_handled = total_agreed = 0
+    for name, samples, handled, agreed, disagreements in results:
+        print('{:<50} {:>10.1%} {:>10.1%}'.format(
+            name, handled / samples if samples else 0,
+            agreed / handled if handled else 1))
+        for address_str, tagged, expected in disagreements:
+            print('    {!r}\n        fast_tag:  {}\n        usaddress: {}'.format(
+                address_str, list(tagged[0].items()),
+                list((expected[0] or {}).items())))
+        total_samples += samples
+        total_handled += handled
+        total_agreed += agreed
+    print('{:<50} {:>10.1%} {:>10.1%}'.format(
+        'total', total_handled / total_samples,
+        total_agreed / total_handled if total_handled else 1))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,49 @@
+"""
+Compares datetime.strptime with dates.DateParser for each date format used by
+the state transformers. "parse" is DateParser without the memo table (every
+string is new), "memo" is with every string already seen.
+
+Usage: python -m national_voter_file.tests.benchmark_dates [NUM_DATES]
+"""
+import sys
+import timeit
+import datetime
+
+from national_voter_file.transformers.dates import DateParser
+
+DATE_FORMATS = ['%m/%d/%Y', '%Y%m%d', '%m%d%Y', '%Y-%m-%d']
+
+
+def benchmark(date_format, num_dates=10000):
+    """Returns the microseconds per date for strptime, parse and memo"""
+    dates = [
+        (datetime.date(1920, 1, 1) + datetime.timedelta(days)).strftime(date_format)
+        for days in range(num_dates)
+    ]
+    parser = DateParser(date_format, max_memo=num_dates)
+    for date_str in dates:
+        parser(date_str)
+
+    def per_date(func):
+        return min(timeit.repeat(lambda: [func(d) for d in dates],
+                                 number=1, repeat=3)) / num_dates * 1e6
+
+    return (
+        per_date(lambda d: datetime.datetime.strptime(d, date_format).date()),
+        per_date(parser.parse),
+        per_date(parser),
+    )
+
+
+def main(num_dates=10000):
+    print('{:<10} {:>12} {:>12} {:>12} {:>10}'.format(
+        'format', 'strptime us', 'parse us', 'memo us', 'speedup'))
+    for date_format in DATE_FORMATS:
+        strptime_us, parse_us, memo_us = benchmark(date_format, num_dates)
+        print('{:<10} {:>12.2f} {:>12.2f} {:>12.2f} {:>7.1f}x/{:.1f}x'.format(
+            date_format, strptime_us, parse_us, memo_us,
+            strptime_us / parse_us, strptime_us / memo_us))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,315 @@
+"""
+Times the StatePreparer, StateTransformer and CsvOutput of every state in
+test_transformers.TEST_STATES on input files of 10,000, 100,000 and 1,000,000
+rows, made by synthetic_data.py in each state's own layout. Each state and
+size runs in a new process, which records:
+
+- read_seconds: reading the input with the state preparer alone
+- seconds and rows_per_second: the whole csv run, reading, transforming,
+  validating and writing
+- peak_rss_mb: the most memory the process used (and its workers, with
+  --workers)
+- steps: estimated seconds of each transformer step and writing, from a
+  profiling.Profiler timing every --profile-every rows
+- rejected: rows that failed, which are counted rather than stopping the run.
+  A run with more than MAX_REJECTED of its rows rejected mostly times
+  exceptions, so --compare doesn't report regressions against it.
+
+Inputs are made once in --corpus-dir and reused while it's kept. Results are
+written as JSON with the commit they were run on, and --compare prints how
+two of them differ, exiting with 1 if any state is slower than --threshold
+allows.
+
+Usage:
+    python -m national_voter_file.tests.benchmark_states [--rows 10000,100000]
+        [--states co,mi] [--corpus-dir DIR] [--output RESULTS_PATH]
+    python -m national_voter_file.tests.benchmark_states --compare OLD NEW
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import shutil
+import tempfile
+import subprocess
+import multiprocessing
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.profiling import Profiler
+from national_voter_file.transformers.rejects import (RejectWriter,
+                                                      rejects_path)
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_STATES
+
+ROW_COUNTS = [10000, 100000, 1000000]
+MAX_REJECTED = 0.01
+
+parser = argparse.ArgumentParser(
+    description='Benchmark the transformer of each state'
+)
+parser.add_argument('--rows',
+                    dest='rows', default=','.join(map(str, ROW_COUNTS)),
+                    help='comma-separated numbers of rows to benchmark each '
+                         'state on (default is {})'.format(
+                             ','.join(map(str, ROW_COUNTS))))
+parser.add_argument('--states',
+                    dest='states',
+                    default=','.join(sorted(x.lower() for x in TEST_STATES.values())),
+                    help='comma-separated list of states to benchmark '
+                         '(default is every state in TEST_STATES)')
+parser.add_argument('--corpus-dir',
+                    dest='corpus_dir', default=None,
+                    help='directory to keep the generated input files in and '
+                         'reuse them from (default is a temporary directory)')
+parser.add_argument('-w', '--workers',
+                    dest='workers', default=1, type=int,
+                    help='worker processes transforming rows (default is 1)')
+parser.add_argument('--profile-every',
+                    dest='profile_every', default=100, type=int,
+                    help='rows between the rows whose steps are timed '
+                         '(default is 100)')
+parser.add_argument('-o', '--output',
+                    dest='output_path', default=None,
+                    help='where to write the results (default is '
+                         'benchmark_states_<commit>.json)')
+parser.add_argument('--compare',
+                    dest='compare', nargs=2, default=None,
+                    metavar=('OLD_RESULTS', 'NEW_RESULTS'),
+                    help='compare two results files instead of benchmarking')
+parser.add_argument('--threshold',
+                    dest='threshold', default=0.1, type=float,
+                    help='slowdown in rows per second that --compare reports '
+                         'as a regression (default is 0.1, 10%%)')
+
+
+def corpus_path(corpus_dir, state, num_rows, workers=1):
+    """Returns the input file of num_rows rows for state, making it first"""
+    # Imported here so --compare doesn't need Faker
+    from national_voter_file.tests import synthetic_data
+
+    rows_dir = os.path.join(corpus_dir, str(num_rows))
+    path = synthetic_data.input_path(state, rows_dir)
+    if not os.path.exists(path):
+        os.makedirs(rows_dir, exist_ok=True)
+        # Made in a directory of its own so an interrupted run doesn't leave
+        # a short file behind to be reused
+        new_dir = tempfile.mkdtemp(dir=rows_dir)
+        synthetic_data.write_state(state, new_dir, num_rows, workers=workers)
+        shutil.rmtree(os.path.join(rows_dir, state), ignore_errors=True)
+        os.replace(os.path.join(new_dir, state), os.path.join(rows_dir, state))
+        os.rmdir(new_dir)
+    return path
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    if who == resource.RUSAGE_SELF:
+        # A new process keeps the ru_maxrss of the one that started it, which
+        # made the corpora, so on Linux this process's own peak is read from
+        # VmHWM instead
+        try:
+            with open('/proc/self/status') as status_file:
+                for line in status_file:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def run_state(state, input_path, workers=1, profile_every=100):
+    """Benchmarks state on input_path, returning its results"""
+    transformer = load_states([state])[0].transformer
+
+    def state_preparer(state_transformer):
+        return transformer.StatePreparer(input_path,
+                                         transformer.StatePreparer.state_path,
+                                         transformer, state_transformer)
+
+    start = time.perf_counter()
+    num_rows = sum(1 for _ in state_preparer(
+        transformer.StateTransformer()
+    ).process())
+    read_seconds = time.perf_counter() - start
+
+    state_transformer = transformer.StateTransformer()
+    state_transformer.profiler = Profiler(sample_every=profile_every)
+    if not state_transformer.parallel_safe:
+        workers = 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, '{}_output.csv'.format(state))
+        rejects = RejectWriter(rejects_path(output_path))
+        rejects.open()
+        start = time.perf_counter()
+        try:
+            CsvOutput(state_transformer, workers=workers, rejects=rejects)(
+                state_preparer(state_transformer).process(), output_path
+            )
+        finally:
+            rejects.close()
+        seconds = time.perf_counter() - start
+        output_bytes = os.path.getsize(output_path)
+
+    report = state_transformer.profiler.report()
+    return {
+        'state': state,
+        'rows': num_rows,
+        'workers': workers,
+        'read_seconds': read_seconds,
+        'seconds': seconds,
+        'rows_per_second': num_rows / seconds if seconds else 0,
+        'output_bytes': output_bytes,
+        'rejected': sum(rejects.errors.values()),
+        'peak_rss_mb': max(peak_rss_mb(),
+                           peak_rss_mb(resource.RUSAGE_CHILDREN)),
+        'steps': {name: step['estimated_seconds']
+                  for name, step in report['steps'].items()},
+    }
+
+
+def _send_result(conn, func, args):
+    try:
+        # Transformers print a warning for every odd row
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            result = func(*args)
+        conn.send((result, None))
+    except Exception as err:
+        conn.send((None, err))
+    conn.close()
+
+
+def in_new_process(func, *args):
+    """
+    Returns func(*args) run in a new process, so memory used by one run
+    doesn't count towards the next
+    """
+    context = multiprocessing.get_context('spawn')
+    recv_conn, send_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_send_result,
+                              args=(send_conn, func, args))
+    process.start()
+    send_conn.close()
+    result, err = recv_conn.recv()
+    process.join()
+    if err is not None:
+        raise err
+    return result
+
+
+def benchmark(states, row_counts, corpus_dir, workers=1, profile_every=100):
+    """Yields the results of each state on each number of rows"""
+    for num_rows in row_counts:
+        for state in states:
+            input_path = corpus_path(corpus_dir, state, num_rows, workers)
+            yield in_new_process(run_state, state, input_path, workers,
+                                 profile_every)
+
+
+def git_commit():
+    """Returns the commit being benchmarked, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def too_many_rejected(result):
+    """Whether more than MAX_REJECTED of a run's rows were rejected"""
+    return result['rejected'] > result['rows'] * MAX_REJECTED
+
+
+def compare(old, new, threshold=0.1):
+    """
+    Yields (state, rows, old result, new result, regressed) for the runs in
+    both results. Runs with too many rejected rows never regress.
+    """
+    old_results = {(r['state'], r['rows']): r for r in old['results']}
+    for result in new['results']:
+        old_result = old_results.get((result['state'], result['rows']))
+        if old_result is None:
+            continue
+        regressed = (result['rows_per_second'] <
+                     old_result['rows_per_second'] * (1 - threshold) and
+                     not too_many_rejected(old_result) and
+                     not too_many_rejected(result))
+        yield result['state'], result['rows'], old_result, result, regressed
+
+
+def print_comparison(old_path, new_path, threshold=0.1):
+    """Prints the comparison of two results files, returning the regressions"""
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+    print('{} -> {}'.format(old.get('commit'), new.get('commit')))
+    print('{:<6} {:>9} {:>12} {:>12} {:>8} {:>10} {:>10}'.format(
+        'state', 'rows', 'old rows/s', 'new rows/s', 'change',
+        'old MB', 'new MB'))
+    regressions = []
+    for state, rows, old_result, new_result, regressed in compare(
+            old, new, threshold):
+        change = (new_result['rows_per_second'] /
+                  old_result['rows_per_second'] - 1
+                  if old_result['rows_per_second'] else 0)
+        note = ''
+        if regressed:
+            note = '  REGRESSION'
+        elif too_many_rejected(old_result) or too_many_rejected(new_result):
+            note = '  TOO MANY REJECTED'
+        print('{:<6} {:>9} {:>12.0f} {:>12.0f} {:>+8.1%} {:>10.1f} {:>10.1f}{}'.format(
+            state, rows, old_result['rows_per_second'],
+            new_result['rows_per_second'], change, old_result['peak_rss_mb'],
+            new_result['peak_rss_mb'], note))
+        if regressed:
+            regressions.append((state, rows))
+    return regressions
+
+
+def main():
+    args = parser.parse_args()
+    if args.compare:
+        regressions = print_comparison(*args.compare,
+                                       threshold=args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    commit = git_commit()
+    output_path = args.output_path or 'benchmark_states_{}.json'.format(
+        commit or 'results'
+    )
+    results = {
+        'commit': commit,
+        'created': datetime.now().replace(microsecond=0).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'profile_every': args.profile_every,
+        'results': [],
+    }
+    row_counts = [int(rows) for rows in args.rows.split(',')]
+    states = args.states.split(',')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print('{:<6} {:>9} {:>10} {:>10} {:>12} {:>10} {:>9}'.format(
+            'state', 'rows', 'read s', 'total s', 'rows/s', 'peak MB',
+            'rejected'))
+        for result in benchmark(states, row_counts, args.corpus_dir or tmp_dir,
+                                args.workers, args.profile_every):
+            print('{:<6} {:>9} {:>10.2f} {:>10.2f} {:>12.0f} {:>10.1f} {:>9}'.format(
+                result['state'], result['rows'], result['read_seconds'],
+                result['seconds'], result['rows_per_second'],
+                result['peak_rss_mb'], result['rejected']))
+            results['results'].append(result)
+            # Written after every run so a long benchmark can be stopped
+            with open(output_path, 'w') as output_file:
+                json.dump(results, output_file, indent=2, sort_keys=True)
+    print('Wrote {}'.format(output_path))
+
+
+if __name__ == '__main__':
+    main()
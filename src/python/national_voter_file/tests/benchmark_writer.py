@@ -0,0 +1,94 @@
+"""
+Compares csv.DictWriter with csv_transformer.RowWriter on the output rows of
+every state in test_transformers.TEST_STATES, repeated to NUM_ROWS rows.
+Rows are transformed and validated once up front, so only writing is timed.
+
+Usage: python -m national_voter_file.tests.benchmark_writer [NUM_ROWS]
+"""
+import os
+import csv
+import sys
+import time
+import tempfile
+from itertools import cycle, islice
+
+from national_voter_file.transformers.base import BasePreparer, BaseTransformer
+from national_voter_file.transformers.csv_transformer import RowWriter
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import (TEST_DATA_DIR,
+                                                         TEST_STATES)
+
+
+def output_rows():
+    """Returns the validated output dicts for the test data of every state"""
+    rows = []
+    for state_test in load_states([x.lower() for x in TEST_STATES.values()]):
+        state_path = state_test.transformer.StatePreparer.state_path
+        input_path = os.path.join(TEST_DATA_DIR, '{}.csv'.format(state_path))
+        state_transformer = state_test.transformer.StateTransformer()
+        state_preparer = getattr(state_test.transformer,
+                                 'StatePreparer',
+                                 BasePreparer)(input_path,
+                                               state_path,
+                                               state_test.transformer,
+                                               state_transformer)
+        validate_output_row = state_transformer.output_validator()
+        for input_dict in state_preparer.process():
+            output_dict = state_transformer.fix_missing_mailing_addr(
+                state_transformer.process_row(input_dict)
+            )
+            validate_output_row(output_dict)
+            rows.append(output_dict)
+    return rows
+
+
+def dict_writer(outfile, fieldnames, rows):
+    # What CsvOutput did before RowWriter
+    writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def row_writer(outfile, fieldnames, rows, **kwargs):
+    writer = RowWriter(outfile, fieldnames, **kwargs)
+    writer.writeheader()
+    for i in range(0, len(rows), 1000):
+        writer.writerows(rows[i:i + 1000])
+
+
+def benchmark(num_rows=200000):
+    """Yields the name, seconds and rows per second of each writer"""
+    fieldnames = sorted(BaseTransformer.col_type_dict)
+    rows = list(islice(cycle(output_rows()), num_rows))
+    record_type = BaseTransformer.output_validator().record_type
+    records = [record_type.from_dict(row) for row in rows]
+    writers = [
+        ('DictWriter', dict_writer, rows, {}),
+        ('RowWriter dicts', row_writer, rows, {}),
+        ('RowWriter records', row_writer, records, {}),
+        ('RowWriter \\N, lf', row_writer, records,
+         {'null': '\\N', 'line_terminator': '\n'}),
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'output.csv')
+        for name, write, write_rows, kwargs in writers:
+            seconds = float('inf')
+            for _ in range(3):
+                with open(output_path, 'w', buffering=1 << 20,
+                          newline='') as outfile:
+                    start = time.perf_counter()
+                    write(outfile, fieldnames, write_rows, **kwargs)
+                    seconds = min(seconds, time.perf_counter() - start)
+            yield name, seconds, num_rows / seconds
+
+
+def main(num_rows=200000):
+    print('{:<20} {:>10} {:>12}'.format('writer', 'seconds', 'rows/s'))
+    for name, seconds, rows_per_second in benchmark(num_rows):
+        print('{:<20} {:>10.2f} {:>12.0f}'.format(name, seconds,
+                                                  rows_per_second))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
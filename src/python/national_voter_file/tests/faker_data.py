@@ -889,63 +889,65 @@ for d in range(1,40):
 
 
 def make_state_data(state_name, state_schema,
-                    sep=',', has_header=True, input_fields=None):
-    state_rows = []
-    while len(state_rows) < NUM_ROWS:
-        r  = {}
-        for k in state_schema.keys():
-            r[k] = state_schema[k]()
-        state_rows.append(r)
-
+                    sep=',', has_header=True, input_fields=None,
+                    num_rows=NUM_ROWS, data_dir=TEST_DATA_DIR):
+    # Rows are written as they're made so num_rows can be far more than fit
+    # in memory
     if input_fields is None:
-        input_fields = state_rows[0].keys()
+        input_fields = list(state_schema.keys())
 
-    with open(os.path.join(TEST_DATA_DIR, state_name + '.csv'), 'w') as f:
+    with open(os.path.join(data_dir, state_name + '.csv'), 'w') as f:
         w = csv.DictWriter(f, fieldnames=input_fields, delimiter=sep)
         if has_header:
             w.writeheader()
-        w.writerows(state_rows)
+        for _ in range(num_rows):
+            r = {}
+            for k in state_schema.keys():
+                r[k] = state_schema[k]()
+            w.writerow(r)
 
 
-if __name__ == '__main__':
-    states = {'de': ([DELAWARE_SCHEMA],
-                       {}),
+# Schema and make_state_data arguments of each state's test data
+STATE_DATA = {'de': ([DELAWARE_SCHEMA],
+                     {}),
               'co': ([COLORADO_SCHEMA],
-                       {}),
+                     {}),
               'oh': ([OHIO_SCHEMA],
-                       {}),
+                     {}),
               'ok': ([OKLAHOMA_SCHEMA],
-                       {'has_header': False,
-                        'input_fields': OKLAHOMA_FIELDS}),
+                     {'input_fields': OKLAHOMA_FIELDS}),
               'fl': ([FLORIDA_SCHEMA],
-                          {'sep': '\t',
-                           'has_header': False,
-                           'input_fields': FLORIDA_FIELDS}),
+                     {'sep': '\t',
+                      'has_header': False,
+                      'input_fields': FLORIDA_FIELDS}),
               'nj': ([NEW_JERSEY_SCHEMA],
-                          {'sep' : '|',
-                           'has_header' : False,
-                           'input_fields' : NEW_JERSEY_FIELDS}),
+                     {'sep' : '|',
+                      'has_header' : False,
+                      'input_fields' : NEW_JERSEY_FIELDS}),
               'ny': ([NEW_YORK_SCHEMA],
-                           {'has_header': False,
-                            'input_fields': NEW_YORK_FIELDS}),
+                     {'has_header': False,
+                      'input_fields': NEW_YORK_FIELDS}),
               'nc': ([NORTH_CAROLINA_SCHEMA],
-                                 {'sep':'\t'}),
+                     {'sep':'\t'}),
               'pa': ([PENNSYLVANIA_SCHEMA],
-                               {'sep':'\t',
-                                'has_header': False,
-                                'input_fields': PA.transformer.StateTransformer.input_fields}),
+                     {'sep':'\t',
+                      'has_header': False,
+                      'input_fields': PA.transformer.StateTransformer.input_fields}),
               'mi': ([MICHIGAN_SCHEMA],
-                           {'input_fields': MI.transformer.StateTransformer.input_fields +
-                            ['ELECTION_DATE', 'ELECTION_TYPE', 'ABSENTEE_TYPE']}),
+                     {'input_fields': MI.transformer.StateTransformer.input_fields +
+                      ['ELECTION_DATE', 'ELECTION_TYPE', 'ABSENTEE_TYPE']}),
               'ut': ([UTAH_SCHEMA], {}),
               'vt': ([VERMONT_SCHEMA],
-                                 {'sep':'|'}),
+                     {'sep':'|'}),
               'wa': ([WASHINGTON_SCHEMA],
-                                {'sep':'\t'}),
-    }
-    keys = states.keys()
+                     {'sep':'\t'}),
+}
+
+
+if __name__ == '__main__':
+    keys = STATE_DATA.keys()
     if len(sys.argv) > 1:
         keys = sys.argv[1:]
     for state in keys:
-        args, kwargs = states[state]
+        args, kwargs = STATE_DATA[state]
         make_state_data(state, *args, **kwargs)
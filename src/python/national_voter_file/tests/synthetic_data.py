@@ -0,0 +1,548 @@
+"""
+Writes synthetic voter files of any size in each state's own layout, for
+load testing. faker_data.py calls a Faker function for every cell, which is
+fine for 100 rows of test data but takes hours for millions. Here each
+column of a faker_data schema is sampled once into a pool of --pool-size
+values, and rows are made by picking from the pools in chunks of
+--chunk-rows rows, both across --workers processes, so 10 GB of input takes
+minutes. Voter ids are numbered instead of picked so they're unique.
+
+Each column's pool is sampled with a seed made from --seed and the column,
+and each chunk picks with one made from --seed and where the chunk starts,
+so the same arguments always write the same rows, whatever the number of
+workers.
+
+Files are written to OUTPUT_DIR/<state>/, in the layout the state's
+StatePreparer reads:
+
+- mi: entire_state.zip with the fixed-width entire_state_v.lst, and with
+  --history, entire_state_h.lst and its electionscd.lst election codes
+  (which the preparer reads from DATA_DIR/Michigan/)
+- pa: Statewide.zip with an FVE and a Zone Types file for each of
+  --counties counties
+- co: co_voters.zip with a Registered_Voters_List zip of a csv for every
+  --part-rows rows, and with --history, a gzipped Master_Voting_History_List
+  csv for each
+- other states: their default_file, laid out like their test data
+
+Usage:
+    python -m national_voter_file.tests.synthetic_data -s mi,pa,co
+        -n 10000000 -o OUTPUT_DIR [-w 8] [--seed 0] [--history]
+"""
+import os
+import csv
+import gzip
+import random
+import zipfile
+import argparse
+import tempfile
+import multiprocessing
+from io import StringIO
+from contextlib import contextmanager
+
+from national_voter_file.tests import faker_data
+from national_voter_file.us_states.all import load as load_states
+
+POOL_SIZE = 10000
+CHUNK_ROWS = 100000
+
+# Column of each state's voter ids and how to make the nth one
+VOTER_IDS = {
+    'co': ('VOTER_ID', '{}'),
+    'de': ('UNIQUE-ID', '{}'),
+    'fl': ('Voter ID', '{:010d}'),
+    'mi': ('STATE_VOTER_REF', '{:013d}'),
+    'nc': ('voter_reg_num', '{}'),
+    'nj': ('VOTER ID', '{:09d}'),
+    'ny': ('SBOEID', 'NY{:018d}'),
+    'oh': ('SOS_VOTERID', 'OH{:010d}'),
+    'ok': ('VoterID', '{:09d}'),
+    'pa': ('STATE_VOTER_REF', '{}'),
+    'ut': ('Voter ID', '{}'),
+    'vt': ('VoterID', '{:09d}'),
+    'wa': ('StateVoterID', 'WA{:010d}'),
+}
+
+# Columns the transformer needs that faker_data sometimes leaves blank for
+# the test data, which are never blank here so every row can be transformed
+REQUIRED_COLUMNS = {
+    'co': ['RESIDENTIAL_STATE'],
+    'pa': ['GENDER'],
+    'wa': ['Birthdate', 'Registrationdate', 'RegState'],
+}
+
+# Votes cast by each voter in --history files
+VOTES_PER_VOTER = 3
+
+MI_ELECTIONS = 40
+
+MI_HISTORY_SCHEMA = {
+    'COUNTYCODE': lambda: faker_data.fake.numerify(text='##'),
+    'JURISDICTION': lambda: faker_data.fake.numerify(text='#####'),
+    'SCHOOL_CODE': lambda: faker_data.fake.numerify(text='#####'),
+    'ELECTION_CODE': lambda: str(random.randint(1, MI_ELECTIONS)),
+    'ABSENTEE_TYPE': lambda: random.choice(['Y', 'N']),
+}
+
+CO_HISTORY_SCHEMA = {
+    'COUNTY_NAME': lambda: faker_data.fake.city().upper(),
+    'ELECTION_DATE': lambda: faker_data.fake.date(pattern='%m/%d/%Y'),
+    'ELECTION_TYPE': lambda: random.choice(['General', 'Primary',
+                                            'Coordinated', 'Municipal']),
+    'ELECTION_DESCRIPTION': lambda: '{} {}'.format(
+        faker_data.fake.year(), random.choice(['General', 'Primary'])
+    ),
+    'VOTING_METHOD': lambda: random.choice(['Mail Ballot', 'In Person',
+                                            'Early Voting', 'Polling Place']),
+    'PARTY': lambda: random.choice(list(faker_data.colorado_party_keys)),
+}
+
+PA_COUNTIES = [
+    'ADAMS', 'ALLEGHENY', 'ARMSTRONG', 'BEAVER', 'BEDFORD', 'BERKS', 'BLAIR',
+    'BRADFORD', 'BUCKS', 'BUTLER', 'CAMBRIA', 'CAMERON', 'CARBON', 'CENTRE',
+    'CHESTER', 'CLARION', 'CLEARFIELD', 'CLINTON', 'COLUMBIA', 'CRAWFORD',
+    'CUMBERLAND', 'DAUPHIN', 'DELAWARE', 'ELK', 'ERIE', 'FAYETTE', 'FOREST',
+    'FRANKLIN', 'FULTON', 'GREENE', 'HUNTINGDON', 'INDIANA', 'JEFFERSON',
+    'JUNIATA', 'LACKAWANNA', 'LANCASTER', 'LAWRENCE', 'LEBANON', 'LEHIGH',
+    'LUZERNE', 'LYCOMING', 'MCKEAN', 'MERCER', 'MIFFLIN', 'MONROE',
+    'MONTGOMERY', 'MONTOUR', 'NORTHAMPTON', 'NORTHUMBERLAND', 'PERRY',
+    'PHILADELPHIA', 'PIKE', 'POTTER', 'SCHUYLKILL', 'SNYDER', 'SOMERSET',
+    'SULLIVAN', 'SUSQUEHANNA', 'TIOGA', 'UNION', 'VENANGO', 'WARREN',
+    'WASHINGTON', 'WAYNE', 'WESTMORELAND', 'WYOMING', 'YORK',
+]
+
+# Zone Types rows of every PA county, moving the school district column
+PA_ZONE_TYPES = [(3, 'SD', 'School District'), (1, 'PR', 'Precinct'),
+                 (13, 'PS', 'Precinct Split'), (9, 'CO', 'County')]
+
+PA_FILE_DATE = '20170102'
+
+parser = argparse.ArgumentParser(
+    description='Write synthetic voter files for load testing'
+)
+parser.add_argument('-s', '--states',
+                    dest='states', required=True,
+                    help='comma-separated list of states to write')
+parser.add_argument('-n', '--rows',
+                    dest='rows', required=True, type=int,
+                    help='voters to write for each state')
+parser.add_argument('-o', '--outputdir',
+                    dest='output_dir', required=True,
+                    help='directory to write a directory of each state to')
+parser.add_argument('-w', '--workers',
+                    dest='workers', default=1, type=int,
+                    help='processes making rows (default is 1)')
+parser.add_argument('--seed',
+                    dest='seed', default=0, type=int,
+                    help='seed of the values and rows written (default is 0)')
+parser.add_argument('--pool-size',
+                    dest='pool_size', default=POOL_SIZE, type=int,
+                    help='values sampled for each column (default is '
+                         '{})'.format(POOL_SIZE))
+parser.add_argument('--chunk-rows',
+                    dest='chunk_rows', default=CHUNK_ROWS, type=int,
+                    help='rows made at a time by each process (default is '
+                         '{})'.format(CHUNK_ROWS))
+parser.add_argument('--history',
+                    dest='history', action='store_true',
+                    help='also write vote history files, for mi and co')
+parser.add_argument('--counties',
+                    dest='counties', default=len(PA_COUNTIES), type=int,
+                    help='counties to split pa voters between (default is '
+                         '{})'.format(len(PA_COUNTIES)))
+parser.add_argument('--part-rows',
+                    dest='part_rows', default=1000000, type=int,
+                    help='voters in each part of the co voter file (default '
+                         'is 1000000)')
+
+
+HISTORY_SCHEMAS = {'mi_history': MI_HISTORY_SCHEMA,
+                   'co_history': CO_HISTORY_SCHEMA}
+
+
+def schema(name):
+    """Returns the faker_data schema of a state, or a history schema above"""
+    if name in HISTORY_SCHEMAS:
+        return HISTORY_SCHEMAS[name]
+    return faker_data.STATE_DATA[name][0][0]
+
+
+def _sample_column(args):
+    schema_name, column, pool_size, seed = args
+    # Seeded by column so columns can be sampled in any process
+    column_seed = '{}:{}:{}'.format(seed, schema_name, column)
+    faker_data.fake.seed_instance(column_seed)
+    random.seed(column_seed)
+    make = schema(schema_name)[column]
+    if column not in REQUIRED_COLUMNS.get(schema_name, []):
+        return [make() for _ in range(pool_size)]
+    pool = []
+    while len(pool) < pool_size:
+        value = make()
+        if value.strip():
+            pool.append(value)
+    return pool
+
+
+def csv_field(value, sep):
+    """Returns value as it's written in a csv file delimited by sep"""
+    line = StringIO()
+    csv.writer(line, delimiter=sep, lineterminator='').writerow([value])
+    return line.getvalue()
+
+
+class Layout(object):
+    """
+    How to make the lines of a file. Each field's values are picked from its
+    pool, except for the id field, which is numbered: the nth row's id is
+    id_format.format(n // rows_per_id + 1).
+
+    Values are written separated by sep, or with widths, padded to their
+    width with no separator. Pools are escaped or padded up front, so making
+    a line is only a join.
+    """
+
+    def __init__(self, name, fields, pools, id_field=None, id_format='{}',
+                 rows_per_id=1, sep=',', widths=None):
+        self.name = name
+        self.fields = fields
+        self.id_field = id_field
+        self.id_format = id_format
+        self.rows_per_id = rows_per_id
+        self.sep = '' if widths else sep
+        self.widths = widths
+        self.pools = [self.field_values(i, pools.get(field, ['']))
+                      for i, field in enumerate(fields)]
+
+    def field_values(self, i, values):
+        if self.widths:
+            return [value[:self.widths[i]].ljust(self.widths[i])
+                    for value in values]
+        return [csv_field(value, self.sep) for value in values]
+
+    def header(self):
+        return self.sep.join(csv_field(field, self.sep)
+                             for field in self.fields) + '\n'
+
+    def lines(self, start, num_rows, seed, constants=None):
+        """
+        Returns rows start to start + num_rows as text, with the fields in
+        constants set to the same value on every row
+        """
+        rng = random.Random('{}:{}:{}'.format(seed, self.name, start))
+        constants = constants or {}
+        columns = []
+        for i, field in enumerate(self.fields):
+            if field in constants:
+                columns.append([self.field_values(i, [constants[field]])[0]]
+                               * num_rows)
+            elif field == self.id_field:
+                ids = [self.id_format.format(row // self.rows_per_id + 1)
+                       for row in range(start, start + num_rows)]
+                columns.append(self.field_values(i, ids))
+            else:
+                # What rng.choices does, which needs Python 3.6
+                pool = self.pools[i]
+                pool_size = len(pool)
+                pick = rng.random
+                columns.append([pool[int(pick() * pool_size)]
+                                for _ in range(num_rows)])
+        return ''.join(self.sep.join(row) + '\n' for row in zip(*columns))
+
+
+def fixed_widths(col_indices):
+    """
+    Returns the width of each (start, end) column, cut short where the next
+    column starts before it ends
+    """
+    starts = [start for start, _ in col_indices[1:]] + [None]
+    return [(end if next_start is None else min(end, next_start)) - start
+            for (start, end), next_start in zip(col_indices, starts)]
+
+
+_layouts = {}
+
+
+def _set_layouts(layouts):
+    _layouts.update(layouts)
+
+
+def _chunk_lines(chunk):
+    layout_name, start, num_rows, seed, constants = chunk
+    return _layouts[layout_name].lines(start, num_rows, seed,
+                                       constants).encode('utf-8')
+
+
+class ChunkWriter(object):
+    """
+    Makes the lines of chunks of rows, in order, with worker processes
+    making the chunks after the one being written.
+    """
+
+    def __init__(self, layouts, seed, workers=1, chunk_rows=CHUNK_ROWS):
+        self.layouts = dict((layout.name, layout) for layout in layouts)
+        self.seed = seed
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self._pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._pool = multiprocessing.Pool(self.workers,
+                                              initializer=_set_layouts,
+                                              initargs=(self.layouts,))
+        else:
+            _set_layouts(self.layouts)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def chunks(self, layout, start, num_rows, constants=None):
+        for chunk_start in range(start, start + num_rows, self.chunk_rows):
+            yield (layout.name, chunk_start,
+                   min(self.chunk_rows, start + num_rows - chunk_start),
+                   self.seed, constants)
+
+    def write(self, outfile, layout, start, num_rows, constants=None):
+        """Writes rows start to start + num_rows of layout to outfile"""
+        chunks = self.chunks(layout, start, num_rows, constants)
+        if self._pool is not None:
+            lines = self._pool.imap(_chunk_lines, chunks)
+        else:
+            lines = map(_chunk_lines, chunks)
+        for chunk_lines in lines:
+            outfile.write(chunk_lines)
+
+
+class Generator(object):
+    """
+    Samples pools and writes chunks of rows with the same seed, workers,
+    pool_size and chunk_rows, see the notes above.
+    """
+
+    def __init__(self, seed=0, workers=1, pool_size=POOL_SIZE,
+                 chunk_rows=CHUNK_ROWS):
+        self.seed = seed
+        self.workers = workers
+        self.pool_size = pool_size
+        self.chunk_rows = chunk_rows
+
+    def sample_pools(self, *schema_names):
+        """
+        Returns {schema name: {column: pool}} for the schemas named, with
+        each column's pool sampled by a worker process
+        """
+        columns = [(schema_name, column, self.pool_size, self.seed)
+                   for schema_name in schema_names
+                   for column in schema(schema_name)]
+        if self.workers > 1:
+            with multiprocessing.Pool(self.workers) as pool:
+                column_pools = pool.map(_sample_column, columns)
+        else:
+            column_pools = map(_sample_column, columns)
+        pools = dict((schema_name, {}) for schema_name in schema_names)
+        for (schema_name, column, _, _), column_pool in zip(columns,
+                                                             column_pools):
+            pools[schema_name][column] = column_pool
+        return pools
+
+    def chunk_writer(self, layouts):
+        return ChunkWriter(layouts, self.seed, self.workers, self.chunk_rows)
+
+
+def voter_layout(state, pools, fields=None, **kwargs):
+    """
+    Returns the Layout of state's voters, with the fields faker_data writes
+    unless given
+    """
+    (state_schema,), data_kwargs = faker_data.STATE_DATA[state]
+    fields = fields or data_kwargs.get('input_fields') or list(state_schema)
+    id_field, id_format = VOTER_IDS[state]
+    kwargs.setdefault('sep', data_kwargs.get('sep', ','))
+    return Layout(state, fields, pools, id_field=id_field,
+                  id_format=id_format, **kwargs)
+
+
+@contextmanager
+def zip_member(zip_file, name):
+    """
+    Yields a file that's added to zip_file as name once it's written.
+    ZipFile.open(name, 'w') needs Python 3.6, so it's written next to the
+    zip first.
+    """
+    fd, path = tempfile.mkstemp(dir=os.path.dirname(zip_file.filename))
+    try:
+        with open(fd, 'wb') as member:
+            yield member
+        zip_file.write(path, name)
+    finally:
+        os.remove(path)
+
+
+def write_csv_state(generator, state, state_dir, num_rows, **kwargs):
+    data_kwargs = faker_data.STATE_DATA[state][1]
+    layout = voter_layout(state, generator.sample_pools(state)[state])
+    path = input_path(state, os.path.dirname(state_dir))
+    with generator.chunk_writer([layout]) as chunk_writer, \
+            open(path, 'wb') as outfile:
+        if data_kwargs.get('has_header', True):
+            outfile.write(layout.header().encode('utf-8'))
+        chunk_writer.write(outfile, layout, 0, num_rows)
+    return path
+
+
+def write_mi(generator, state_dir, num_rows, history=False, **kwargs):
+    transformer = load_states(['mi'])[0].transformer
+    preparer = transformer.StatePreparer
+    pools = generator.sample_pools('mi', *(['mi_history'] if history else []))
+    layouts = [voter_layout('mi', pools['mi'],
+                            fields=transformer.StateTransformer.input_fields,
+                            widths=fixed_widths(preparer.col_indices))]
+    if history:
+        layouts.append(Layout(
+            'mi_history', preparer.history_fields, pools['mi_history'],
+            id_field='STATE_VOTER_REF', id_format=VOTER_IDS['mi'][1],
+            rows_per_id=VOTES_PER_VOTER,
+            widths=fixed_widths(preparer.history_indices)
+        ))
+        write_mi_elections(os.path.join(state_dir, 'electionscd.lst'),
+                           preparer.election_indices, generator.seed)
+
+    path = os.path.join(state_dir, STATE_FILES['mi'])
+    with generator.chunk_writer(layouts) as chunk_writer, \
+            zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        with zip_member(zip_file, 'entire_state_v.lst') as member:
+            chunk_writer.write(member, layouts[0], 0, num_rows)
+        if history:
+            with zip_member(zip_file, 'entire_state_h.lst') as member:
+                chunk_writer.write(member, layouts[1], 0,
+                                   num_rows * VOTES_PER_VOTER)
+    return path
+
+
+def write_mi_elections(path, election_indices, seed):
+    """Writes the MI_ELECTIONS election codes of Michigan's vote history"""
+    rng = random.Random(seed)
+    widths = fixed_widths(election_indices)
+    with open(path, 'w') as elections_file:
+        for code in range(1, MI_ELECTIONS + 1):
+            values = [str(code),
+                      '11{:02d}{}'.format(rng.randint(1, 8),
+                                          rng.randint(1980, 2016)),
+                      rng.choice(['GENERAL', 'PRIMARY', 'SPECIAL'])]
+            elections_file.write(''.join(value.ljust(width) for value, width
+                                         in zip(values, widths)) + '\n')
+
+
+def write_pa(generator, state_dir, num_rows, counties=len(PA_COUNTIES),
+             **kwargs):
+    layout = voter_layout('pa', generator.sample_pools('pa')['pa'])
+    counties = PA_COUNTIES[:counties]
+    path = os.path.join(state_dir, STATE_FILES['pa'])
+    with generator.chunk_writer([layout]) as chunk_writer, \
+            zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        start = 0
+        for i, county in enumerate(counties):
+            county_rows = (num_rows * (i + 1)) // len(counties) - start
+            zip_file.writestr(
+                '{} Zone Types {}.txt'.format(county, PA_FILE_DATE),
+                ''.join('{}\t{}\t{}\t{}\n'.format(county, column, prefix,
+                                                   zonetype)
+                        for column, prefix, zonetype in PA_ZONE_TYPES)
+            )
+            with zip_member(zip_file, '{} FVE {}.txt'.format(
+                    county, PA_FILE_DATE)) as member:
+                chunk_writer.write(member, layout, start, county_rows,
+                                   constants={'COUNTYCODE': county})
+            start += county_rows
+    return path
+
+
+def write_co(generator, state_dir, num_rows, history=False,
+             part_rows=1000000, **kwargs):
+    preparer = load_states(['co'])[0].transformer.StatePreparer
+    pools = generator.sample_pools('co', *(['co_history'] if history else []))
+    layouts = [voter_layout('co', pools['co'])]
+    if history:
+        layouts.append(Layout(
+            'co_history', ['VOTER_ID'] + list(CO_HISTORY_SCHEMA),
+            pools['co_history'], id_field='VOTER_ID',
+            id_format=VOTER_IDS['co'][1], rows_per_id=VOTES_PER_VOTER
+        ))
+
+    path = os.path.join(state_dir, STATE_FILES['co'])
+    with generator.chunk_writer(layouts) as chunk_writer, \
+            zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file, \
+            tempfile.TemporaryDirectory(dir=state_dir) as tmp_dir:
+        for part, start in enumerate(range(0, num_rows, part_rows), 1):
+            part_rows_written = min(part_rows, num_rows - start)
+            part_name = '{}_ Part{}'.format(preparer.voter_pre, part)
+            part_path = os.path.join(tmp_dir, part_name + '.zip')
+            # The inner zip is written to disk and copied in, stored as it's
+            # already compressed
+            with zipfile.ZipFile(part_path, 'w',
+                                 zipfile.ZIP_DEFLATED) as part_zip, \
+                    zip_member(part_zip, part_name + '.txt') as member:
+                member.write(layouts[0].header().encode('utf-8'))
+                chunk_writer.write(member, layouts[0], start,
+                                   part_rows_written)
+            zip_file.write(part_path, part_name + '.zip',
+                           compress_type=zipfile.ZIP_STORED)
+            os.remove(part_path)
+
+            if history:
+                history_name = '{}_ Part{}.txt.gz'.format(preparer.hist_pre,
+                                                           part)
+                with zip_member(zip_file, history_name) as member, \
+                        gzip.GzipFile(fileobj=member, mode='wb',
+                                      compresslevel=1, mtime=0) as gz_file:
+                    gz_file.write(layouts[1].header().encode('utf-8'))
+                    chunk_writer.write(gz_file, layouts[1],
+                                       start * VOTES_PER_VOTER,
+                                       part_rows_written * VOTES_PER_VOTER)
+    return path
+
+
+STATE_WRITERS = {'mi': write_mi, 'pa': write_pa, 'co': write_co}
+
+STATE_FILES = {'mi': 'entire_state.zip', 'pa': 'Statewide.zip',
+               'co': 'co_voters.zip'}
+
+
+def input_path(state, output_dir):
+    """Returns the path write_state writes the voters of state to"""
+    return os.path.join(output_dir, state, STATE_FILES.get(state) or
+                        load_states([state])[0].transformer.default_file)
+
+
+def write_state(state, output_dir, num_rows, seed=0, workers=1,
+                pool_size=POOL_SIZE, chunk_rows=CHUNK_ROWS, **kwargs):
+    """
+    Writes num_rows voters of state to output_dir/state/ and returns the
+    path of the file to transform. kwargs are history, counties and
+    part_rows, see the notes above.
+    """
+    state_dir = os.path.join(output_dir, state)
+    os.makedirs(state_dir, exist_ok=True)
+    generator = Generator(seed, workers, pool_size, chunk_rows)
+    if state in STATE_WRITERS:
+        return STATE_WRITERS[state](generator, state_dir, num_rows, **kwargs)
+    return write_csv_state(generator, state, state_dir, num_rows, **kwargs)
+
+
+def main():
+    args = parser.parse_args()
+    for state in args.states.split(','):
+        path = write_state(state, args.output_dir, args.rows, seed=args.seed,
+                           workers=args.workers, pool_size=args.pool_size,
+                           chunk_rows=args.chunk_rows, history=args.history,
+                           counties=args.counties, part_rows=args.part_rows)
+        print('Wrote {} voters to {}'.format(args.rows, path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from national_voter_file.transformers.address_cache import AddressCache, LRUCache
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+
+def test_address_cache_across_runs():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(cache_dir, 'address_cache.sqlite')
+        transformer = load_states(['vt'])[0].transformer.StateTransformer()
+        # Only addresses that go through usaddress are cached
+        transformer.fast_address_tag = False
+        transformer.address_cache = AddressCache(cache_path)
+        tagged = transformer.usaddress_tag('123 Main St Apt 4')
+        assert transformer.usaddress_tag('123  Main St Apt 4 ') == tagged
+        transformer.address_cache.close()
+        assert transformer.address_cache.stats['misses'] == 1
+
+        transformer.address_cache = AddressCache(cache_path)
+        assert transformer.usaddress_tag('123 Main St Apt 4') == tagged
+        assert transformer.address_cache.stats['hits'] == 1
+        transformer.address_cache.close()
+
+        # A different usaddress model clears the cache
+        conn = sqlite3.connect(cache_path)
+        with conn:
+            conn.execute("UPDATE cache_info SET value = 'old' WHERE key = 'model'")
+        conn.close()
+        cache = AddressCache(cache_path)
+        assert cache.get('123 Main St Apt 4') is None
+        assert cache.stats['invalidated'] == 1
+        cache.close()
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_address_cache_eviction():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(cache_dir, 'address_cache.sqlite')
+        cache = AddressCache(cache_path, max_entries=2)
+        for num in range(2):
+            cache.put('{} Main St'.format(num), {'AddressNumber': str(num)},
+                      'Street Address')
+        cache.close()
+
+        cache = AddressCache(cache_path, max_entries=2)
+        assert cache.get('1 Main St') == ({'AddressNumber': '1'}, 'Street Address')
+        cache.put('2 Main St', {'AddressNumber': '2'}, 'Street Address')
+        cache.close()
+        assert cache.stats['evictions'] == 1
+
+        cache = AddressCache(cache_path, max_entries=2)
+        assert cache.get('0 Main St') is None
+        assert cache.get('1 Main St') is not None
+        assert cache.get('2 Main St') is not None
+        cache.close()
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_address_cache_eviction_with_workers():
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache_path = os.path.join(cache_dir, 'address_cache.sqlite')
+        vt = load_states(['vt'])[0].transformer
+        state_transformer = vt.StateTransformer()
+        state_transformer.fast_address_tag = False
+        state_transformer.address_cache = AddressCache(cache_path,
+                                                       max_entries=2)
+        state_preparer = vt.StatePreparer(os.path.join(TEST_DATA_DIR, 'vt.csv'),
+                                          'vt', vt, state_transformer)
+        # Only the workers open the cache while the output is written
+        CsvOutput(state_transformer, validation='off', workers=2,
+                  chunk_size=7)(state_preparer.process(),
+                                os.path.join(cache_dir, 'vt_output.csv'))
+        state_transformer.address_cache.close()
+        conn = sqlite3.connect(cache_path)
+        assert conn.execute('SELECT COUNT(*) FROM addresses').fetchone()[0] == 2
+        conn.close()
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def test_address_lru():
+    transformer = load_states(['vt'])[0].transformer.StateTransformer()
+    transformer.usaddress_lru = LRUCache('usaddress_tag LRU', max_entries=1)
+    transformer.usaddress_dict_lru = LRUCache('convert_usaddress_dict LRU',
+                                              max_entries=1)
+
+    usaddress_dict, usaddress_type = transformer.usaddress_tag('123 Main St')
+    converted_addr = transformer.convert_usaddress_dict(usaddress_dict)
+    # Changing what we got back doesn't change what's cached
+    usaddress_dict['StreetName'] = 'Elm'
+    converted_addr['STREET_NAME'] = 'Elm'
+    usaddress_dict, usaddress_type = transformer.usaddress_tag('123 Main St')
+    assert usaddress_dict['StreetName'] == 'Main'
+    assert transformer.convert_usaddress_dict(usaddress_dict)['STREET_NAME'] == 'Main'
+
+    transformer.usaddress_tag('PO Box 1')
+    transformer.usaddress_tag('123 Main St')
+    assert transformer.usaddress_lru.stats == {'hits': 1, 'misses': 3, 'evictions': 2}
+    assert transformer.usaddress_dict_lru.stats['hits'] == 1
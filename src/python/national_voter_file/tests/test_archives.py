@@ -0,0 +1,194 @@
+import gzip
+import io
+import os
+import sys
+import tempfile
+import tracemalloc
+import zipfile
+from io import BytesIO, TextIOWrapper
+
+from nose.tools import assert_raises
+
+from national_voter_file.transformers.archives import (UnstreamableMember,
+                                                       iter_zip_members)
+from national_voter_file.tests.synthetic_data import write_state, zip_member
+from national_voter_file.us_states.co import transformer as co
+
+MEMBERS = [
+    ('stored.txt', b'stored\n' * 1000, zipfile.ZIP_STORED),
+    ('deflated.txt', b'deflated\n' * 100000, zipfile.ZIP_DEFLATED),
+    ('bzip2.txt', b'bzip2\n' * 10000, zipfile.ZIP_BZIP2),
+    ('empty/', b'', zipfile.ZIP_STORED),
+    ('ünïcode.txt', os.urandom(100000), zipfile.ZIP_DEFLATED),
+]
+
+
+class ForwardOnly(io.RawIOBase):
+    """A stream that can't seek, like a pipe"""
+
+    def __init__(self, data):
+        self.data = BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
+
+    def write(self, data):
+        return self.data.write(data)
+
+    def writable(self):
+        return True
+
+
+def make_zip(seekable=True, force_zip64=False):
+    """
+    Returns a zip of MEMBERS, with data descriptors if it isn't seekable.
+    Only the seekable zip without zip64 can be made before Python 3.6.
+    """
+    output = BytesIO() if seekable else ForwardOnly(b'')
+    with zipfile.ZipFile(output, 'w') as zip_file:
+        for name, data, compress_type in MEMBERS:
+            info = zipfile.ZipInfo(name)
+            info.compress_type = compress_type
+            if seekable and not force_zip64:
+                zip_file.writestr(info, data)
+            elif seekable or compress_type != zipfile.ZIP_STORED:
+                with zip_file.open(info, 'w',
+                                   force_zip64=force_zip64) as member:
+                    member.write(data)
+    return output.getvalue() if seekable else output.data.getvalue()
+
+
+def read_members(data, read_size=-1):
+    return [(name, member.read(read_size))
+            for name, member in iter_zip_members(ForwardOnly(data))]
+
+
+def test_iter_zip_members():
+    cases = [(True, False)]
+    if sys.version_info >= (3, 6):
+        cases += [(True, True), (False, False), (False, True)]
+    for seekable, force_zip64 in cases:
+        data = make_zip(seekable, force_zip64)
+        with zipfile.ZipFile(BytesIO(data)) as zip_file:
+            expected = [(name, zip_file.read(name))
+                        for name in zip_file.namelist()]
+        assert read_members(data) == expected
+        # Members that aren't read to the end are skipped
+        assert read_members(data, 10) == [(name, member[:10])
+                                          for name, member in expected]
+
+
+def test_bad_crc():
+    data = bytearray(make_zip())
+    position = data.index(b'stored\n')
+    data[position] = ord('S')
+    with assert_raises(zipfile.BadZipFile):
+        read_members(bytes(data))
+    with assert_raises(zipfile.BadZipFile):
+        read_members(make_zip()[:-len(b'stored\n') * 1000])
+
+
+def test_unstreamable():
+    output = BytesIO()
+    with zipfile.ZipFile(output, 'w') as zip_file:
+        zip_file.writestr('deflated.txt', b'deflated\n',
+                          zipfile.ZIP_DEFLATED)
+        zip_file.writestr('lzma.txt', b'lzma\n', zipfile.ZIP_LZMA)
+    with assert_raises(UnstreamableMember):
+        read_members(output.getvalue())
+    assert issubclass(UnstreamableMember, zipfile.BadZipFile)
+
+
+def old_co_rows(path, history):
+    """What co.StatePreparer did before archives.py"""
+    state_preparer = co.StatePreparer(path, 'co', co, co.StateTransformer())
+    with zipfile.ZipFile(path) as zip_obj:
+        for f in zip_obj.namelist():
+            if history and f.endswith('.gz'):
+                with gzip.open(BytesIO(zip_obj.read(f)), 'rt') as gf:
+                    yield from state_preparer.dict_iterator(gf)
+            elif not history and f.endswith('.zip'):
+                z_data = zipfile.ZipFile(BytesIO(zip_obj.read(f)))
+                for z_f in z_data.namelist():
+                    with z_data.open(z_f) as zdf:
+                        yield from state_preparer.dict_iterator(
+                            TextIOWrapper(zdf)
+                        )
+
+
+def test_co_preparer():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_state('co', tmp_dir, 100, pool_size=20, history=True,
+                           part_rows=40)
+        for history in [False, True]:
+            state_preparer = co.StatePreparer(path, 'co', co,
+                                              co.StateTransformer(),
+                                              history=history)
+            assert list(state_preparer.process()) == \
+                list(old_co_rows(path, history))
+
+
+def split_inner_zips(path, new_path):
+    """
+    Copies the CO zip at path to new_path, with each inner zip's members split
+    in a deflated half and an LZMA half, which can't be streamed
+    """
+    with zipfile.ZipFile(path) as zip_obj, \
+            zipfile.ZipFile(new_path, 'w') as new_zip:
+        for f in zip_obj.namelist():
+            if not f.endswith('.zip'):
+                new_zip.writestr(f, zip_obj.read(f))
+                continue
+            inner = zipfile.ZipFile(BytesIO(zip_obj.read(f)))
+            new_inner = BytesIO()
+            with zipfile.ZipFile(new_inner, 'w') as new_inner_zip:
+                for name in inner.namelist():
+                    header, *lines = inner.read(name).splitlines(True)
+                    half = len(lines) // 2
+                    new_inner_zip.writestr('a_' + name,
+                                           b''.join([header] + lines[:half]),
+                                           zipfile.ZIP_DEFLATED)
+                    new_inner_zip.writestr(name,
+                                           b''.join([header] + lines[half:]),
+                                           zipfile.ZIP_LZMA)
+            new_zip.writestr(f, new_inner.getvalue())
+
+
+def test_co_preparer_fallback():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_state('co', tmp_dir, 100, pool_size=20, part_rows=40)
+        new_path = os.path.join(tmp_dir, 'split.zip')
+        split_inner_zips(path, new_path)
+        state_preparer = co.StatePreparer(new_path, 'co', co,
+                                          co.StateTransformer())
+        rows = list(state_preparer.process())
+        assert rows == list(old_co_rows(new_path, False))
+        assert len(rows) == 100
+
+
+def test_memory_bounded():
+    line = b'x' * 99 + b'\n'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'outer.zip')
+        inner_path = os.path.join(tmp_dir, 'inner.zip')
+        with zipfile.ZipFile(inner_path, 'w', zipfile.ZIP_DEFLATED) as inner, \
+                zip_member(inner, 'voters.txt') as member:
+            for _ in range(200):
+                member.write(line * 1000)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as outer:
+            outer.write(inner_path, 'inner.zip')
+
+        tracemalloc.start()
+        try:
+            with zipfile.ZipFile(path) as outer, \
+                    outer.open('inner.zip') as inner:
+                for _, member in iter_zip_members(inner):
+                    size = sum(len(data) for data in member)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    assert size == len(line) * 200000
+    assert peak < 2 << 20
@@ -0,0 +1,94 @@
+import os
+import csv
+import tempfile
+from datetime import date
+from unittest import SkipTest
+
+from national_voter_file.transformers.arrow_output import (ArrowOutput,
+                                                           ColumnDictionary,
+                                                           ParquetOutput,
+                                                           pyarrow)
+from national_voter_file.transformers.base import BasePreparer
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+
+def transform_file(state_test, output_class, output_path, history=False,
+                   **kwargs):
+    state_path = state_test.transformer.StatePreparer.state_path
+    input_path = os.path.join(TEST_DATA_DIR, '{}.csv'.format(state_path))
+    state_transformer = state_test.transformer.StateTransformer()
+    state_preparer = getattr(state_test.transformer,
+                             'StatePreparer',
+                             BasePreparer)(input_path,
+                                           state_path,
+                                           state_test.transformer,
+                                           state_transformer,
+                                           history=history)
+    writer = output_class(state_transformer, **kwargs)
+    writer(state_preparer.process(), output_path, history=history)
+
+
+def read_table(output_class, output_path):
+    if output_class is ParquetOutput:
+        return pyarrow.parquet.read_table(output_path)
+    return pyarrow.ipc.open_file(output_path).read_all()
+
+
+def check_same_as_csv(state_test, output_class, history=False):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'output.csv')
+        output_path = os.path.join(tmp_dir, 'output')
+        transform_file(state_test, CsvOutput, csv_path, history)
+        transform_file(state_test, output_class, output_path, history,
+                       row_group_size=7, compression='zstd', records=True)
+        with open(csv_path) as csv_file:
+            expected = list(csv.DictReader(csv_file))
+        table = read_table(output_class, output_path)
+
+    assert table.schema.equals(output_class.schema(history))
+    assert table.num_rows == len(expected)
+    for row, expected_row in zip(table.to_pylist(), expected):
+        assert dict((col, '' if value is None else str(value))
+                    for col, value in row.items()) == expected_row
+
+
+def test_same_as_csv():
+    if pyarrow is None:
+        raise SkipTest('pyarrow is not installed')
+    for output_class in [ArrowOutput, ParquetOutput]:
+        for state_test in load_states(['ny', 'wa']):
+            yield (check_same_as_csv, state_test, output_class)
+        for state_test in load_states(['mi']):
+            yield (check_same_as_csv, state_test, output_class, True)
+
+
+def test_row_groups():
+    if pyarrow is None:
+        raise SkipTest('pyarrow is not installed')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'output.parquet')
+        transform_file(load_states(['ny'])[0], ParquetOutput, output_path,
+                       row_group_size=30)
+        parquet_file = pyarrow.parquet.ParquetFile(output_path)
+        assert parquet_file.metadata.row_group(0).num_rows == 30
+        assert parquet_file.metadata.row_group(0).column(0).compression == \
+            'SNAPPY'
+        table = parquet_file.read(columns=['BIRTHDATE', 'PARTY'])
+    assert table.schema.field('BIRTHDATE').type == pyarrow.date32()
+    assert pyarrow.types.is_dictionary(table.schema.field('PARTY').type)
+
+
+def test_unvalidated_dates():
+    if pyarrow is None:
+        raise SkipTest('pyarrow is not installed')
+    schema = ArrowOutput.schema()
+    dictionaries = dict((field.name, ColumnDictionary()) for field in schema
+                        if pyarrow.types.is_dictionary(field.type))
+    batch = ArrowOutput.record_batch([{'BIRTHDATE': date(1980, 1, 2)},
+                                      {'BIRTHDATE': ''},
+                                      {'PARTY': 'DEM'}],
+                                     schema, dictionaries, checked=False)
+    assert batch.column(schema.get_field_index('BIRTHDATE')).to_pylist() == \
+        [date(1980, 1, 2), None, None]
@@ -0,0 +1,93 @@
+import os
+import json
+import tempfile
+import zipfile
+
+from national_voter_file.transformers.checkpoint import (Checkpoint,
+                                                         checkpoint_path)
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_after(rows, input_iter):
+    for i, row in enumerate(input_iter):
+        if i == rows:
+            raise Interrupted()
+        yield row
+
+
+def run(state, input_path, output_path, interrupt=None, resume=False):
+    """Transforms input_path with checkpoints every 10 rows"""
+    state_module = load_states([state])[0].transformer
+    state_transformer = state_module.StateTransformer()
+    state_preparer = state_module.StatePreparer(input_path, state,
+                                                state_module,
+                                                state_transformer)
+    checkpoint = Checkpoint(checkpoint_path(output_path), state_preparer,
+                            every=10)
+    input_iter = checkpoint.resume() if resume else state_preparer.process()
+    if interrupt is not None:
+        input_iter = interrupt_after(interrupt, input_iter)
+    # PA's test data has values the strict validation doesn't allow
+    CsvOutput(state_transformer, chunk_size=7, validation='fast',
+              checkpoint=checkpoint)(input_iter, output_path)
+    checkpoint.finish()
+    return checkpoint
+
+
+def resumed_output(state, input_path, tmp_dir):
+    output_path = os.path.join(tmp_dir, '{}_output.csv'.format(state))
+    try:
+        run(state, input_path, output_path, interrupt=30)
+    except Interrupted:
+        pass
+    with open(checkpoint_path(output_path)) as checkpoint_file:
+        assert json.load(checkpoint_file)['rows'] == 28
+    checkpoint = run(state, input_path, output_path, resume=True)
+    assert checkpoint.saved['rows'] == 28
+    assert not os.path.exists(checkpoint_path(output_path))
+    with open(output_path) as output_file:
+        return output_file.read()
+
+
+def expected_output(state, input_path, tmp_dir):
+    output_path = os.path.join(tmp_dir, '{}_expected_output.csv'.format(state))
+    run(state, input_path, output_path)
+    with open(output_path) as output_file:
+        return output_file.read()
+
+
+def test_resume():
+    input_path = os.path.join(TEST_DATA_DIR, 'ut.csv')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        assert resumed_output('ut', input_path, tmp_dir) == \
+            expected_output('ut', input_path, tmp_dir)
+
+
+def test_resume_pa_county():
+    with open(os.path.join(TEST_DATA_DIR, 'pa.csv')) as pa_file:
+        lines = pa_file.readlines()
+    pa_module = load_states(['pa'])[0].transformer
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'Statewide.zip')
+        with zipfile.ZipFile(input_path, 'w') as zip_file:
+            for county, county_lines in [('ADAMS', lines[:25]),
+                                         ('BERKS', lines[25:])]:
+                zip_file.writestr('{} FVE 20170102.txt'.format(county),
+                                  ''.join(county_lines))
+                zip_file.writestr('{} Zone Types 20170102.txt'.format(county),
+                                  '{}\t3\tSD\tSchool District\n'.format(county))
+        expected = expected_output('pa', input_path, tmp_dir)
+        expected_state = pa_module.StateTransformer().checkpoint_state()
+        # Resumes from row 3 of BERKS, with the zones of ADAMS restored
+        pa_module.StateTransformer().restore_state(
+            {'zip_cache': {}, 'zonecode_column_by_county': {}}
+        )
+        assert resumed_output('pa', input_path, tmp_dir) == expected
+        assert pa_module.StateTransformer().checkpoint_state() == \
+            expected_state
@@ -0,0 +1,78 @@
+import random
+import datetime
+
+from national_voter_file.transformers.dates import DateParser, get_date_parser
+
+DATE_FORMATS = ['%m/%d/%Y', '%Y%m%d', '%m%d%Y', '%Y-%m-%d', '%Y', '%Y%m00']
+
+
+def strptime_result(date_str, date_format):
+    try:
+        return datetime.datetime.strptime(date_str, date_format).date()
+    except (ValueError, TypeError) as err:
+        return type(err), str(err)
+
+
+def parser_result(parser, date_str):
+    try:
+        return parser(date_str)
+    except (ValueError, TypeError) as err:
+        return type(err), str(err)
+
+
+def date_strings(date_format):
+    rand = random.Random(date_format)
+    for _ in range(500):
+        date = datetime.date(1900, 1, 1) + datetime.timedelta(rand.randint(0, 50000))
+        yield date.strftime(date_format)
+    yield '8/5/2008'
+    yield '08/5/2008'
+    yield '2008-8-5'
+    yield '1121980'
+    yield '02/30/2000'
+    yield '2000-02-30'
+    yield '20000230'
+    yield '00000000'
+    yield '13/01/2000'
+    yield '1/ 5/2008'
+    yield ' 1/5/2008'
+    yield '01/05/2008 '
+    yield '01/05/08'
+    yield '2008'
+    yield '200801'
+    yield '20080100'
+    yield '12345678'
+    yield '²²/01/2000'
+    yield ''
+    yield None
+
+
+def check_same_as_strptime(date_format, date_str):
+    parser = DateParser(date_format)
+    expected = strptime_result(date_str, date_format)
+    assert parser_result(parser, date_str) == expected
+    # and again from the memo table
+    assert parser_result(parser, date_str) == expected
+
+
+def test_same_as_strptime():
+    for date_format in DATE_FORMATS:
+        for date_str in date_strings(date_format):
+            yield (check_same_as_strptime, date_format, date_str)
+
+
+def test_fast_path():
+    for date_format in DATE_FORMATS:
+        parser = DateParser(date_format)
+        for date_str in list(date_strings(date_format))[:500]:
+            parser(date_str)
+        assert parser.stats['strptime'] == 0, date_format
+    assert DateParser('%m/%d/%Y')('8/5/2008') == datetime.date(2008, 8, 5)
+
+
+def test_memo_limit():
+    parser = DateParser('%Y%m%d', max_memo=2)
+    for date_str in ['20000101', '20000102', '20000103']:
+        parser(date_str)
+    assert sorted(parser.memo) == ['20000101', '20000102']
+    assert get_date_parser('%Y%m%d') is get_date_parser('%Y%m%d')
@@ -0,0 +1,63 @@
+import os
+import csv
+import tempfile
+
+from national_voter_file.transformers.delta import (DeltaIndex,
+                                                    removed_path,
+                                                    row_hash,
+                                                    snapshot_path)
+
+
+class RefTransformer(object):
+    def extract_state_voter_ref(self, input_dict):
+        return {'STATE_VOTER_REF': input_dict['ID']}
+
+
+def run(rows, output_path, previous_output=None):
+    index = DeltaIndex(RefTransformer(), snapshot_path(output_path),
+                       previous_output and snapshot_path(previous_output))
+    written = list(index.filter(rows))
+    index.close(removed_path(output_path))
+    return index, written
+
+
+def test_row_hash():
+    # The first 8 bytes of MD5('1\x1fA'), whatever order the columns are in
+    assert row_hash({'ID': '1', 'NAME': 'A'}) == 6676950220007489042
+    assert row_hash({'NAME': 'A', 'ID': '1'}) == 6676950220007489042
+    assert row_hash({'ID': '1', 'NAME': 'A', None: ['B']}) != \
+        row_hash({'ID': '1', 'NAME': 'A'})
+
+
+def test_delta_index():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        january = os.path.join(tmp_dir, 'ny_output.csv')
+        index, written = run([{'ID': '1', 'NAME': 'A'},
+                              {'ID': '2', 'NAME': 'B'},
+                              {'ID': '2', 'NAME': 'B2'},
+                              {'ID': '3', 'NAME': 'C'}], january)
+        assert len(written) == 4
+        assert index.stats['new'] == 4
+
+        # Rerunning into the same directory reads the index it replaces
+        index, written = run([{'ID': '1', 'NAME': 'A'},
+                              {'ID': '2', 'NAME': 'B2'},
+                              {'ID': '2', 'NAME': 'B'},
+                              {'ID': '3', 'NAME': 'Changed'},
+                              {'ID': '4', 'NAME': 'D'}], january, january)
+        assert written == [{'ID': '3', 'NAME': 'Changed'},
+                           {'ID': '4', 'NAME': 'D'}]
+        assert index.summary() == \
+            'Delta: 1 new, 1 changed, 3 unchanged, 0 removed'
+        assert not os.path.exists(snapshot_path(january) + '.new')
+
+        february = os.path.join(tmp_dir, 'feb', 'ny_output.csv')
+        os.mkdir(os.path.dirname(february))
+        index, written = run([{'ID': '1', 'NAME': 'A'},
+                              {'ID': '3', 'NAME': 'Changed'}],
+                             february, january)
+        assert written == []
+        assert index.stats['removed'] == 2
+        with open(removed_path(february)) as removed_file:
+            assert list(csv.reader(removed_file)) == [['STATE_VOTER_REF'],
+                                                      ['2'], ['4']]
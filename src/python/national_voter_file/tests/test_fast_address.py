@@ -0,0 +1,62 @@
+from national_voter_file.transformers.fast_address import fast_tag
+from national_voter_file.tests.address_parity import run_parity, usaddress_tag
+
+FAST_ADDRESSES = [
+    '100 N Main St Apt 5',
+    '322 1/2 S Main St',
+    '100 MAIN ST NE',
+    '100 MAIN ST # 5',
+    '100 Main St #5',
+    '100 MAIN St. Apt. 3',
+    '12 W 5TH AVE',
+    '9 MARTIN LUTHER KING JR BLVD',
+    '77 MAPLE DR SW STE 100',
+    '4 ELM STREET WEST APT 2',
+    '8 CEDAR CT E',
+    'Suite 385',
+    'PO BOX 123',
+    'P.O. Box 45',
+    'RR 2 BOX 15',
+    'HC 71 BOX 3',
+]
+
+USADDRESS_ADDRESSES = [
+    '100 MAIN ST, SPRINGFIELD',
+    '55 NORTH ST',
+    '10 N N ST',
+    '5 AVENUE A',
+    '100 N MAIN',
+    '123 OAK HILL RD',
+    '6065 HARRIS HILL',
+    '316 Brown Ridge S Bldg 5c',
+    '972 1/2 S Kevin Harbors Trlr F-101',
+    'Key Squares',
+    '6455 MAPLE ISLANDS EAST LOT 9',
+    '38342 DAVIS CIRC WEST',
+    '54383 DAVIS CURV W STE 611',
+    '87288 WILLIAMS AVENUE WEST LOT 59',
+]
+
+
+def check_fast_tag(address_str):
+    tagged = fast_tag(address_str)
+    assert tagged is not None
+    expected = usaddress_tag(address_str)
+    assert (list(tagged[0].items()), tagged[1]) == \
+        (list(expected[0].items()), expected[1])
+
+
+def check_falls_back(address_str):
+    assert fast_tag(address_str) is None
+
+
+def test_fast_tag():
+    for address_str in FAST_ADDRESSES:
+        yield (check_fast_tag, address_str)
+    for address_str in USADDRESS_ADDRESSES:
+        yield (check_falls_back, address_str)
+
+
+def test_fast_tag_parity():
+    for name, samples, handled, agreed, disagreements in run_parity(100):
+        assert agreed == handled, (name, disagreements)
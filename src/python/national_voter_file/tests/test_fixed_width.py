@@ -0,0 +1,107 @@
+import io
+import os
+import tempfile
+import zipfile
+
+from national_voter_file.transformers.fixed_width import FixedWidthLayout
+from national_voter_file.tests.synthetic_data import write_state
+from national_voter_file.us_states.mi import transformer as mi
+
+# The second field overlaps the first, like Michigan's (143, 156), (155, 191)
+COL_INDICES = ((0, 4), (3, 8), (8, 10), (12, 15))
+
+LINES = [
+    b'ABCDEFGHIJKLMNO\n',
+    b'  a  b c  d    \n',
+    b'\n',
+    b'SHORT\n',
+    b'\xc3\xa9t x\xc3\xa9yy  z\xc3\xa9w\n',
+    b'CRLF           \r\n',
+    b'\x1cAB\x1dCDE  F  GH \n',
+    b'NO NEWLINE AT END',
+]
+
+
+def slice_fields(data, col_indices):
+    """What mi.StatePreparer did before fixed_width.py"""
+    return [tuple(row[slice(*c)].strip().decode('utf-8') for c in col_indices)
+            for row in io.BytesIO(data)]
+
+
+def read_all(batches):
+    return [values for batch in batches for values in batch]
+
+
+def check_layout(data, use_struct, block_size):
+    layout = FixedWidthLayout(COL_INDICES, use_struct=use_struct)
+    expected = slice_fields(data, COL_INDICES)
+    assert read_all(layout.batches(io.BytesIO(data), block_size)) == expected
+    assert read_all(layout.buffer_batches(data, block_size)) == expected
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'fixed.lst')
+        with open(path, 'wb') as output_file:
+            output_file.write(data)
+        assert read_all(layout.read_file(path, block_size)) == expected
+
+
+def test_same_as_slicing():
+    fixed = b''.join(line for line in LINES if len(line) == 16)
+    for data in [b''.join(LINES), b''.join(LINES[:4]), fixed, fixed * 100,
+                 b'']:
+        for use_struct in [False, True]:
+            for block_size in [1, 7, 16, 1 << 20]:
+                yield check_layout, data, use_struct, block_size
+
+
+def test_struct_layers():
+    layout = FixedWidthLayout(COL_INDICES, use_struct=True)
+    layers, reorder = layout.compile(16)
+    assert [layer.size for layer in layers] == [16, 16]
+    assert reorder(('a', 'c', 'd', 'b')) == ('a', 'b', 'c', 'd')
+    # Records too short for the last field aren't read with structs
+    assert layout.compile(14) is None
+    records = layout.struct_records(LINES[4] * 3)
+    assert records == slice_fields(LINES[4] * 3, COL_INDICES)
+    assert layout.struct_records(b''.join(LINES[:4])) is None
+
+
+def test_mi_preparer():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_state('mi', tmp_dir, 100, pool_size=20, history=True)
+        state_preparer = mi.StatePreparer(path, 'mi', mi, mi.StateTransformer())
+        with zipfile.ZipFile(path) as zip_file:
+            voters = zip_file.read('entire_state_v.lst')
+            history = zip_file.read('entire_state_h.lst')
+            assert list(state_preparer.yield_zip_rows(
+                zip_file, 'entire_state_v.lst'
+            )) == [dict(zip(mi.StateTransformer.input_fields, values))
+                   for values in slice_fields(voters, mi.StatePreparer.col_indices)]
+
+            elec_code_file = os.path.join(os.path.dirname(path),
+                                          'electionscd.lst')
+            with open(elec_code_file, 'rb') as elections_file:
+                elections = {
+                    values[0]: values[1:] for values in slice_fields(
+                        elections_file.read(), mi.StatePreparer.election_indices
+                    )
+                }
+            expected = []
+            for values in slice_fields(history, mi.StatePreparer.history_indices):
+                hist_dict = dict(zip(mi.StatePreparer.history_fields, values))
+                election_date, election_type = elections[
+                    hist_dict.pop('ELECTION_CODE')
+                ]
+                hist_dict.update(ELECTION_DATE=election_date,
+                                 ELECTION_TYPE=election_type)
+                expected.append(hist_dict)
+            assert list(state_preparer.yield_history_rows(
+                'entire_state_h.lst', zip_obj=zip_file,
+                elec_code_file=elec_code_file
+            )) == expected
+
+            history_path = os.path.join(tmp_dir, 'entire_state_h.lst')
+            with open(history_path, 'wb') as history_file:
+                history_file.write(history)
+            assert list(state_preparer.yield_history_rows(
+                history_path, elec_code_file=elec_code_file
+            )) == expected
@@ -0,0 +1,328 @@
+import os
+import csv
+import uuid
+import struct
+import tempfile
+from contextlib import contextmanager
+from unittest import SkipTest
+
+from national_voter_file.transformers.base import BasePreparer
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.dimensions import dimension_paths
+from national_voter_file.transformers.postgres_output import (PostgresOutput,
+                                                              address_hash,
+                                                              copy_binary,
+                                                              copy_text,
+                                                              load_csv,
+                                                              psycopg2)
+from national_voter_file.transformers.records import MISSING
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+# Loading tests create and drop their own databases on this server, e.g.
+# NVF_TEST_DSN='host=localhost user=postgres'
+TEST_DSN = os.environ.get('NVF_TEST_DSN')
+SQL_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'main',
+                       'sql')
+
+
+def test_copy_text():
+    data = copy_text([('a\tb', None, ''), ('c\\d\r\n', MISSING, 1)])
+    assert data.read() == 'a\\tb\t\\N\t\\N\nc\\\\d\\r\\n\t\\N\t1\n'
+
+
+def test_copy_binary():
+    data = copy_binary([('ab', None), ('', 'é')], 2).read()
+    assert data.startswith(b'PGCOPY\n\xff\r\n\x00') and data.endswith(b'\xff\xff')
+    assert data[19:-2] == (struct.pack('!hi', 2, 2) + b'ab' +
+                           struct.pack('!ihii', -1, 2, -1, 2) + 'é'.encode())
+
+
+def test_address_hash():
+    # ('x' || LEFT(MD5('1 MAIN ST\x1f\x1fNY'), 16))::BIT(64)::BIGINT
+    assert address_hash(['1 MAIN ST', None, 'NY']) == -2036612573798892786
+    assert address_hash(['1 MAIN ST', None, 'NY']) == \
+        address_hash(['1 MAIN ST', '', 'NY'])
+    assert address_hash(['1 MAIN ST', 'NY']) != address_hash(['1 MAIN STNY'])
+
+
+@contextmanager
+def throwaway_database():
+    """Yields the dsn of a new database with the warehouse tables"""
+    if psycopg2 is None or TEST_DSN is None:
+        raise SkipTest('set NVF_TEST_DSN to a Postgres server to test loading')
+    name = 'nvf_test_{}'.format(uuid.uuid4().hex[:12])
+    server = psycopg2.connect(TEST_DSN)
+    server.autocommit = True
+    server.cursor().execute('CREATE DATABASE {}'.format(name))
+    try:
+        dsn = '{} dbname={}'.format(TEST_DSN, name)
+        connection = psycopg2.connect(dsn)
+        with connection, connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions "
+                           "WHERE name = 'postgis'")
+            postgis = cursor.fetchone() is not None
+            if postgis:
+                cursor.execute('CREATE EXTENSION postgis')
+            for sql_file in ['create_tables.sql', 'populate_static_data.sql']:
+                with open(os.path.join(SQL_DIR, sql_file)) as f:
+                    sql = f.read()
+                if not postgis:
+                    # Loading never touches HOUSEHOLD_DIM.GEOM
+                    sql = '\n'.join(line for line in sql.split('\n')
+                                    if 'USING GIST' not in line)
+                    sql = sql.replace('GEOMETRY(Point, 4326)', 'TEXT')
+                cursor.execute(sql)
+            cursor.execute(
+                "INSERT INTO DATE_DIM (DATE_ID, DATE_VALUE) VALUES "
+                "(1, '2017-01-01'), (2, '2017-02-01');"
+                "INSERT INTO JURISDICTION_DIM (STATE_NAME, ENTITY_TYPE, "
+                "VOTER_FILE_CODE) VALUES ('NY', 'state', NULL), "
+                "('NY', 'county', '43')"
+            )
+        connection.close()
+        yield dsn
+    finally:
+        server.cursor().execute('DROP DATABASE IF EXISTS {}'.format(name))
+        server.close()
+
+
+def state_preparer(state, input_path=None):
+    state_test = load_states([state])[0]
+    state_path = state_test.transformer.StatePreparer.state_path
+    if input_path is None:
+        input_path = os.path.join(TEST_DATA_DIR, '{}.csv'.format(state_path))
+    state_transformer = state_test.transformer.StateTransformer()
+    return state_transformer, getattr(state_test.transformer,
+                                      'StatePreparer',
+                                      BasePreparer)(input_path,
+                                                    state_path,
+                                                    state_test.transformer,
+                                                    state_transformer)
+
+
+def query(dsn, sql):
+    connection = psycopg2.connect(dsn)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+def warehouse_rows(dsn):
+    """Returns what was loaded, without the generated ids"""
+    return [
+        query(dsn, 'SELECT STATE_VOTER_REF, LAST_NAME, BIRTHDATE, VERSION, '
+                   'VALID_FROM, VALID_TO FROM VOTER_DIM ORDER BY 1, 4'),
+        query(dsn, 'SELECT RAW_ADDR1, RAW_ADDR2, RAW_CITY, RAW_ZIP, '
+                   'STREET_NAME, VALIDATION_STATUS, HASHCODE '
+                   'FROM HOUSEHOLD_DIM ORDER BY 1, 2, 3, 4'),
+        query(dsn, 'SELECT ADDRESS_LINE1, CITY, ZIP_CODE, HASHCODE '
+                   'FROM MAILING_ADDRESS_DIM ORDER BY 1, 2, 3'),
+        query(dsn, 'SELECT v.STATE_VOTER_REF, h.RAW_ADDR1, m.ADDRESS_LINE1, '
+                   'p.PARTY_CODE, s.ENTITY_TYPE, c.VOTER_FILE_CODE '
+                   'FROM VOTER_REPORT_FACT f '
+                   'JOIN VOTER_DIM v ON v.VOTER_ID = f.VOTER_KEY '
+                   'JOIN HOUSEHOLD_DIM h ON h.HOUSEHOLD_ID = f.HOUSEHOLD_KEY '
+                   'LEFT JOIN MAILING_ADDRESS_DIM m '
+                   'ON m.MAILING_ADDRESS_ID = f.MAILING_ADDRESS_KEY '
+                   'LEFT JOIN PARTY_DIM p ON p.PARTY_ID = f.PARTY_KEY '
+                   'LEFT JOIN JURISDICTION_DIM s ON s.JURISDICTION_ID = f.STATE_KEY '
+                   'LEFT JOIN JURISDICTION_DIM c ON c.JURISDICTION_ID = f.COUNTY_KEY '
+                   'ORDER BY 1, 2'),
+    ]
+
+
+def test_load_like_csv():
+    with throwaway_database() as streamed_dsn, \
+            throwaway_database() as text_dsn, \
+            throwaway_database() as csv_dsn, \
+            throwaway_database() as dimensions_dsn, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        state_transformer, preparer = state_preparer('ny')
+        writer = PostgresOutput(state_transformer, '2017-01-01', 3)
+        writer(preparer.process(), streamed_dsn)
+
+        state_transformer, preparer = state_preparer('ny')
+        writer = PostgresOutput(state_transformer, '2017-01-01', 3, workers=2,
+                                chunk_size=7, copy_format='text', records=True)
+        writer(preparer.process(), text_dsn)
+
+        csv_path = os.path.join(tmp_dir, 'ny_output.csv')
+        state_transformer, preparer = state_preparer('ny')
+        CsvOutput(state_transformer, null='\\N')(preparer.process(), csv_path)
+        load_csv(csv_path, csv_dsn, '2017-01-01', 3, null='\\N')
+
+        dimensions_path = os.path.join(tmp_dir, 'dimensions', 'ny_output.csv')
+        os.mkdir(os.path.dirname(dimensions_path))
+        state_transformer, preparer = state_preparer('ny')
+        CsvOutput(state_transformer, dimensions=True,
+                  max_dimension_keys=5)(preparer.process(), dimensions_path)
+        load_csv(dimensions_path, dimensions_dsn, '2017-01-01', 3,
+                 dimension_paths=dimension_paths(dimensions_path))
+
+        with open(csv_path) as csv_file:
+            output_rows = list(csv.DictReader(csv_file))
+        loaded = warehouse_rows(streamed_dsn)
+        assert warehouse_rows(text_dsn) == loaded
+        assert warehouse_rows(csv_dsn) == loaded
+        assert warehouse_rows(dimensions_dsn) == loaded
+
+    voters, households, _, facts = loaded
+    assert len(facts) == len(output_rows)
+    assert len(voters) == len(set(row['STATE_VOTER_REF'] for row in output_rows))
+    assert all(version == 1 and str(valid_from) == '1900-01-01'
+               for _, _, _, version, valid_from, _ in voters)
+    assert len(households) == len(set(
+        (row['RAW_ADDR1'], row['RAW_ADDR2'], row['RAW_CITY'], row['RAW_ZIP'])
+        for row in output_rows
+    ))
+    assert all(state == 'state' and county == '43'
+               for _, _, _, _, state, county in facts
+               if county is not None)
+    assert any(party == 'WEP' for _, _, _, party, _, _ in facts)
+
+
+def test_load_merge_voters():
+    with throwaway_database() as sql_dsn, \
+            throwaway_database() as merge_dsn, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(TEST_DATA_DIR, 'ny.csv')
+        changed_path = os.path.join(tmp_dir, 'ny.csv')
+        with open(input_path) as infile, open(changed_path, 'w') as outfile:
+            lines = infile.readlines()
+            first = lines[0].split(',')
+            first[0] = 'Changed'
+            outfile.writelines([','.join(first)] + lines[1:])
+
+        for report_date, path in [('2017-01-01', input_path),
+                                  ('2017-02-01', changed_path)]:
+            csv_path = os.path.join(tmp_dir, 'ny_output.csv')
+            state_transformer, preparer = state_preparer('ny', path)
+            CsvOutput(state_transformer)(preparer.process(), csv_path)
+            load_csv(csv_path, sql_dsn, report_date, 3)
+            load_csv(csv_path, merge_dsn, report_date, 3, merge_voters=True,
+                     max_sort_rows=7)
+            assert warehouse_rows(merge_dsn) == warehouse_rows(sql_dsn)
+
+
+def test_dimension_files():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'ny_output.csv')
+        state_transformer, preparer = state_preparer('ny')
+        CsvOutput(state_transformer, dimensions=True)(preparer.process(),
+                                                      output_path)
+        paths = dimension_paths(output_path)
+        assert paths == {
+            'households': os.path.join(tmp_dir, 'ny_households.csv'),
+            'mailing_addresses': os.path.join(tmp_dir,
+                                              'ny_mailing_addresses.csv'),
+        }
+        with open(output_path) as csv_file:
+            output_rows = list(csv.DictReader(csv_file))
+        with open(paths['households']) as csv_file:
+            households = list(csv.DictReader(csv_file))
+
+    keys = ['RAW_ADDR1', 'RAW_ADDR2', 'RAW_CITY', 'RAW_ZIP', 'STATE_NAME']
+    assert len(households) == len(set(tuple(row[key] for key in keys)
+                                      for row in output_rows))
+    assert all(int(row['HASHCODE']) == address_hash([row[key]
+                                                     for key in keys])
+               for row in households)
+
+
+def test_load_new_versions():
+    with throwaway_database() as dsn, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        state_transformer, preparer = state_preparer('ny')
+        PostgresOutput(state_transformer, '2017-01-01', 3)(preparer.process(),
+                                                           dsn)
+        voters, households, mailing_addresses, _ = warehouse_rows(dsn)
+
+        # The next month's file, where the first voter changed their name
+        input_path = os.path.join(TEST_DATA_DIR, 'ny.csv')
+        changed_path = os.path.join(tmp_dir, 'ny.csv')
+        with open(input_path) as infile, open(changed_path, 'w') as outfile:
+            lines = infile.readlines()
+            first = lines[0].split(',')
+            first[0] = 'Changed'
+            outfile.writelines([','.join(first)] + lines[1:])
+        state_transformer, preparer = state_preparer('ny', changed_path)
+        PostgresOutput(state_transformer, '2017-02-01', 3)(preparer.process(),
+                                                           dsn)
+        new_voters, new_households, new_mailing_addresses, facts = \
+            warehouse_rows(dsn)
+        assert query(dsn, 'SELECT DATE_KEY, COUNT(*) FROM VOTER_REPORT_FACT '
+                          'GROUP BY DATE_KEY ORDER BY 1') == \
+            [(1, len(facts) // 2), (2, len(facts) // 2)]
+
+    assert new_households == households
+    assert new_mailing_addresses == mailing_addresses
+    changed = [(voter[1], voter[3], str(voter[4]), str(voter[5]))
+               for voter in new_voters if voter not in voters]
+    assert changed == [('White', 1, '1900-01-01', '2017-02-01'),
+                       ('Changed', 2, '2017-02-01', '2199-12-31')]
+    assert len(new_voters) == len(voters) + 1
+
+
+def test_load_pentaho_hashcodes():
+    with throwaway_database() as dsn:
+        state_transformer, preparer = state_preparer('ny')
+        PostgresOutput(state_transformer, '2017-01-01', 3)(preparer.process(),
+                                                           dsn)
+        # Households and mailing addresses saved by Pentaho's
+        # CombinationLookup have hashcodes of its own
+        connection = psycopg2.connect(dsn)
+        with connection, connection.cursor() as cursor:
+            cursor.execute('UPDATE HOUSEHOLD_DIM SET HASHCODE = HOUSEHOLD_ID; '
+                           'UPDATE MAILING_ADDRESS_DIM '
+                           'SET HASHCODE = MAILING_ADDRESS_ID')
+        connection.close()
+        _, households, mailing_addresses, _ = warehouse_rows(dsn)
+
+        state_transformer, preparer = state_preparer('ny')
+        PostgresOutput(state_transformer, '2017-02-01', 3)(preparer.process(),
+                                                           dsn)
+        _, new_households, new_mailing_addresses, facts = warehouse_rows(dsn)
+        assert query(dsn, 'SELECT DATE_KEY, COUNT(*) FROM VOTER_REPORT_FACT '
+                          'GROUP BY DATE_KEY ORDER BY 1') == \
+            [(1, len(facts) // 2), (2, len(facts) // 2)]
+
+    assert new_households == households
+    assert new_mailing_addresses == mailing_addresses
+
+
+def test_load_closed_voter():
+    with throwaway_database() as sql_dsn, \
+            throwaway_database() as merge_dsn, \
+            tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'ny_output.csv')
+        state_transformer, preparer = state_preparer('ny')
+        CsvOutput(state_transformer)(preparer.process(), csv_path)
+        for report_date in ['2017-01-01', '2017-02-01']:
+            for dsn in [sql_dsn, merge_dsn]:
+                load_csv(csv_path, dsn, report_date, 3,
+                         merge_voters=dsn == merge_dsn, max_sort_rows=7)
+                if report_date == '2017-01-01':
+                    # The first voter left a report between the two
+                    connection = psycopg2.connect(dsn)
+                    with connection, connection.cursor() as cursor:
+                        cursor.execute(
+                            "UPDATE VOTER_DIM SET VALID_TO = '2017-01-15' "
+                            "WHERE STATE_VOTER_REF = (SELECT "
+                            "MIN(STATE_VOTER_REF) FROM VOTER_DIM)"
+                        )
+                    connection.close()
+        loaded = warehouse_rows(sql_dsn)
+        assert warehouse_rows(merge_dsn) == loaded
+        voters, _, _, facts = loaded
+        assert query(sql_dsn, 'SELECT DATE_KEY, COUNT(*) FROM VOTER_REPORT_FACT '
+                              'GROUP BY DATE_KEY ORDER BY 1') == \
+            [(1, len(facts) // 2), (2, len(facts) // 2)]
+
+    closed = [voter for voter in voters if voter[0] == voters[0][0]]
+    assert [(version, str(valid_from), str(valid_to))
+            for _, _, _, version, valid_from, valid_to in closed] == \
+        [(1, '1900-01-01', '2017-01-15'), (2, '2017-02-01', '2199-12-31')]
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.profiling import Profiler
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+
+def run(output_path, profiler=None, workers=1):
+    ut = load_states(['ut'])[0].transformer
+    state_transformer = ut.StateTransformer()
+    state_transformer.profiler = profiler
+    state_preparer = ut.StatePreparer(os.path.join(TEST_DATA_DIR, 'ut.csv'),
+                                      'ut', ut, state_transformer)
+    CsvOutput(state_transformer, workers=workers,
+              chunk_size=7)(state_preparer.process(), output_path)
+    # Timed steps are only on the transformer while a row is sampled
+    assert 'row_plan' not in vars(state_transformer)
+    with open(output_path) as output_file:
+        return output_file.read()
+
+
+def test_profiler():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'ut_output.csv')
+        expected = run(output_path)
+        for workers in [1, 2]:
+            profiler = Profiler(sample_every=3)
+            assert run(output_path, profiler, workers) == expected
+
+            report = profiler.report()
+            assert report['rows'] == 100
+            # Each worker process counts down to its own samples
+            assert report['sampled_rows'] >= 100 // 3 - workers
+            steps = report['steps']
+            assert steps['transform_row']['calls'] == report['sampled_rows']
+            assert steps['extract_birthdate']['calls'] == report['sampled_rows']
+            assert steps['validate_output_row']['calls'] == \
+                report['sampled_rows']
+            assert steps['write']['calls'] == 100
+            assert steps['convert_date']['calls'] > 0
+            assert 'extract_birthdate' in profiler.table()
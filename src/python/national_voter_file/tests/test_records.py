@@ -0,0 +1,100 @@
+import os
+import csv
+import pickle
+import tempfile
+from io import StringIO
+
+from national_voter_file.transformers.base import BasePreparer
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.records import (MISSING, read_records,
+                                                      record_rows, record_type)
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import (TEST_DATA_DIR,
+                                                         TEST_HISTORY,
+                                                         TEST_STATES)
+
+CSV_TEXT = 'A,B,C\n1,2,3\n\n4,5\n6,7,8,9\n'
+
+
+def test_record_dict_interface():
+    ABRecord = record_type(['A', 'B'])
+    assert record_type(('A', 'B')) is ABRecord
+    record = ABRecord()
+    assert len(record) == 0 and 'A' not in record and record.get('A') is None
+    record.update({'A': 1, 'C': 3})
+    record['B'] = None
+    assert record == {'A': 1, 'B': None, 'C': 3}
+    assert record.row == [1, None] and record.extra == {'C': 3}
+    del record['C']
+    del record['A']
+    assert dict(record) == {'B': None} and record.row == [MISSING, None]
+    assert ABRecord.from_dict({'B': '2', 'A': '1'}).row == ['1', '2']
+    assert ABRecord.from_dict({'B': '2'}).row == [MISSING, '2']
+    try:
+        record['A']
+    except KeyError:
+        pass
+    else:
+        assert False, 'unset columns raise KeyError'
+    copied = record.copy()
+    copied['A'] = 2
+    assert record.get('A', 'default') == 'default'
+    assert pickle.loads(pickle.dumps(copied)) == {'A': 2, 'B': None}
+    assert pickle.loads(pickle.dumps(MISSING)) is MISSING
+
+
+def test_read_records_like_dict_reader():
+    expected = list(csv.DictReader(StringIO(CSV_TEXT)))
+    assert list(read_records(StringIO(CSV_TEXT))) == expected
+    expected = list(csv.DictReader(StringIO(CSV_TEXT), fieldnames=['X', 'Y']))
+    assert list(read_records(StringIO(CSV_TEXT), fieldnames=['X', 'Y'])) == \
+        expected
+    assert list(read_records(StringIO(''))) == []
+
+
+def test_record_rows():
+    ABRecord = record_type(['A', 'B'])
+    rows = [ABRecord(['1', '2']), {'B': '4'}, ABRecord(['5', MISSING])]
+    assert list(record_rows(rows, ['A', 'B'])) == \
+        [['1', '2'], ['', '4'], ['5', MISSING]]
+    try:
+        list(record_rows([{'A': '1', 'C': '3'}], ['A', 'B']))
+    except ValueError as err:
+        assert "'C'" in str(err)
+    else:
+        assert False, 'other columns raise ValueError like DictWriter'
+
+
+def transform_file(state_test, records, history=False, workers=1):
+    state_path = state_test.transformer.StatePreparer.state_path
+    input_path = os.path.join(TEST_DATA_DIR, '{}.csv'.format(state_path))
+    state_transformer = state_test.transformer.StateTransformer()
+    state_preparer = getattr(state_test.transformer,
+                             'StatePreparer',
+                             BasePreparer)(input_path,
+                                           state_path,
+                                           state_test.transformer,
+                                           state_transformer,
+                                           history=history,
+                                           records=records)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'output.csv')
+        writer = CsvOutput(state_transformer, workers=workers,
+                           chunk_size=7, records=records)
+        writer(state_preparer.process(), output_path, history=history)
+        with open(output_path) as output_file:
+            return output_file.read()
+
+
+def check_same_output(state_test, history=False, workers=1):
+    expected = transform_file(state_test, False, history)
+    assert transform_file(state_test, True, history, workers) == expected
+
+
+def test_records_output():
+    for state_test in load_states([x.lower() for x in TEST_STATES.values()]):
+        yield (check_same_output, state_test)
+    for state_test in load_states([x.lower() for x in TEST_HISTORY.values()]):
+        yield (check_same_output, state_test, True)
+    for state_test in load_states(['ny']):
+        yield (check_same_output, state_test, False, 2)
@@ -0,0 +1,62 @@
+import os
+import csv
+import json
+import tempfile
+
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.rejects import (ErrorBudgetExceeded,
+                                                      RejectWriter,
+                                                      rejects_path)
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+
+def broken_rows(state_preparer, broken):
+    """Yields the input rows, without a DOB in the rows numbered in broken"""
+    for i, row in enumerate(state_preparer.process()):
+        if i in broken:
+            del row['DOB']
+        yield row
+
+
+def run(tmp_dir, broken, **kwargs):
+    ut = load_states(['ut'])[0].transformer
+    state_transformer = ut.StateTransformer()
+    state_preparer = ut.StatePreparer(os.path.join(TEST_DATA_DIR, 'ut.csv'),
+                                      'ut', ut, state_transformer)
+    output_path = os.path.join(tmp_dir, 'ut_output.csv')
+    rejects = RejectWriter(rejects_path(output_path), **kwargs)
+    rejects.open()
+    try:
+        CsvOutput(state_transformer, workers=2, chunk_size=7,
+                  rejects=rejects)(broken_rows(state_preparer, broken),
+                                   output_path)
+    finally:
+        rejects.close()
+    with open(output_path) as output_file, \
+            open(rejects_path(output_path)) as rejects_file:
+        return (rejects, list(csv.DictReader(output_file)),
+                list(csv.DictReader(rejects_file)))
+
+
+def test_rejects():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rejects, output_rows, rejected = run(tmp_dir, {3, 40}, max_errors=2)
+
+    assert len(output_rows) == 98
+    assert [(row['ERROR_TYPE'], row['ERROR_MESSAGE'], row['FAILED_STEP'])
+            for row in rejected] == [('KeyError', "'DOB'", 'extract_birthdate')] * 2
+    assert 'DOB' not in json.loads(rejected[0]['INPUT_ROW'])
+    assert rejects.summary() == 'Rejected 2 of 100 rows (2.00%): 2 KeyError'
+
+
+def test_error_budget():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for kwargs in [{'max_errors': 2},
+                       {'max_error_rate': 0.02, 'min_rows': 10}]:
+            try:
+                run(tmp_dir, {3, 4, 5}, **kwargs)
+            except ErrorBudgetExceeded:
+                pass
+            else:
+                assert False, 'Error budget {} not enforced'.format(kwargs)
@@ -0,0 +1,113 @@
+import os
+import json
+import tempfile
+import zipfile
+
+from nose.tools import assert_raises
+
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.rejects import (ErrorBudgetExceeded,
+                                                      RejectWriter,
+                                                      rejects_path)
+from national_voter_file.transformers.shards import (ShardedOutput,
+                                                     join_shards,
+                                                     manifest_path,
+                                                     shard_dir)
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+COUNTIES = [('ADAMS', 0, 20, 3), ('BERKS', 20, 70, 9), ('CLARION', 70, 100, 4)]
+
+
+def write_statewide(path):
+    """Writes PA's test data as a Statewide.zip of counties with own zones"""
+    with open(os.path.join(TEST_DATA_DIR, 'pa.csv')) as pa_file:
+        lines = pa_file.readlines()
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for county, start, end, school_column in COUNTIES:
+            zip_file.writestr('{} FVE 20170102.txt'.format(county),
+                              ''.join(lines[start:end]))
+            zip_file.writestr('{} Zone Types 20170102.txt'.format(county),
+                              '{}\t{}\tSD\tSchool District\n'.format(
+                                  county, school_column))
+
+
+def run(input_path, output_path, workers=None, manifest=False,
+        max_errors=None):
+    """
+    Transforms input_path serially, or in shards with workers, returning
+    the output's RejectWriter
+    """
+    pa = load_states(['pa'])[0].transformer
+    state_transformer = pa.StateTransformer()
+    state_transformer.restore_state({'zonecode_column_by_county': {}})
+    state_preparer = pa.StatePreparer(input_path, 'pa', pa, state_transformer)
+    rejects = RejectWriter(rejects_path(output_path), max_errors=max_errors)
+    rejects.open()
+    # PA's test data has values the strict validation doesn't allow
+    output = CsvOutput(state_transformer, chunk_size=7, rejects=rejects)
+    try:
+        if workers is None:
+            output(state_preparer.process(), output_path)
+        else:
+            ShardedOutput(output, workers=workers,
+                          manifest=manifest)(state_preparer, output_path)
+    finally:
+        rejects.close()
+    assert output.input_rows == 100
+    assert output.rejects is rejects
+    return rejects
+
+
+def read_file(path):
+    with open(path) as input_file:
+        return input_file.read()
+
+
+def test_sharded_output():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'Statewide.zip')
+        write_statewide(input_path)
+        output_path = os.path.join(tmp_dir, 'pa_output.csv')
+        expected_rejects = run(input_path, output_path)
+        expected = read_file(output_path)
+        expected_rejected = read_file(rejects_path(output_path))
+        assert 0 < sum(expected_rejects.errors.values()) < 100
+
+        for workers in [1, 2]:
+            os.remove(output_path)
+            rejects = run(input_path, output_path, workers)
+            assert read_file(output_path) == expected
+            assert read_file(rejects_path(output_path)) == expected_rejected
+            assert rejects.errors == expected_rejects.errors
+            assert rejects.rows == 100
+            assert not os.path.exists(shard_dir(output_path))
+
+        os.remove(output_path)
+        run(input_path, output_path, workers=2, manifest=True)
+        assert not os.path.exists(output_path)
+        with open(manifest_path(output_path)) as manifest_file:
+            manifest = json.load(manifest_file)
+        assert [shard['partition'] for shard in manifest['shards']] == \
+            ['{} FVE 20170102.txt'.format(county) for county, _, _, _
+             in COUNTIES]
+        assert [shard['input_rows'] for shard in manifest['shards']] == \
+            [end - start for _, start, end, _ in COUNTIES]
+        join_shards([os.path.join(tmp_dir, shard['path'])
+                     for shard in manifest['shards']], output_path)
+        assert read_file(output_path) == expected
+
+
+def test_error_budget():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'Statewide.zip')
+        write_statewide(input_path)
+        output_path = os.path.join(tmp_dir, 'pa_output.csv')
+        # Berks and Clarion, the largest counties, have 13 and 7 rows that
+        # fail, so the run is over budget before Adams is transformed
+        with assert_raises(ErrorBudgetExceeded):
+            run(input_path, output_path, workers=1, max_errors=15)
+        assert not os.path.exists(os.path.join(shard_dir(output_path),
+                                               '000.csv'))
+        with open(rejects_path(output_path)) as rejects_file:
+            assert len(rejects_file.readlines()) == 1 + 13 + 7
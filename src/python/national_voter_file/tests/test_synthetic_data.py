@@ -0,0 +1,75 @@
+import os
+import tempfile
+import zipfile
+
+from national_voter_file.tests.synthetic_data import (VOTES_PER_VOTER,
+                                                      write_state)
+from national_voter_file.us_states.all import load as load_states
+
+
+def read_file(path):
+    with open(path, 'rb') as input_file:
+        return input_file.read()
+
+
+def test_deterministic():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outputs = [
+            read_file(write_state('ut', os.path.join(tmp_dir, str(i)), 100,
+                                  seed=seed, workers=workers, pool_size=20,
+                                  chunk_rows=7))
+            for i, (seed, workers) in enumerate([(0, 1), (0, 2), (1, 1)])
+        ]
+    assert outputs[0] == outputs[1]
+    assert outputs[0] != outputs[2]
+    assert len(outputs[0].splitlines()) == 101
+
+
+def transformed_rows(state, path, history=False):
+    """Returns the rows of path transformed by state without errors"""
+    transformer = load_states([state])[0].transformer
+    state_transformer = transformer.StateTransformer()
+    state_preparer = transformer.StatePreparer(path, state, transformer,
+                                               state_transformer,
+                                               history=history)
+    if state == 'mi' and history:
+        input_rows = state_preparer.yield_history_rows(
+            'entire_state_h.lst', zip_obj=zipfile.ZipFile(path),
+            elec_code_file=os.path.join(os.path.dirname(path),
+                                        'electionscd.lst')
+        )
+    else:
+        input_rows = state_preparer.process()
+    return [state_transformer.process_row(input_dict, history)
+            for input_dict in input_rows]
+
+
+def run_native_layout(state, kwargs):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_state(state, tmp_dir, 100, pool_size=20, chunk_rows=30,
+                           **kwargs)
+        voters = transformed_rows(state, path)
+        assert len(voters) == 100
+        assert len(set(row['STATE_VOTER_REF'] for row in voters)) == 100
+        if kwargs.get('history'):
+            votes = transformed_rows(state, path, history=True)
+            assert len(votes) == 100 * VOTES_PER_VOTER
+            assert set(row['STATE_VOTER_REF'] for row in votes) == \
+                set(row['STATE_VOTER_REF'] for row in voters)
+
+
+def test_native_layouts():
+    yield run_native_layout, 'mi', {'history': True}
+    yield run_native_layout, 'co', {'history': True, 'part_rows': 40}
+    yield run_native_layout, 'pa', {'counties': 3}
+
+
+def test_pa_counties():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_state('pa', tmp_dir, 100, pool_size=20, counties=3)
+        with zipfile.ZipFile(path) as zip_file:
+            assert sorted(zip_file.namelist()) == [
+                '{} {} 20170102.txt'.format(county, file_type)
+                for county in ['ADAMS', 'ALLEGHENY', 'ARMSTRONG']
+                for file_type in ['FVE', 'Zone Types']
+            ]
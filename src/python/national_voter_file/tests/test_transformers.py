@@ -1,12 +1,15 @@
 import os
 import csv
+from io import StringIO
 
 from national_voter_file.transformers.base import (DATA_DIR,
                                                    BasePreparer,
                                                    BaseTransformer)
 from national_voter_file.us_states.all import load as load_states
 
-from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.csv_transformer import (CsvOutput,
+                                                             RowWriter)
+from national_voter_file.transformers.records import record_type
 
 # Need to add test data
 
@@ -105,3 +108,201 @@ def test_all_transformers():
 def test_all_transformers_history():
     for state_test in load_states([x.lower() for x in TEST_HISTORY.values()]):
         yield (run_transformer_history, state_test)
+
+
+def run_row_plan_parity(state_test):
+    state_path = state_test.transformer.StatePreparer.state_path
+    input_path = os.path.join(TEST_DATA_DIR, '{}.csv'.format(state_path))
+
+    state_transformer = state_test.transformer.StateTransformer()
+    state_preparer = state_test.transformer.StatePreparer(input_path,
+                                                          state_path,
+                                                          state_test.transformer,
+                                                          state_transformer)
+    for input_dict in state_preparer.process():
+        # What process_row did before it was driven by row_plan
+        expected = {}
+        for x in dir(state_transformer):
+            if x.startswith('extract'):
+                expected.update(getattr(state_transformer, x)(input_dict))
+        assert state_transformer.process_row(input_dict) == expected
+
+
+def test_row_plan():
+    for state_test in load_states([x.lower() for x in TEST_STATES.values()]):
+        yield (run_row_plan_parity, state_test)
+
+
+def test_missing_col_map_fails_at_startup():
+    class IncompleteTransformer(BaseTransformer):
+        col_map = {'EMAIL': None}
+
+    try:
+        IncompleteTransformer()
+    except NotImplementedError as err:
+        assert 'col_map' in str(err)
+    else:
+        assert False, 'Expected NotImplementedError for missing col_map entries'
+
+
+def _valid_output_row():
+    output_dict = dict((col, None) for col in BASE_TRANSFORMER_COLS)
+    output_dict.update({
+        'BIRTHDATE_IS_ESTIMATE': 'N',
+        'STATE_NAME': 'VT',
+        'COUNTYCODE': 'ADD',
+        'STATE_VOTER_REF': 'VT1',
+        'GENDER': 'U',
+        'RACE': 'U',
+        'VALIDATION_STATUS': '2',
+    })
+    return output_dict
+
+
+def test_output_validator_modes():
+    output_dict = _valid_output_row()
+    output_dict['FIRST_NAME'] = ' JANE '
+    BaseTransformer.validate_output_row(output_dict)
+    assert output_dict['FIRST_NAME'] == 'JANE'
+
+    output_dict['PARTY'] = 'XYZ'
+    try:
+        BaseTransformer.validate_output_row(output_dict)
+    except ValueError as err:
+        assert 'Column PARTY requires value(s)' in str(err)
+    else:
+        assert False, 'Expected ValueError for PARTY'
+    BaseTransformer.validate_output_row(output_dict, mode='fast')
+
+    output_dict['STATE_VOTER_REF'] = None
+    try:
+        BaseTransformer.validate_output_row(output_dict, mode='fast')
+    except TypeError as err:
+        assert 'Column STATE_VOTER_REF requires type(s)' in str(err)
+    else:
+        assert False, 'Expected TypeError for STATE_VOTER_REF'
+
+    del output_dict['STATE_VOTER_REF']
+    BaseTransformer.validate_output_row(output_dict, mode='off')
+    try:
+        BaseTransformer.validate_output_row(output_dict, mode='fast')
+    except ValueError as err:
+        assert "['STATE_VOTER_REF'] are required but missing" in str(err)
+    else:
+        assert False, 'Expected ValueError for missing column'
+
+
+def test_output_validator_per_class():
+    mi = load_states(['mi'])[0]
+    assert (mi.transformer.StateTransformer.output_validator() is not
+            BaseTransformer.output_validator())
+    assert (mi.transformer.StateTransformer.output_validator().type_dict is
+            mi.transformer.StateTransformer.col_type_dict)
+
+
+def test_parallel_csv_output():
+    ut = load_states(['ut'])[0]
+    input_path = os.path.join(TEST_DATA_DIR, 'ut.csv')
+    outputs = []
+    for kwargs in [{}, {'workers': 2, 'chunk_size': 7},
+                   {'workers': 2, 'chunk_size': 7, 'ordered': False}]:
+        output_path = os.path.join(TEST_DATA_DIR, 'ut_parallel_test.csv')
+        state_transformer = ut.transformer.StateTransformer()
+        state_preparer = ut.transformer.StatePreparer(input_path, 'ut',
+                                                      ut.transformer,
+                                                      state_transformer)
+        writer = CsvOutput(state_transformer, **kwargs)
+        writer(state_preparer.process(), output_path)
+        with open(output_path) as output_f:
+            outputs.append(output_f.readlines())
+        os.remove(output_path)
+
+    assert len(outputs[0]) > 1
+    assert outputs[1] == outputs[0]
+    assert sorted(outputs[2]) == sorted(outputs[0])
+
+
+def test_structured_address():
+    mi = load_states(['mi'])[0]
+    state_transformer = mi.transformer.StateTransformer()
+    input_dict = {
+        'HOUSE_NUM_CHARACTER': ' ',
+        'RESIDENCE_STREET_NUMBER': '8588',
+        'HOUSE_SUFFIX': '1/2',
+        'PRE_DIRECTION': 'N',
+        'STREET_NAME': 'DIAZ GROVE',
+        'STREET_TYPE': 'BRIDGE',
+        'SUFFIX_DIRECTION': ' ',
+        'RESIDENCE_EXTENSION': 'APT 5',
+    }
+    address_dict = state_transformer.structured_address(input_dict)
+    assert address_dict['ADDRESS_NUMBER'] == '8588'
+    assert address_dict['ADDRESS_NUMBER_SUFFIX'] == '1/2'
+    assert address_dict['STREET_NAME_PRE_DIRECTIONAL'] == 'N'
+    assert address_dict['STREET_NAME'] == 'DIAZ GROVE'
+    assert address_dict['STREET_NAME_POST_TYPE'] == 'BRIDGE'
+    assert address_dict['STREET_NAME_POST_DIRECTIONAL'] is None
+    assert address_dict['OCCUPANCY_TYPE'] == 'APT'
+    assert address_dict['OCCUPANCY_IDENTIFIER'] == '5'
+    assert (sorted(address_dict) ==
+            sorted(state_transformer.constructEmptyResidentialAddress()))
+
+    address_str = '8588 1/2 N DIAZ GROVE BRIDGE APT 5'
+    assert state_transformer.parse_registration_address(
+        input_dict, address_str)[1] == '3'
+
+    # Anything that doesn't look like a component falls back to usaddress
+    for col, value in [('RESIDENCE_STREET_NUMBER', '85-88'),
+                       ('RESIDENCE_STREET_NUMBER', ' '),
+                       ('STREET_TYPE', 'BRDIGE'),
+                       ('PRE_DIRECTION', 'NORHT'),
+                       ('RESIDENCE_EXTENSION', 'REAR UNIT B')]:
+        bad_dict = dict(input_dict, **{col: value})
+        assert state_transformer.structured_address(bad_dict) is None
+        assert state_transformer.parse_registration_address(
+            bad_dict, address_str)[1] == '2'
+
+
+def test_structured_address_street_type():
+    ny = load_states(['ny'])[0]
+    state_transformer = ny.transformer.StateTransformer()
+    input_dict = {
+        'RADDNUMBER': '322',
+        'RHALFCODE': ' ',
+        'RPREDIRECTION': 'S',
+        'RSTREETNAME': 'Ashley Lodge',
+        'RPOSTDIRECTION': 'W',
+        'RAPARTMENT': '377',
+    }
+    address_dict = state_transformer.structured_address(input_dict)
+    assert address_dict['STREET_NAME'] == 'Ashley'
+    assert address_dict['STREET_NAME_POST_TYPE'] == 'Lodge'
+    assert address_dict['OCCUPANCY_IDENTIFIER'] == '377'
+
+    input_dict['RSTREETNAME'] = 'Broadway'
+    address_dict = state_transformer.structured_address(input_dict)
+    assert address_dict['STREET_NAME'] == 'Broadway'
+    assert address_dict['STREET_NAME_POST_TYPE'] is None
+
+
+def test_row_writer():
+    rows = [{'A': '1', 'B': None}, record_type(['A', 'B'])(['', 'x,y'])]
+    outfile = StringIO()
+    writer = RowWriter(outfile, ['A', 'B'], line_terminator='\n', null='\\N')
+    writer.writeheader()
+    writer.writerows(rows)
+    assert outfile.getvalue() == 'A,B\n1,\\N\n\\N,"x,y"\n'
+
+    outfile = StringIO()
+    csv.DictWriter(outfile, fieldnames=['A', 'B']).writerows(rows)
+    expected = outfile.getvalue()
+    outfile = StringIO()
+    RowWriter(outfile, ['A', 'B']).writerows(rows)
+    assert outfile.getvalue() == expected
+
+    try:
+        RowWriter(StringIO(), ['A'], checked=False).writerows(rows)
+    except ValueError as err:
+        assert "'B'" in str(err)
+    else:
+        assert False, 'unchecked rows with other columns raise ValueError'
@@ -0,0 +1,28 @@
+import random
+from operator import itemgetter
+
+from national_voter_file.transformers.versions import (external_sort,
+                                                       merge_versions)
+
+
+def test_external_sort():
+    rows = [[str(random.randint(0, 50)), str(i)] for i in range(200)]
+    for max_rows in [7, 200, 1000]:
+        assert list(external_sort(rows, itemgetter(0), max_rows=max_rows)) == \
+            sorted(rows, key=itemgetter(0))
+
+
+def test_merge_versions():
+    voters = [['A', 'JANE'], ['A', 'JANET'], ['B', 'BOB'], ['C', 'CARL'],
+              ['D', 'DANA'], ['E', 'ERIN']]
+    current_voters = [['0', '1', 't', 'ZED'],
+                      ['B', '2', 't', 'BOB'],
+                      ['C', '1', 't', 'KARL'],
+                      ['D', '3', 'f', 'DINA']]
+    assert list(merge_versions(voters, current_voters, '2017-02-01')) == [
+        (None, ['A', 'JANE', 1, '1900-01-01', '2199-12-31']),
+        (['C', 1], ['C', 'CARL', 2, '2017-02-01', '2199-12-31']),
+        # D has no version valid on the report date
+        (None, ['D', 'DANA', 4, '2017-02-01', '2199-12-31']),
+        (None, ['E', 'ERIN', 1, '1900-01-01', '2199-12-31']),
+    ]
@@ -0,0 +1,106 @@
+import io
+import os
+import csv
+import json
+import tempfile
+import zipfile
+
+from national_voter_file.transformers.csv_transformer import CsvOutput
+from national_voter_file.transformers.shards import ShardedOutput
+from national_voter_file.us_states.all import load as load_states
+from national_voter_file.tests.synthetic_data import write_state
+from national_voter_file.tests.test_transformers import TEST_DATA_DIR
+
+pa = load_states(['pa'])[0].transformer
+
+# (county, city, ZIP code) of each voter, in file order
+VOTERS = [
+    ('ADAMS', 'GETTYSBURG', ''),
+    ('ADAMS', 'GETTYSBURG', '17325'),
+    ('ADAMS', 'BENDERSVILLE', '17306'),
+    ('ADAMS', 'BENDERSVILLE', ''),
+    ('ADAMS', 'BENDERSVILLE', '17307'),
+    ('BERKS', 'GETTYSBURG', '19601'),
+    ('BERKS', 'GETTYSBURG', ''),
+]
+
+
+def write_statewide(path):
+    with open(os.path.join(TEST_DATA_DIR, 'pa.csv')) as pa_file:
+        lines = pa_file.readlines()
+    fields = pa.StateTransformer.input_fields
+    counties = {}
+    for line, (county, city, zip_code) in zip(lines, VOTERS):
+        values = line.rstrip('\n').split('\t')
+        values[fields.index('COUNTYCODE')] = county
+        values[fields.index('_REGISTRATION_CITY')] = city
+        values[fields.index('ZIP_CODE')] = zip_code
+        counties.setdefault(county, []).append('\t'.join(values) + '\n')
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        for county, county_lines in counties.items():
+            zip_file.writestr('{} FVE 20170102.txt'.format(county),
+                              ''.join(county_lines))
+            zip_file.writestr('{} Zone Types 20170102.txt'.format(county), '')
+
+
+def zip_codes(input_path):
+    """Returns the ZIP code each voter in input_path is transformed with"""
+    state_transformer = pa.StateTransformer()
+    state_preparer = pa.StatePreparer(input_path, 'pa', pa, state_transformer)
+    return [state_transformer.process_row(input_dict)['ZIP_CODE']
+            for input_dict in state_preparer.process()]
+
+
+def test_city_zip_index():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, 'Statewide.zip')
+        write_statewide(input_path)
+        # The first voter's city has one ZIP code in the county, even
+        # though it comes later, and Bendersville has two
+        assert zip_codes(input_path) == ['17325', '17325', '17306', None,
+                                         '17307', '19601', '19601']
+
+        index_path = pa.zip_index_path(input_path)
+        with open(index_path) as index_file:
+            saved = json.load(index_file)
+        assert saved['zips'] == {
+            'ADAMS': {'GETTYSBURG': ['17325'],
+                      'BENDERSVILLE': ['17306', '17307']},
+            'BERKS': {'GETTYSBURG': ['19601']},
+        }
+        # The saved index is used while the voter file hasn't changed
+        saved['zips']['ADAMS']['GETTYSBURG'] = ['17000']
+        with open(index_path, 'w') as index_file:
+            json.dump(saved, index_file)
+        assert zip_codes(input_path)[0] == '17000'
+        stat = os.stat(input_path)
+        os.utime(input_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        assert zip_codes(input_path)[0] == '17325'
+
+
+def run(input_path, output_path, workers=None):
+    state_transformer = pa.StateTransformer()
+    state_transformer.restore_state({'zonecode_column_by_county': {}})
+    state_preparer = pa.StatePreparer(input_path, 'pa', pa, state_transformer)
+    output = CsvOutput(state_transformer, validation='fast')
+    if workers is None:
+        output(state_preparer.process(), output_path)
+    else:
+        ShardedOutput(output, workers=workers)(state_preparer, output_path)
+    with open(output_path) as output_file:
+        return output_file.read()
+
+
+def test_sharded_backfill():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = write_state('pa', tmp_dir, 300, pool_size=20,
+                                 counties=3)
+        state_preparer = pa.StatePreparer(input_path, 'pa', pa,
+                                          pa.StateTransformer())
+        missing = sum(1 for row in state_preparer.process()
+                      if not row['ZIP_CODE'])
+        output_path = os.path.join(tmp_dir, 'pa_output.csv')
+        expected = run(input_path, output_path)
+        assert sum(1 for row in csv.DictReader(io.StringIO(expected))
+                   if not row['ZIP_CODE']) < missing
+        assert run(input_path, output_path, workers=2) == expected
@@ -0,0 +1,253 @@
+import os
+import json
+import hashlib
+import sqlite3
+from collections import Counter, OrderedDict
+
+import usaddress
+
+from national_voter_file.transformers.base import DATA_DIR
+
+"""
+# Address parse cache
+
+Most of the addresses in a voter file are the same as in last month's file,
+and tagging them with usaddress is the most expensive part of transforming a
+row. AddressCache keeps the output of BaseTransformer.usaddress_tag in a
+SQLite file so that re-processing a state only parses new addresses.
+
+LRUCache is the in-memory counterpart used within a single run, e.g. for
+households and apartment buildings that share an address.
+
+## Example usage
+
+>>> cache = AddressCache()  # DATA_DIR/address_cache.sqlite
+>>> state_transformer.address_cache = cache
+>>> ...
+>>> cache.close()
+>>> print(cache.summary())
+
+The cache is cleared whenever the installed usaddress model changes, and
+the least recently used addresses are dropped on close() once there are more
+than max_entries.
+"""
+
+DEFAULT_CACHE_PATH = os.path.join(DATA_DIR, 'address_cache.sqlite')
+
+
+def usaddress_model_signature():
+    """
+    Identifies the installed usaddress model, so cached parses from a
+    different model aren't used
+    """
+    model_hash = hashlib.sha1()
+    with open(usaddress.MODEL_PATH, 'rb') as model_file:
+        for block in iter(lambda: model_file.read(1 << 20), b''):
+            model_hash.update(block)
+    model_hash.update(json.dumps(usaddress.LABELS).encode('utf-8'))
+    return model_hash.hexdigest()
+
+
+def normalize_address(address_str):
+    """
+    usaddress splits on whitespace, so addresses that only differ in
+    spacing get the same tags and share a cache entry
+    """
+    return ' '.join(address_str.split())
+
+
+class AddressCache(object):
+    """
+    Persistent cache of usaddress_tag results keyed by the normalized address
+    string. Writes are buffered and committed every flush_every new entries
+    and on flush() or close().
+
+    The connection is opened on first use and isn't pickled, so a cache
+    handed to worker processes opens its own connection in each of them.
+    """
+
+    name = 'Address cache'
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=5000000,
+                 flush_every=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.stats = Counter()
+        self._conn = None
+        self._run = None
+        self._new_entries = {}
+        self._used_entries = set()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update({
+            'stats': Counter(),
+            '_conn': None,
+            '_run': None,
+            '_new_entries': {},
+            '_used_entries': set(),
+        })
+        return state
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._open()
+        return self._conn
+
+    def _open(self):
+        if os.path.dirname(self.path) and not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_info ('
+                     'key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute('CREATE TABLE IF NOT EXISTS addresses ('
+                     'address TEXT PRIMARY KEY, components TEXT, '
+                     'address_type TEXT, last_used INTEGER)')
+        with conn:
+            info = dict(conn.execute('SELECT key, value FROM cache_info'))
+            model = usaddress_model_signature()
+            if info.get('model') != model:
+                conn.execute('DELETE FROM addresses')
+                self.stats['invalidated'] += 1
+            run = int(info.get('run', 0)) + 1
+            conn.executemany('INSERT OR REPLACE INTO cache_info VALUES (?, ?)',
+                             [('model', model), ('run', str(run))])
+        self._conn = conn
+        self._run = run
+
+    def get(self, address_str):
+        """
+        Returns the cached (usaddress_dict, usaddress_type) for address_str,
+        which is (None, None) for addresses usaddress couldn't parse, or None
+        if the address isn't cached
+        """
+        address = normalize_address(address_str)
+        if address in self._new_entries:
+            self.stats['hits'] += 1
+            return self._decode(*self._new_entries[address])
+        row = self.conn.execute(
+            'SELECT components, address_type, last_used FROM addresses '
+            'WHERE address = ?', (address,)
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        components, address_type, last_used = row
+        if last_used != self._run:
+            self._used_entries.add(address)
+        return self._decode(components, address_type)
+
+    def _decode(self, components, address_type):
+        if components is None:
+            return None, None
+        return dict(json.loads(components)), address_type
+
+    def put(self, address_str, usaddress_dict, usaddress_type):
+        components = None
+        if usaddress_dict is not None:
+            components = json.dumps(list(usaddress_dict.items()))
+        self._new_entries[normalize_address(address_str)] = (components,
+                                                             usaddress_type)
+        if len(self._new_entries) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._new_entries and not self._used_entries:
+            return
+        with self.conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO addresses VALUES (?, ?, ?, ?)',
+                [(address, components, address_type, self._run)
+                 for address, (components, address_type)
+                 in self._new_entries.items()]
+            )
+            self._conn.executemany(
+                'UPDATE addresses SET last_used = ? WHERE address = ?',
+                [(self._run, address) for address in self._used_entries]
+            )
+        self._new_entries = {}
+        self._used_entries = set()
+
+    def evict(self):
+        """Drops the least recently used addresses above max_entries"""
+        num_entries = self.conn.execute('SELECT COUNT(*) FROM addresses').fetchone()[0]
+        if num_entries > self.max_entries:
+            with self._conn:
+                self._conn.execute(
+                    'DELETE FROM addresses WHERE address IN ('
+                    'SELECT address FROM addresses ORDER BY last_used LIMIT ?)',
+                    (num_entries - self.max_entries,)
+                )
+            self.stats['evictions'] += num_entries - self.max_entries
+
+    def close(self):
+        # With worker processes, only they have used the cache, but the
+        # addresses they added are still evicted here
+        self.flush()
+        self.evict()
+        self._conn.close()
+        self._conn = None
+
+    def take_stats(self):
+        """Returns the stats counted since the last call and resets them"""
+        stats, self.stats = self.stats, Counter()
+        return stats
+
+    def summary(self):
+        return cache_summary(self.name, self.stats)
+
+
+class LRUCache(object):
+    """
+    In-memory cache that keeps the max_entries most recently used values.
+
+    Values are shared between everyone who gets them, so only put
+    immutable values (e.g. tuples of dict items) in it.
+    """
+
+    def __init__(self, name, max_entries=10000):
+        self.name = name
+        self.max_entries = max_entries
+        self.stats = Counter()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Returns the value for key, or None if it isn't cached"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.stats['misses'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def take_stats(self):
+        """Returns the stats counted since the last call and resets them"""
+        stats, self.stats = self.stats, Counter()
+        return stats
+
+    def summary(self):
+        return cache_summary(self.name, self.stats)
+
+
+def cache_summary(name, stats):
+    lookups = stats['hits'] + stats['misses']
+    return ('{}: {} hits, {} misses ({:.1%} hit ratio), '
+            '{} evictions').format(
+                name,
+                stats['hits'],
+                stats['misses'],
+                stats['hits'] / lookups if lookups else 0,
+                stats['evictions'],
+            )
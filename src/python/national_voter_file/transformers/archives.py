@@ -0,0 +1,252 @@
+import bz2
+import io
+import struct
+import zlib
+from zipfile import (BadZipFile, ZIP_BZIP2, ZIP_DEFLATED, ZIP_STORED,
+                     sizeFileHeader, structFileHeader)
+
+"""
+# Streaming archives
+
+Some states send archives inside archives, e.g. Colorado's zip of zips of
+voters and gzipped vote history. zipfile can only open a zip from a file it
+can seek in, which a member of another zip isn't without decompressing it
+again for every seek, so these used to be read into memory whole.
+
+iter_zip_members reads a zip from the front instead, the way it was
+written: each member's local header, then its data, decompressed through a
+buffer of CHUNK_SIZE bytes as it's read. Each member is yielded as a binary
+file object, and whatever of it isn't read is skipped when the next member
+is asked for. The central directory at the end is never read, so the zip
+can be any forward-only stream, such as ZipFile.open of a member of an
+outer zip. Members' CRCs are checked when they've been read to the end, and
+raise zipfile.BadZipFile if they don't match.
+
+Stored, deflated and bzip2 members are supported. Other compression
+methods, encrypted members and stored members whose size is only written
+after their data can't be read this way, and raise UnstreamableMember (a
+zipfile.BadZipFile) when they're reached. zipfile can still read those
+from a file it can seek in.
+
+A gzip in a zip doesn't need any of this: gzip.open(zip_obj.open(name))
+reads it forward as well.
+
+## Example usage
+
+>>> import zipfile
+>>> with zipfile.ZipFile('co_voters.zip') as zip_obj:
+...     with zip_obj.open('Registered_Voters_List_ Part1.zip') as part:
+...         for name, member in iter_zip_members(part):
+...             print(name, len(member.readline()))
+Registered_Voters_List_ Part1.txt 538
+"""
+
+CHUNK_SIZE = 1 << 16
+
+LOCAL_FILE_HEADER = b'PK\x03\x04'
+CENTRAL_DIRECTORY = b'PK\x01\x02'
+END_OF_CENTRAL_DIRECTORY = b'PK\x05\x06'
+DATA_DESCRIPTOR = b'PK\x07\x08'
+
+# General purpose flag bits
+FLAG_ENCRYPTED = 0x1
+FLAG_DATA_DESCRIPTOR = 0x8
+FLAG_UTF8 = 0x800
+
+ZIP64_EXTRA = 0x0001
+ZIP64_LIMIT = 0xffffffff
+
+
+class UnstreamableMember(BadZipFile):
+    pass
+
+
+class _Source(object):
+    """A forward-only binary stream that data read too far can be put back on"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.pushed = b''
+
+    def read(self, size=CHUNK_SIZE):
+        if self.pushed:
+            data, self.pushed = self.pushed[:size], self.pushed[size:]
+            return data
+        return self.fileobj.read(size)
+
+    def read_exact(self, size):
+        data = self.read(size)
+        while len(data) < size:
+            more = self.read(size - len(data))
+            if not more:
+                raise BadZipFile('Truncated zip: expected {} bytes, got {}'
+                                 .format(size, len(data)))
+            data += more
+        return data
+
+    def unread(self, data):
+        self.pushed = data + self.pushed
+
+
+class _MemberReader(io.RawIOBase):
+    """The decompressed data of the member of a zip at the front of source"""
+
+    def __init__(self, source, name, method, crc, compressed_size,
+                 file_size, has_descriptor, zip64):
+        self.source = source
+        self.name = name
+        self.crc = crc
+        self.file_size = file_size
+        self.has_descriptor = has_descriptor
+        self.zip64 = zip64
+        # Compressed bytes left to read from source, None if only the
+        # decompressor knows where they end
+        self.remaining = None if has_descriptor else compressed_size
+        self.running_crc = 0
+        self.size = 0
+        self.finished = False
+        if method == ZIP_STORED:
+            if has_descriptor:
+                raise UnstreamableMember(
+                    "Can't stream {}: it's stored and its size is after its "
+                    "data".format(name))
+            self.decompressor = None
+        elif method == ZIP_DEFLATED:
+            self.decompressor = zlib.decompressobj(-15)
+        elif method == ZIP_BZIP2:
+            self.decompressor = bz2.BZ2Decompressor()
+        else:
+            raise UnstreamableMember(
+                "Can't stream {}: compression method {} isn't supported"
+                .format(name, method))
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.finished or not len(buffer):
+            return 0
+        if self.decompressor is None:
+            data = self.read_source(len(buffer))
+            if not data and self.remaining:
+                raise BadZipFile('Truncated zip member {}'.format(self.name))
+        else:
+            data = self.decompress(len(buffer))
+        if not data:
+            self.finish()
+            return 0
+        buffer[:len(data)] = data
+        self.running_crc = zlib.crc32(data, self.running_crc)
+        self.size += len(data)
+        return len(data)
+
+    def read_source(self, size):
+        if self.remaining is not None:
+            size = min(size, self.remaining)
+        data = self.source.read(size) if size else b''
+        if self.remaining is not None:
+            self.remaining -= len(data)
+        return data
+
+    def decompress(self, size):
+        """Returns up to size decompressed bytes, b'' at the end"""
+        decompressor = self.decompressor
+        while not decompressor.eof:
+            if getattr(decompressor, 'needs_input', True):
+                data = (getattr(decompressor, 'unconsumed_tail', b'') or
+                        self.read_source(CHUNK_SIZE))
+                if not data:
+                    raise BadZipFile('Truncated zip member {}'
+                                     .format(self.name))
+            else:
+                # bz2 has more output for what it's been given
+                data = b''
+            output = decompressor.decompress(data, size)
+            if output:
+                return output
+        unused_data = decompressor.unused_data
+        if unused_data:
+            # Read past the end of the member
+            if self.remaining is not None:
+                self.remaining += len(unused_data)
+            self.source.unread(unused_data)
+        return b''
+
+    def finish(self):
+        """Reads the member's data descriptor and checks its CRC and size"""
+        self.finished = True
+        if self.remaining:
+            # Padding after a compressed stream
+            self.source.read_exact(self.remaining)
+        if self.has_descriptor:
+            crc = self.source.read_exact(4)
+            if crc == DATA_DESCRIPTOR:
+                crc = self.source.read_exact(4)
+            self.crc = struct.unpack('<L', crc)[0]
+            self.file_size = struct.unpack(
+                '<QQ' if self.zip64 else '<LL',
+                self.source.read_exact(16 if self.zip64 else 8)
+            )[1]
+        if self.running_crc != self.crc:
+            raise BadZipFile('Bad CRC-32 for file {!r}'.format(self.name))
+        if self.size != self.file_size:
+            raise BadZipFile('Bad size for file {!r}: expected {}, got {}'
+                             .format(self.name, self.file_size, self.size))
+
+    def skip(self):
+        """Reads the rest of the member, even if it's been closed"""
+        buffer = bytearray(CHUNK_SIZE)
+        while self.readinto(buffer):
+            pass
+
+
+def _zip64_sizes(extra, file_size, compressed_size):
+    """Returns the sizes in a local header's zip64 extra field, if it has one"""
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, data_size = struct.unpack('<HH', extra[position:position + 4])
+        data = extra[position + 4:position + 4 + data_size]
+        if header_id == ZIP64_EXTRA:
+            values = list(struct.unpack('<{}Q'.format(len(data) // 8),
+                                        data[:len(data) // 8 * 8]))
+            if file_size == ZIP64_LIMIT and values:
+                file_size = values.pop(0)
+            if compressed_size == ZIP64_LIMIT and values:
+                compressed_size = values.pop(0)
+            return file_size, compressed_size, True
+        position += 4 + data_size
+    return file_size, compressed_size, False
+
+
+def iter_zip_members(fileobj):
+    """
+    Yields the name and a binary file object of each member of the zip read
+    from the front of fileobj, see above
+    """
+    source = _Source(fileobj)
+    while True:
+        signature = source.read(4)
+        if len(signature) < 4 or signature in (CENTRAL_DIRECTORY,
+                                               END_OF_CENTRAL_DIRECTORY):
+            return
+        if signature != LOCAL_FILE_HEADER:
+            raise BadZipFile('Bad local file header signature {!r}'
+                             .format(signature))
+        header = struct.unpack(structFileHeader, signature +
+                               source.read_exact(sizeFileHeader - 4))
+        (_, _, _, flags, method, _, _, crc, compressed_size, file_size,
+         name_length, extra_length) = header
+        name = source.read_exact(name_length)
+        name = name.decode('utf-8' if flags & FLAG_UTF8 else 'cp437')
+        extra = source.read_exact(extra_length)
+        if flags & FLAG_ENCRYPTED:
+            raise UnstreamableMember("Can't stream {}: it's encrypted"
+                                     .format(name))
+        file_size, compressed_size, zip64 = _zip64_sizes(
+            extra, file_size, compressed_size
+        )
+        member = _MemberReader(source, name, method, crc, compressed_size,
+                               file_size, bool(flags & FLAG_DATA_DESCRIPTOR),
+                               zip64)
+        yield name, io.BufferedReader(member, CHUNK_SIZE)
+        member.skip()
@@ -0,0 +1,216 @@
+import datetime
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from national_voter_file.transformers.base import BaseTransformer
+from national_voter_file.transformers.output import BaseOutput
+from national_voter_file.transformers.records import MISSING, record_rows
+
+"""
+# Arrow and Parquet output
+
+ArrowOutput and ParquetOutput write the same rows as CsvOutput, but typed
+and by column, so loading them doesn't mean parsing csv again and readers
+can skip the columns they don't need:
+
+- BIRTHDATE, REGISTRATION_DATE and ELECTION_DATE are date columns, every
+  other column is a string column
+- Empty strings are stored as nulls, the same as loading the csv would
+- Columns with few distinct values (DICTIONARY_COLS) are dictionary encoded
+
+Rows are written row_group_size at a time: one record batch per group in
+an Arrow IPC file, one row group per group in a Parquet file.
+
+pyarrow isn't installed with the rest of the requirements, so it's only
+needed to use these.
+
+## Example usage
+
+>>> writer = ParquetOutput(StateTransformer(), compression='zstd')
+>>> writer(state_preparer.process(), 'ny_output.parquet')
+"""
+
+# Columns with few distinct values, stored as dictionary indices
+DICTIONARY_COLS = frozenset([
+    'ABSENTEE_TYPE',
+    'BIRTHDATE_IS_ESTIMATE',
+    'COUNTYCODE',
+    'ELECTION_TYPE',
+    'GENDER',
+    'MAIL_COUNTRY',
+    'MAIL_STATE',
+    'PARTY',
+    'RACE',
+    'REGISTRATION_STATUS',
+    'STATE_NAME',
+    'VALIDATION_STATUS',
+    'VOTE_METHOD',
+])
+
+
+class ColumnDictionary(object):
+    """
+    Dictionary of a column's values across every batch written, so each
+    batch's dictionary only adds to the one before it. Arrow IPC files can't
+    replace a dictionary between batches, only extend it.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.index = {}
+
+    def encode(self, array):
+        """Returns array as a DictionaryArray of this dictionary"""
+        encoded = array.dictionary_encode()
+        positions = []
+        for value in encoded.dictionary.to_pylist():
+            if value not in self.index:
+                self.index[value] = len(self.values)
+                self.values.append(value)
+            positions.append(self.index[value])
+        indices = pyarrow.compute.take(pyarrow.array(positions, pyarrow.int32()),
+                                       encoded.indices)
+        return pyarrow.DictionaryArray.from_arrays(
+            indices, pyarrow.array(self.values, pyarrow.string())
+        )
+
+
+class ArrowOutput(BaseOutput):
+    """
+    Transforms and validates rows from a StatePreparer and writes them to an
+    Arrow IPC file, see BaseOutput.
+
+    compression is one of compressions or 'none', None for the default.
+    """
+
+    compressions = ('lz4', 'zstd')
+    default_compression = None
+
+    def __init__(self, state_transformer, validation='strict', workers=1,
+                 chunk_size=1000, ordered=True, records=False,
+                 rejects=None, row_group_size=100000, compression=None):
+        if pyarrow is None:
+            raise ImportError('{} needs pyarrow, install it with '
+                              'pip install pyarrow'.format(type(self).__name__))
+        if compression is None:
+            compression = self.default_compression
+        elif compression == 'none':
+            compression = None
+        if compression is not None and compression not in self.compressions:
+            raise ValueError('Compression must be one of {}, found {}'.format(
+                ', '.join(self.compressions), compression
+            ))
+        super(ArrowOutput, self).__init__(state_transformer,
+                                          validation=validation,
+                                          workers=workers,
+                                          chunk_size=chunk_size,
+                                          ordered=ordered,
+                                          records=records,
+                                          rejects=rejects)
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+    @classmethod
+    def schema(cls, history=False):
+        """
+        Returns the pyarrow.Schema of the output columns, from
+        BaseTransformer.col_type_dict (or history_type_dict)
+        """
+        if history:
+            type_dict = BaseTransformer.history_type_dict
+        else:
+            type_dict = BaseTransformer.col_type_dict
+        fields = []
+        for col in cls.fieldnames(history):
+            if datetime.date in type_dict[col]:
+                col_type = pyarrow.date32()
+            elif col in DICTIONARY_COLS:
+                col_type = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+            else:
+                col_type = pyarrow.string()
+            fields.append(pyarrow.field(col, col_type,
+                                        nullable=type(None) in type_dict[col]))
+        return pyarrow.schema(fields)
+
+    def __call__(self, input_iter, output_path, history=False):
+        schema = self.schema(history)
+        dictionaries = dict((field.name, ColumnDictionary()) for field in schema
+                            if pyarrow.types.is_dictionary(field.type))
+        checked = self.validation != 'off'
+        with self.open_writer(output_path, schema) as writer:
+            rows = []
+            for output_chunk in self.output_chunks(input_iter, history):
+                rows.extend(output_chunk)
+                while len(rows) >= self.row_group_size:
+                    self.write_batch(writer, self.record_batch(
+                        rows[:self.row_group_size], schema, dictionaries,
+                        checked
+                    ))
+                    del rows[:self.row_group_size]
+            if rows:
+                self.write_batch(writer, self.record_batch(
+                    rows, schema, dictionaries, checked
+                ))
+
+    @staticmethod
+    def record_batch(rows, schema, dictionaries, checked=True):
+        """
+        Returns a pyarrow.RecordBatch of the output rows (dicts or Records),
+        encoding dictionary columns with dictionaries
+        """
+        columns = zip(*record_rows(rows, schema.names, checked=checked))
+        arrays = []
+        for field, values in zip(schema, columns):
+            if not checked:
+                values = [None if value is MISSING else value
+                          for value in values]
+            if pyarrow.types.is_date(field.type):
+                # Unvalidated rows can have '' for a date
+                arrays.append(pyarrow.array(
+                    [None if value == '' else value for value in values],
+                    field.type
+                ))
+                continue
+            array = pyarrow.array(values, pyarrow.string())
+            array = pyarrow.compute.if_else(
+                pyarrow.compute.equal(array, ''),
+                pyarrow.scalar(None, pyarrow.string()),
+                array
+            )
+            if field.name in dictionaries:
+                array = dictionaries[field.name].encode(array)
+            arrays.append(array)
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def open_writer(self, output_path, schema):
+        options = pyarrow.ipc.IpcWriteOptions(compression=self.compression,
+                                              emit_dictionary_deltas=True)
+        return pyarrow.ipc.new_file(output_path, schema, options=options)
+
+    def write_batch(self, writer, batch):
+        writer.write_batch(batch)
+
+
+class ParquetOutput(ArrowOutput):
+    """
+    Transforms and validates rows from a StatePreparer and writes them to a
+    Parquet file, see BaseOutput and ArrowOutput.
+    """
+
+    compressions = ('snappy', 'gzip', 'brotli', 'lz4', 'zstd')
+    default_compression = 'snappy'
+
+    def open_writer(self, output_path, schema):
+        return pyarrow.parquet.ParquetWriter(
+            output_path, schema, compression=self.compression or 'none'
+        )
+
+    def write_batch(self, writer, batch):
+        writer.write_table(pyarrow.Table.from_batches([batch]),
+                           row_group_size=self.row_group_size)
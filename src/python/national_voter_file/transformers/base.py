@@ -1,15 +1,61 @@
 import os
+import re
 import csv
 import datetime
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from io import TextIOWrapper
 import zipfile
 from functools import wraps
+from itertools import islice
 
 import usaddress
 
+from national_voter_file.transformers.dates import get_date_parser
+from national_voter_file.transformers.fast_address import fast_tag
+from national_voter_file.transformers.records import (MISSING, read_records,
+                                                      record_type)
+from national_voter_file.transformers.usps import (DIRECTIONALS,
+                                                   STREET_SUFFIXES,
+                                                   UNIT_DESIGNATORS)
+
 DATA_DIR = os.path.join(os.path.abspath(os.getcwd()), 'data')
 
+# What BaseTransformer.process_row does for each row, see row_plan
+RowPlan = namedtuple('RowPlan', ['null_cols', 'output_cols', 'input_cols',
+                                 'col_sources', 'steps'])
+ExtractStep = namedtuple('ExtractStep', ['name', 'func', 'later_col_map_cols'])
+
+
+def col_map_error(method_name, col_list):
+    return 'Must implement {} method or include {} in col_map'.format(
+        method_name, ', '.join(col_list)
+    )
+
+
+def is_unit_designator(value):
+    return value.upper().rstrip('.') in UNIT_DESIGNATORS
+
+
+def is_unit_identifier(value):
+    return (re.match(r'^#?[A-Za-z0-9-]+$', value) is not None
+            and not is_unit_designator(value))
+
+
+# What a source address component has to look like to be used as is by
+# BaseTransformer.structured_address, by standard column name
+ADDRESS_COMPONENT_CHECKS = {
+    'ADDRESS_NUMBER': re.compile(r'^\d+$').match,
+    'ADDRESS_NUMBER_PREFIX': re.compile(r'^[A-Za-z]{1,2}$').match,
+    'ADDRESS_NUMBER_SUFFIX': re.compile(r'^([A-Za-z]|\d/\d)$').match,
+    'STREET_NAME': re.compile(r"^[A-Za-z0-9][A-Za-z0-9 .'&-]*$").match,
+    'STREET_NAME_PRE_DIRECTIONAL': lambda v: v.upper() in DIRECTIONALS,
+    'STREET_NAME_POST_DIRECTIONAL': lambda v: v.upper() in DIRECTIONALS,
+    'STREET_NAME_PRE_TYPE': lambda v: v.upper() in STREET_SUFFIXES,
+    'STREET_NAME_POST_TYPE': lambda v: v.upper() in STREET_SUFFIXES,
+    'OCCUPANCY_TYPE': is_unit_designator,
+    'OCCUPANCY_IDENTIFIER': is_unit_identifier,
+}
+
 """
 # Raw voter data -> standardized data frame
 
@@ -45,6 +91,9 @@ class BasePreparer(object):
     Mostly, this is just opening the file and processing through csv.DictReader.
     You'll most commonly change `sep` and `default_file` attributes
 
+    With records=True, dict_iterator reads rows with read_records, which
+    skips csv.DictReader's per-row overhead.
+
     However, if you need to, e.g. open a zip file and match metadata across files,
     then this is the class to override.  Basically, anything that involves file opens()
     should be done here.  Then anything that processes dict input should be done in the
@@ -56,7 +105,7 @@ class BasePreparer(object):
     state_name = ''
 
     def __init__(self, input_path, state_path=None, state_module=None,
-                 transformer=None, history=False):
+                 transformer=None, history=False, records=False):
 
         if transformer:
             self.transformer = transformer
@@ -67,6 +116,7 @@ class BasePreparer(object):
         if state_module:
             self.default_file = state_module.default_file
         self.history = history
+        self.records = records
         filename = self.default_file
 
         if os.path.isdir(input_path):
@@ -108,12 +158,201 @@ class BasePreparer(object):
     def process(self):
         return self.dict_iterator(self.open(self.input_path))
 
+    def checkpoint(self, rows):
+        """
+        Returns where process() is after its first rows rows, as a dict that
+        can be saved as JSON and passed to resume. See checkpoint.py.
+        """
+        return {'rows': rows}
+
+    def resume(self, position):
+        """
+        Returns the rows of process() after a position from checkpoint.
+        Override if the input can be skipped without reading it.
+        """
+        return islice(self.process(), position['rows'], None)
+
+    def partitions(self):
+        """
+        Returns the names of the parts of the input that can be transformed
+        independently of each other, in order, or None if it can't be split.
+        See shards.py.
+        """
+        return None
+
+    def process_partition(self, partition):
+        """Returns the rows of one of partitions()"""
+        raise NotImplementedError
+
+    def partition_size(self, partition):
+        """Returns how big a partition is, so the largest start first"""
+        return 0
+
     def dict_iterator(self, infile):
+        if self.records:
+            return read_records(infile, delimiter=self.sep,
+                                fieldnames=self.transformer.input_fields)
         reader = csv.DictReader(infile, delimiter=self.sep,
                                 fieldnames=self.transformer.input_fields)
         return reader
 
 
+class OutputValidator(object):
+    """
+    Checks output rows against a col_type_dict and limited_value_dict.
+    Everything that doesn't depend on the row is worked out once here, so
+    checking a valid row is a single pass over the columns in a fixed
+    order. Error messages are only put together when a row fails.
+
+    Modes:
+        strict: columns, types and limited values are checked
+        fast: columns and types are checked, limited values aren't
+        off: nothing is checked and strings aren't stripped
+
+    Records of record_type (see records.py) are checked by position instead
+    of by column name.
+    """
+
+    modes = ('strict', 'fast', 'off')
+
+    def __init__(self, type_dict, limited_value_dict=None, mode='strict'):
+        if mode not in self.modes:
+            raise ValueError('Validation mode must be one of {}, found {}'.format(
+                ', '.join(self.modes), mode
+            ))
+        self.type_dict = type_dict
+        self.limited_value_dict = limited_value_dict or {}
+        self.mode = mode
+        self.columns = frozenset(type_dict)
+        self.record_type = record_type(sorted(type_dict))
+
+        check_values = mode == 'strict'
+        # (column, acceptable types, acceptable values or None, allows None)
+        self.checks = tuple(
+            (col,
+             frozenset(type_dict[col]),
+             frozenset(self.limited_value_dict[col])
+             if check_values and col in self.limited_value_dict else None,
+             type(None) in type_dict[col])
+            for col in sorted(type_dict)
+        )
+
+    def __call__(self, output_dict):
+        if self.mode == 'off':
+            return
+        if type(output_dict) is self.record_type:
+            return self.check_record(output_dict)
+        if output_dict.keys() != self.columns:
+            self.raise_errors(output_dict)
+
+        valid = True
+        none_type = type(None)
+        for col, acceptable_types, acceptable_values, allows_none in self.checks:
+            value = output_dict[col]
+            value_type = type(value)
+            # Strip strings, if empty strings set type to None
+            if value_type is str:
+                stripped = value.strip()
+                if stripped is not value:
+                    output_dict[col] = value = stripped
+                if not value:
+                    value_type = none_type
+            if value_type not in acceptable_types:
+                valid = False
+            elif (acceptable_values is not None and
+                  value not in acceptable_values and
+                  not (value is None and allows_none)):
+                valid = False
+        if not valid:
+            self.raise_errors(output_dict)
+
+    def check_record(self, record):
+        """__call__ for a Record of self.record_type"""
+        row = record.row
+        if record.extra or MISSING in row:
+            self.raise_errors(record)
+
+        valid = True
+        none_type = type(None)
+        checks = self.checks
+        for i, value in enumerate(row):
+            col, acceptable_types, acceptable_values, allows_none = checks[i]
+            value_type = type(value)
+            if value_type is str:
+                stripped = value.strip()
+                if stripped is not value:
+                    row[i] = value = stripped
+                if not value:
+                    value_type = none_type
+            if value_type not in acceptable_types:
+                valid = False
+            elif (acceptable_values is not None and
+                  value not in acceptable_values and
+                  not (value is None and allows_none)):
+                valid = False
+        if not valid:
+            self.raise_errors(record)
+
+    def raise_errors(self, output_dict):
+        """
+        Raises the error for a row that failed validation, listing
+        everything that's wrong with it
+        """
+        correct_output_col_set = set(self.type_dict.keys())
+        output_dict_col_set = set(output_dict.keys())
+
+        missing_cols = correct_output_col_set - output_dict_col_set
+        extra_cols = output_dict_col_set - correct_output_col_set
+
+        if len(missing_cols) > 0 or len(extra_cols) > 0:
+            error_message = (
+                'Column(s) {} are required but missing.\n'
+                'Column(s) {} are present but not required.').format(
+                    list(missing_cols),
+                    list(extra_cols),
+                )
+            raise ValueError(error_message)
+
+        # check to make sure columns are of the correct type
+        type_errors = []
+        for colname, value in output_dict.items():
+            if isinstance(value, str):
+                value_type = str if len(value.strip()) > 0 else type(None)
+            else:
+                value_type = type(value)
+            acceptable_types = self.type_dict[colname]
+            if value_type not in acceptable_types:
+                type_errors.append(
+                    'Column {} requires type(s) {}, found {}.'.format(
+                        colname,
+                        list(acceptable_types),
+                        value_type,
+                    )
+                )
+        if len(type_errors) > 0:
+            error_str = '\n'.join(sorted(type_errors))
+            raise TypeError(error_str)
+
+        # check to make sure columns contain correct values
+        if self.mode == 'strict':
+            value_errors = []
+            for col, vals in self.limited_value_dict.items():
+                output_value = output_dict[col]
+                # if we allow None, ignore None
+                if output_value is None and type(None) in self.type_dict[col]:
+                    continue
+                if output_value not in vals:
+                    error_message = 'Column {} requires value(s) {}, found {}'.format(
+                        col,
+                        list(vals),
+                        output_value,
+                    )
+                    value_errors.append(error_message)
+            if len(value_errors) > 0:
+                error_str = '\n'.join(sorted(value_errors))
+                raise ValueError(error_str)
+
+
 class BaseTransformer(object):
     """
     Provides helper methods and template methods for transforming raw data
@@ -136,9 +375,14 @@ class BaseTransformer(object):
     indicate whether each method is always required or can be ignored if its
     respective columns are include in col_map.
 
+    process_row doesn't look the extract methods up on every row. They are
+    collected once per class by row_plan, so don't name any other method
+    starting with "extract" or "hist_".
+
     The validate_output_row method ensures that exactly the correct columns
     are present at that they contain variables of the types allowed in
-    col_type_dict.
+    col_type_dict. The checks are compiled once per class into an
+    OutputValidator by output_validator.
 
     If you require column-specific checks, such as ensuring that 'PARTY' is
     either 'DEM' or 'REP', add this to the limited_value_dict class variable,
@@ -319,6 +563,29 @@ class BaseTransformer(object):
     col_map = {}
     input_fields = []
 
+    # For states whose files already split the registration address into
+    # components, {standard column: input column}, and the input column
+    # holding the unit as free text (e.g. 'APT 5'), if there is one. See
+    # structured_address.
+    address_component_map = {}
+    address_occupancy_col = None
+
+    # Whether usaddress_tag tries fast_address.fast_tag before usaddress
+    fast_address_tag = True
+    # Optional AddressCache used by usaddress_tag
+    address_cache = None
+    # Optional in-memory LRUCaches for usaddress_tag and convert_usaddress_dict
+    usaddress_lru = None
+    usaddress_dict_lru = None
+    # Optional Profiler timing sampled rows, see profiling.py
+    profiler = None
+
+    # Whether rows can be split between separate StateTransformer instances,
+    # as CsvOutput does with more than one worker. Set to False if the
+    # preparer loads state into the transformer while reading the file or
+    # a row depends on the rows before it.
+    parallel_safe = True
+
     history_type_dict = {
         'STATE_VOTER_REF': set([str]),
         'ELECTION_DATE': set([datetime.date]),
@@ -329,33 +596,98 @@ class BaseTransformer(object):
     #### Extract decorator
     def check_col_map(col_list):
         """
-        Decorator that takes argument col_list and checks to see if all columns
-        are in the transformer's col_map object.
-        If so, it returns a dict with the columns as keys, otherwise raises a
-        NotImplementedError
+        Decorator that takes argument col_list and marks the method as one that
+        can be filled straight from the transformer's col_map object.
+
+        row_plan checks that all columns are in col_map when the transformer is
+        created, raising a NotImplementedError if they aren't, and copies them
+        in its col_map stage instead of calling the method. Called directly,
+        the method returns a dict with the columns as keys.
         """
         def extract_decorator(f):
             @wraps(f)
             def wrapped(self, input_dict):
                 if all(col in self.col_map for col in col_list):
                     return {
-                        (c, input_dict.get(self.col_map[c])) for c in col_list
+                        c: input_dict.get(self.col_map[c]) for c in col_list
                     }
                 else:
-                    raise NotImplementedError(
-                        'Must implement {} method or include {} in col_map'.format(
-                            f.__name__, ', '.join(col_list)
-                        )
-                    )
+                    raise NotImplementedError(col_map_error(f.__name__, col_list))
+            wrapped.col_list = col_list
             return wrapped
         return extract_decorator
 
     #### Row processing methods ################################################
 
+    def __init__(self):
+        # Build both plans up front so a missing col_map entry fails at
+        # startup rather than on the first row
+        self.row_plan()
+        self.row_plan(history=True)
+
+    @classmethod
+    def row_plan(cls, history=False):
+        """
+        Compiles what process_row does for each row. The plan is built once
+        per class and cached on it, so the dir() scan doesn't happen per row.
+
+        Methods still using the check_col_map version from this class are
+        folded into a single col_map stage: output columns mapped to None
+        are constant, the rest are copied from their input columns in one
+        pass. Every other 'extract' or 'hist_' method becomes an ExtractStep
+        and is called in the same order as dir().
+
+        Results are merged as if every method ran in dir() order, so a step
+        returning a col_map column whose method sorts after it still ends up
+        with the col_map value. Each step keeps those columns in
+        later_col_map_cols.
+
+        Inputs:
+            history: whether to plan the 'hist_' methods instead
+        Outputs:
+            RowPlan for this class
+        """
+        plan_attr = '_hist_row_plan' if history else '_row_plan'
+        # Look in the class __dict__ so subclasses don't reuse a parent's plan
+        plan = cls.__dict__.get(plan_attr)
+        if plan is None:
+            method_str = 'hist_' if history else 'extract'
+            null_cols = {}
+            output_cols = []
+            input_cols = []
+            col_sources = {}
+            steps = []
+            for name in dir(cls):
+                func = getattr(cls, name)
+                if not name.startswith(method_str) or not callable(func):
+                    continue
+                col_list = getattr(func, 'col_list', None)
+                if col_list is None:
+                    steps.append((name, func, []))
+                    continue
+                if not all(col in cls.col_map for col in col_list):
+                    raise NotImplementedError(col_map_error(name, col_list))
+                for col in col_list:
+                    col_sources[col] = cls.col_map[col]
+                    if cls.col_map[col] is None:
+                        null_cols[col] = None
+                    else:
+                        output_cols.append(col)
+                        input_cols.append(cls.col_map[col])
+                    for step in steps:
+                        step[2].append(col)
+            steps = tuple(ExtractStep(name, func, frozenset(later_cols))
+                          for name, func, later_cols in steps)
+            plan = RowPlan(null_cols, tuple(output_cols), tuple(input_cols),
+                           col_sources, steps)
+            setattr(cls, plan_attr, plan)
+        return plan
+
     def process_row(self, input_dict, history=False):
         """
-        Calls each class method that begins with 'extract' or 'hist'
-        depending on history argument
+        Runs the class's row_plan: copies the col_map columns, then calls each
+        class method that begins with 'extract' or 'hist' depending on
+        history argument
         Passes input_dict as the argument to each method
         Updates output_dict with the results from each method
 
@@ -365,19 +697,46 @@ class BaseTransformer(object):
             output_dict: A dictionary containing the fields given in
                 self.col_type_dict
         """
-        if history:
-            method_str = 'hist_'
-        else:
-            method_str = 'extract'
-        output_dict = {}
-        # Build a list of all instance methods that begin with method string
-        extract_funcs = [
-            getattr(self, x) for x in dir(self) if x.startswith(method_str)
-        ]
-        for func in extract_funcs:
-            output_dict.update(func(input_dict))
+        plan = self.row_plan(history)
+        output_dict = dict(plan.null_cols)
+        output_dict.update(zip(plan.output_cols,
+                               map(input_dict.get, plan.input_cols)))
+        for step in plan.steps:
+            try:
+                step_dict = step.func(self, input_dict)
+            except Exception as err:
+                # For rejects files, see output.rejected_row
+                err.failed_step = step.name
+                raise
+            output_dict.update(step_dict)
+            if not step.later_col_map_cols.isdisjoint(step_dict):
+                for col in step.later_col_map_cols.intersection(step_dict):
+                    source = plan.col_sources[col]
+                    output_dict[col] = (None if source is None
+                                        else input_dict.get(source))
         return output_dict
 
+    def checkpoint_state(self):
+        """
+        Returns what the transformer has learned from the rows so far, as a
+        dict that can be saved as JSON. Transformers that keep state between
+        rows override this and restore_state, see checkpoint.py.
+        """
+        return {}
+
+    def restore_state(self, state):
+        """Restores state returned by checkpoint_state"""
+        pass
+
+    def caches(self):
+        """
+        Returns the caches set on this transformer, for reporting their stats
+        """
+        return [cache for cache in [self.address_cache,
+                                    self.usaddress_lru,
+                                    self.usaddress_dict_lru]
+                if cache is not None]
+
     #### Use the registerd address if no mailing address provided
     def fix_missing_mailing_addr(self, orig_dict):
         """
@@ -465,78 +824,52 @@ class BaseTransformer(object):
     #### Output validation methods #############################################
 
     @classmethod
-    def validate_output_row(cls, output_dict, history=False):
+    def output_validator(cls, history=False, mode='strict'):
+        """
+        Returns the OutputValidator for this class, built from its own
+        col_type_dict (or history_type_dict) and limited_value_dict the first
+        time it's asked for and cached on the class after that.
+
+        Inputs:
+            history: whether to validate vote history rows
+            mode: one of OutputValidator.modes
+        Outputs:
+            OutputValidator instance
+        """
+        # Look in the class __dict__ so subclasses with their own
+        # col_type_dict (e.g. MI) don't reuse a parent's validator
+        validators = cls.__dict__.get('_output_validators')
+        if validators is None:
+            validators = {}
+            setattr(cls, '_output_validators', validators)
+        if (history, mode) not in validators:
+            if history:
+                validators[(history, mode)] = OutputValidator(
+                    cls.history_type_dict, mode=mode
+                )
+            else:
+                validators[(history, mode)] = OutputValidator(
+                    cls.col_type_dict, cls.limited_value_dict, mode=mode
+                )
+        return validators[(history, mode)]
+
+    @classmethod
+    def validate_output_row(cls, output_dict, history=False, mode='strict'):
         """
         Ensures
         - Output columns match those in cls.col_type_dict
         - Column value types match those in cls.col_type_dict
+        - Columns in cls.limited_value_dict have one of the allowed values
+
+        Strings are stripped in place. See OutputValidator for what each
+        mode checks.
 
         Inputs:
             output_dict: A dictionary of format {output_column_str: value}
         Outputs:
             None
         """
-        # Check to make sure correct columns are present
-        if history:
-            type_dict = cls.history_type_dict
-        else:
-            type_dict = cls.col_type_dict
-
-        correct_output_col_set = set(type_dict.keys())
-        output_dict_col_set = set(output_dict.keys())
-
-        missing_cols = correct_output_col_set - output_dict_col_set
-        extra_cols = output_dict_col_set - correct_output_col_set
-
-        if len(missing_cols) > 0 or len(extra_cols) > 0:
-            error_message = (
-                'Column(s) {} are required but missing.\n'
-                'Column(s) {} are present but not required.').format(
-                    list(missing_cols),
-                    list(extra_cols),
-                )
-            raise ValueError(error_message)
-
-        # check to make sure columns are of the correct type
-        type_errors = []
-        for colname, value in output_dict.items():
-            # Strip strings, if empty strings set type to None
-            if isinstance(value, str):
-                output_dict[colname] = value.strip()
-                value_type = str if len(value.strip()) > 0 else type(None)
-            else:
-                value_type = type(value)
-            acceptable_types = type_dict[colname]
-            if value_type not in acceptable_types:
-                type_errors.append(
-                    'Column {} requires type(s) {}, found {}.'.format(
-                        colname,
-                        list(acceptable_types),
-                        value_type,
-                    )
-                )
-        if len(type_errors) > 0:
-            error_str = '\n'.join(sorted(type_errors))
-            raise TypeError(error_str)
-
-        # check to make sure columns contain correct values
-        if not history:
-            value_errors = []
-            for col, vals in cls.limited_value_dict.items():
-                output_value = output_dict[col]
-                # if we allow None, ignore None
-                if output_value is None and type(None) in cls.col_type_dict[col]:
-                    continue
-                if output_value not in vals:
-                    error_message = 'Column {} requires value(s) {}, found {}'.format(
-                        col,
-                        list(vals),
-                        output_value,
-                    )
-                    value_errors.append(error_message)
-            if len(value_errors) > 0:
-                error_str = '\n'.join(sorted(value_errors))
-                raise ValueError(error_str)
+        cls.output_validator(history, mode)(output_dict)
 
     #### Basic conversion methods ##############################################
 
@@ -547,8 +880,87 @@ class BaseTransformer(object):
             date_format: optional, format of the date passed in
         Outputs:
             A datetime object created according to self.date_format
+
+        Parsing is done by dates.DateParser, which gives the same results
+        and errors as datetime.strptime
         """
-        return datetime.datetime.strptime(date_str, date_format or self.date_format).date()
+        return get_date_parser(date_format or self.date_format)(date_str)
+
+    def parse_registration_address(self, input_dict, address_str):
+        """
+        Takes the registration address from its components in input_dict if
+        they're well-formed (see structured_address), and tags address_str
+        with usaddress otherwise.
+
+        Inputs:
+            input_dict: dictionary of form {colname: value} from raw data
+            address_str: the same address as a single string
+        Outputs:
+            (address_dict, validation_status), where address_dict is of form
+            {standardized_colname: value} or None if the address couldn't be
+            parsed, and validation_status is '3' for addresses taken from
+            their components, '2' for ones parsed by usaddress and '1'
+            otherwise
+        """
+        address_dict = self.structured_address(input_dict)
+        if address_dict is not None:
+            return address_dict, '3'
+        usaddress_dict = self.usaddress_tag(address_str)[0]
+        if usaddress_dict:
+            return self.convert_usaddress_dict(usaddress_dict), '2'
+        return None, '1'
+
+    def structured_address(self, input_dict):
+        """
+        Builds the same dict as convert_usaddress_dict straight from the
+        input columns in self.address_component_map, skipping usaddress.
+
+        Only used when every component looks like what usaddress would tag
+        it as: a numeric ADDRESS_NUMBER, a STREET_NAME, USPS directionals,
+        street types and unit designators, and a unit in
+        self.address_occupancy_col of the form 'APT 5' or '#5'. If there's
+        no STREET_NAME_POST_TYPE column, a USPS street type at the end of
+        the street name is split off into it, as usaddress does.
+
+        Inputs:
+            input_dict: dictionary of form {colname: value} from raw data
+        Outputs:
+            address_dict: A dictionary of form {standardized_colname: value},
+            or None if the components aren't well-formed
+        """
+        if not self.address_component_map:
+            return None
+
+        address_dict = self.constructEmptyResidentialAddress()
+        for col, input_col in self.address_component_map.items():
+            value = (input_dict[input_col] or '').strip()
+            if value:
+                if not ADDRESS_COMPONENT_CHECKS[col](value):
+                    return None
+                address_dict[col] = value
+
+        if not address_dict['ADDRESS_NUMBER'] or not address_dict['STREET_NAME']:
+            return None
+
+        if self.address_occupancy_col:
+            occupancy = (input_dict[self.address_occupancy_col] or '').split()
+            if len(occupancy) == 2 and is_unit_designator(occupancy[0]) \
+                    and is_unit_identifier(occupancy[1]):
+                address_dict['OCCUPANCY_TYPE'] = occupancy[0]
+                address_dict['OCCUPANCY_IDENTIFIER'] = occupancy[1]
+            elif len(occupancy) == 1 and occupancy[0].startswith('#') \
+                    and is_unit_identifier(occupancy[0]):
+                address_dict['OCCUPANCY_IDENTIFIER'] = occupancy[0]
+            elif occupancy:
+                return None
+
+        if 'STREET_NAME_POST_TYPE' not in self.address_component_map:
+            street_name = address_dict['STREET_NAME'].rsplit(None, 1)
+            if len(street_name) == 2 and street_name[1].upper() in STREET_SUFFIXES:
+                address_dict['STREET_NAME'] = street_name[0]
+                address_dict['STREET_NAME_POST_TYPE'] = street_name[1]
+
+        return address_dict
 
     def usaddress_tag(self, address_str):
         """
@@ -559,11 +971,44 @@ class BaseTransformer(object):
         We use a simple convention of if there's a USPSBoxID, then it's a PO Box,
         otherwise it's a Street Address
 
+        Addresses that fast_address.fast_tag recognizes skip usaddress
+        (see self.fast_address_tag). Results are looked up in and saved to
+        self.usaddress_lru and self.address_cache, in that order, if they
+        are set. Cached results are copied so callers can change the dict
+        they get back.
+
         Input:
             address_str: string of address from input file
         Output:
             Dictionary containing tagged parts of addresses
         """
+        if self.usaddress_lru is None:
+            return self._usaddress_tag(address_str)
+
+        cached = self.usaddress_lru.get(address_str)
+        if cached is None:
+            usaddress_dict, usaddress_type = self._usaddress_tag(address_str)
+            self.usaddress_lru.put(address_str, (
+                tuple(usaddress_dict.items()) if usaddress_dict is not None else None,
+                usaddress_type
+            ))
+            return usaddress_dict, usaddress_type
+        usaddress_items, usaddress_type = cached
+        if usaddress_items is None:
+            return None, None
+        return dict(usaddress_items), usaddress_type
+
+    def _usaddress_tag(self, address_str):
+        if self.fast_address_tag:
+            tagged = fast_tag(address_str)
+            if tagged is not None:
+                return tagged
+
+        if self.address_cache is not None:
+            cached = self.address_cache.get(address_str)
+            if cached is not None:
+                return cached
+
         try:
             usaddress_dict, usaddress_type = usaddress.tag(address_str)
 
@@ -572,13 +1017,15 @@ class BaseTransformer(object):
                 usaddress_type = 'PO Box'
             else:
                 usaddress_type = 'Street Address'
-            return usaddress_dict, usaddress_type
 
         except usaddress.RepeatedLabelError as e:
             # If USAddress fails then just return None to set the
             # VALIDATION_STATUS appropriatly. We will have to manually fix the address later
-            return None, None
+            usaddress_dict, usaddress_type = None, None
 
+        if self.address_cache is not None:
+            self.address_cache.put(address_str, usaddress_dict, usaddress_type)
+        return usaddress_dict, usaddress_type
 
     def convert_usaddress_dict(self, usaddress_dict):
         """
@@ -589,11 +1036,25 @@ class BaseTransformer(object):
         - Adds None for potential fields that were not used in the present
           address
 
+        Conversions are kept in self.usaddress_dict_lru if it's set, and a
+        new dict is returned every time.
+
         Inputs:
             usaddress_dict: A dictionary created by the usaddress.tag method
         Outputs:
             address_dict: A dictionary of form {standardized_colname: value}
         """
+        if self.usaddress_dict_lru is None:
+            return self._convert_usaddress_dict(usaddress_dict)
+
+        usaddress_items = tuple(usaddress_dict.items())
+        cached = self.usaddress_dict_lru.get(usaddress_items)
+        if cached is None:
+            cached = tuple(self._convert_usaddress_dict(usaddress_dict).items())
+            self.usaddress_dict_lru.put(usaddress_items, cached)
+        return dict(cached)
+
+    def _convert_usaddress_dict(self, usaddress_dict):
         address_dict = {}
         for k, v in self.usaddress_to_standard_colnames_dict.items():
             address_dict[v] = usaddress_dict.get(k, None)
@@ -0,0 +1,134 @@
+import os
+import json
+
+from national_voter_file.transformers.output import output_base
+
+"""
+# Checkpoints
+
+Transforming a big state takes hours, and an exception in any row loses all
+of it. A Checkpoint saves how far a run got to a JSON file next to the output
+(see checkpoint_path) every `every` rows, once those rows are written:
+
+- rows: input rows transformed and written so far
+- input: where the state preparer is after those rows, from
+  StatePreparer.checkpoint, e.g. the zip member and row within it
+- output_bytes: size of the output file after those rows
+- transformer: what the state transformer has learned from earlier rows,
+  from StateTransformer.checkpoint_state
+- rejects: the size and counts of the rejects file, if there is one, from
+  RejectWriter.checkpoint_state
+
+Resuming truncates the output to output_bytes, restores the transformer and
+continues from StatePreparer.resume, so earlier rows aren't transformed
+again. The checkpoint is removed once the run finishes.
+
+## Example usage
+
+>>> checkpoint = Checkpoint(checkpoint_path(output_path), state_preparer)
+>>> input_iter = checkpoint.resume() if resuming else state_preparer.process()
+>>> CsvOutput(state_transformer, checkpoint=checkpoint)(input_iter, output_path)
+"""
+
+
+def checkpoint_path(output_path):
+    """Returns the path of the checkpoint of an output file"""
+    return '{}_checkpoint.json'.format(output_base(output_path))
+
+
+class Checkpoint(object):
+    """
+    Saves a checkpoint of state_preparer, its transformer and rejects, a
+    RejectWriter or None, to path every `every` rows written, see the notes
+    above.
+
+    Attributes:
+        rows: input rows written so far, including those before resuming
+        saved: the checkpoint resumed from, or None
+    """
+
+    def __init__(self, path, state_preparer, every=100000, rejects=None):
+        self.path = path
+        self.state_preparer = state_preparer
+        self.every = every
+        self.rejects = rejects
+        self.rows = 0
+        self.saved = None
+        self._start_rows = 0
+        self._saved_rows = 0
+
+    def load(self):
+        """Returns the saved checkpoint, or None if there isn't one"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as checkpoint_file:
+            return json.load(checkpoint_file)
+
+    def resume(self):
+        """
+        Restores the transformer and rejects from the saved checkpoint and
+        returns the input rows after it. Starts from the beginning if there's
+        none.
+        """
+        self.saved = self.load()
+        if self.saved is None:
+            print('Warn - no checkpoint at {}, starting from the '
+                  'beginning'.format(self.path))
+            if self.rejects is not None:
+                self.rejects.open()
+            return self.state_preparer.process()
+        self.rows = self._start_rows = self._saved_rows = self.saved['rows']
+        self.state_preparer.transformer.restore_state(
+            self.saved['transformer']
+        )
+        if self.rejects is not None:
+            self.rejects.open(self.saved.get('rejects'))
+        return self.state_preparer.resume(self.saved['input'])
+
+    def open_output(self, output_path, open_output):
+        """
+        Opens output_path with open_output(path, mode), truncated to the
+        saved checkpoint. Returns the file and whether it was resumed.
+        """
+        if self.saved is None:
+            return open_output(output_path, 'w'), False
+        outfile = open_output(output_path, 'r+')
+        outfile.seek(0, os.SEEK_END)
+        if outfile.tell() < self.saved['output_bytes']:
+            outfile.close()
+            raise ValueError('{} is shorter than its checkpoint at {}'.format(
+                output_path, self.path
+            ))
+        outfile.seek(self.saved['output_bytes'])
+        outfile.truncate()
+        return outfile, True
+
+    def written(self, rows, outfile):
+        """
+        Takes the number of input rows written to outfile since resuming,
+        saving a checkpoint every `every` rows
+        """
+        self.rows = self._start_rows + rows
+        if self.rows - self._saved_rows >= self.every:
+            self.save(outfile)
+
+    def save(self, outfile):
+        outfile.flush()
+        checkpoint = {
+            'rows': self.rows,
+            'input': self.state_preparer.checkpoint(self.rows),
+            'output_bytes': outfile.tell(),
+            'transformer': self.state_preparer.transformer.checkpoint_state(),
+        }
+        if self.rejects is not None:
+            checkpoint['rejects'] = self.rejects.checkpoint_state()
+        temp_path = '{}.new'.format(self.path)
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+        os.replace(temp_path, self.path)
+        self._saved_rows = self.rows
+
+    def finish(self):
+        """Removes the checkpoint once the run is done"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
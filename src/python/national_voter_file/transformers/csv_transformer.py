@@ -1,14 +1,34 @@
 import csv
 import os
+import time
 import zipfile
 import argparse
 import traceback
 
 from national_voter_file.transformers.base import (DATA_DIR,
                                                    BasePreparer,
-                                                   BaseTransformer)
+                                                   OutputValidator)
+from national_voter_file.transformers.address_cache import (AddressCache,
+                                                            DEFAULT_CACHE_PATH,
+                                                            LRUCache)
+from national_voter_file.transformers.arrow_output import (ArrowOutput,
+                                                           ParquetOutput)
+from national_voter_file.transformers.checkpoint import (Checkpoint,
+                                                         checkpoint_path)
+from national_voter_file.transformers.delta import (DeltaIndex,
+                                                    removed_path,
+                                                    snapshot_path)
+from national_voter_file.transformers.dimensions import DimensionWriter
+from national_voter_file.transformers.output import BaseOutput, output_base
+from national_voter_file.transformers.profiling import Profiler
+from national_voter_file.transformers.records import MISSING, record_rows
+from national_voter_file.transformers.rejects import (RejectWriter,
+                                                      rejects_path)
+from national_voter_file.transformers.shards import ShardedOutput
 from national_voter_file.us_states.all import load as load_states
 
+LINE_TERMINATORS = {'crlf': '\r\n', 'lf': '\n'}
+
 parser = argparse.ArgumentParser(description='Process some integers.')
 
 parser.add_argument("-s", "--states", dest="states", metavar="US_STATES",
@@ -24,11 +44,210 @@ parser.add_argument('--history',
                     dest='history',
                     action='store_true',
                     help='Flag for setting whether to run vote history processing')
+parser.add_argument('--validation',
+                    dest='validation', default='strict',
+                    choices=OutputValidator.modes,
+                    help='How output rows are validated: strict checks columns, '
+                         'types and limited values, fast skips the limited '
+                         'values, off writes rows as extracted (default is strict)')
+parser.add_argument('-w', '--workers',
+                    dest='workers', default=1, type=int, metavar='N',
+                    help='number of processes transforming rows (default is 1)')
+parser.add_argument('--chunk-size',
+                    dest='chunk_size', default=1000, type=int,
+                    help='rows sent to a worker at a time when --workers is '
+                         'more than 1 (default is 1000)')
+parser.add_argument('--shards',
+                    dest='shards', action='store_true',
+                    help='with --workers, transform each part of the input '
+                         '(Pennsylvania\'s counties) in a worker of its own, '
+                         'writing it to a shard, and join the shards at the end')
+parser.add_argument('--manifest',
+                    dest='manifest', action='store_true',
+                    help='with --shards, keep the shards and list them in a '
+                         '_manifest.json file instead of joining them')
+parser.add_argument('--unordered',
+                    dest='ordered', action='store_false',
+                    help='with --workers, write rows as they finish instead '
+                         'of in input order')
+parser.add_argument('--address-cache',
+                    dest='address_cache', nargs='?', const=DEFAULT_CACHE_PATH,
+                    default=None, metavar='CACHE_PATH',
+                    help='keep parsed addresses in a cache file shared across '
+                         'runs (default path is ./data/address_cache.sqlite)')
+parser.add_argument('--address-cache-size',
+                    dest='address_cache_size', default=5000000, type=int,
+                    help='most addresses kept in the address cache '
+                         '(default is 5000000)')
+parser.add_argument('--address-lru-size',
+                    dest='address_lru_size', default=10000, type=int,
+                    help='most recently parsed addresses kept in memory, '
+                         '0 turns it off (default is 10000)')
+parser.add_argument('--records',
+                    dest='records', action='store_true',
+                    help='pass rows through as compact records instead of '
+                         'dicts, which uses less memory and time per row')
+parser.add_argument('--line-terminator',
+                    dest='line_terminator', default='crlf',
+                    choices=sorted(LINE_TERMINATORS),
+                    help='line ending of output rows (default is crlf)')
+parser.add_argument('--null',
+                    dest='null', default='',
+                    help='written for empty values, e.g. \\N for Postgres '
+                         '(default is an empty field)')
+parser.add_argument('--buffer-size',
+                    dest='buffer_size', default=1 << 20, type=int,
+                    help='bytes of output buffered before writing to disk '
+                         '(default is 1048576)')
+parser.add_argument('-f', '--format',
+                    dest='format', default='csv',
+                    choices=['csv', 'parquet', 'arrow'],
+                    help='output file format, parquet and arrow need pyarrow '
+                         '(default is csv)')
+parser.add_argument('--row-group-size',
+                    dest='row_group_size', default=100000, type=int,
+                    help='rows per Parquet row group or Arrow record batch '
+                         '(default is 100000)')
+parser.add_argument('--compression',
+                    dest='compression', default=None,
+                    help='Parquet or Arrow compression codec, or none '
+                         '(default is snappy for parquet, none for arrow)')
+parser.add_argument('--dimensions',
+                    dest='dimensions', action='store_true',
+                    help='also write the distinct households and mailing '
+                         'addresses to their own csv files')
+parser.add_argument('--dimension-keys',
+                    dest='dimension_keys', default=1000000, type=int,
+                    help='most addresses remembered per dimension file '
+                         '(default is 1000000)')
+parser.add_argument('--snapshot',
+                    dest='snapshot', action='store_true',
+                    help='write an index of the voters in the output for a '
+                         'later --since run')
+parser.add_argument('--since',
+                    dest='since', default=None, metavar='PREVIOUS_OUTPUT',
+                    help='only write voters that are new or changed since the '
+                         'previous output path or directory, and the ones '
+                         'removed to a _removed.csv file (implies --snapshot)')
+parser.add_argument('--checkpoint',
+                    dest='checkpoint', action='store_true',
+                    help='save how far the run got next to the output every '
+                         '--checkpoint-every rows, for --resume')
+parser.add_argument('--checkpoint-every',
+                    dest='checkpoint_every', default=100000, type=int,
+                    help='rows between checkpoints (default is 100000)')
+parser.add_argument('--resume',
+                    dest='resume', action='store_true',
+                    help='continue a run from its last checkpoint, truncating '
+                         'the output to it (implies --checkpoint)')
+parser.add_argument('--rejects',
+                    dest='rejects', action='store_true',
+                    help='write rows that fail to a _rejects.csv file next to '
+                         'the output and keep going')
+parser.add_argument('--max-errors',
+                    dest='max_errors', default=None, type=int,
+                    help='most rows that can fail before the run stops '
+                         '(implies --rejects)')
+parser.add_argument('--max-error-rate',
+                    dest='max_error_rate', default=None, type=float,
+                    help='most rows that can fail per input row, e.g. 0.001, '
+                         'before the run stops (implies --rejects)')
+parser.add_argument('--profile',
+                    dest='profile', action='store_true',
+                    help='time each step of every --profile-every rows and '
+                         'print where the time went at the end')
+parser.add_argument('--profile-every',
+                    dest='profile_every', default=100, type=int,
+                    help='rows between the rows timed by --profile '
+                         '(default is 100)')
+parser.add_argument('--profile-report',
+                    dest='profile_report', default=None,
+                    metavar='REPORT_PATH',
+                    help='where --profile writes its JSON report (default is '
+                         '<state>_profile.json next to the output)')
+
+
+class RowWriter(object):
+    """
+    Writes output rows to a csv file with the columns in fieldnames order.
+
+    csv.DictWriter looks up every column of every row by name and checks the
+    row for extra columns. Rows that passed validation have exactly the
+    output columns, so with checked=True they're turned into tuples by a
+    single itemgetter, and Records (see records.py) are written from their
+    list of values as is. With checked=False rows are checked like
+    DictWriter does and missing columns are left empty.
+
+    Empty values (None or '') are written as null. Setting it to e.g. '\\N'
+    (with COPY's NULL '\\N' option) keeps them NULL in Postgres without
+    relying on how COPY treats empty fields.
+    """
+
+    def __init__(self, outfile, fieldnames, line_terminator='\r\n', null='',
+                 checked=True):
+        self.fieldnames = tuple(fieldnames)
+        self.writer = csv.writer(outfile, lineterminator=line_terminator)
+        self.null = null
+        self.checked = checked
+
+    def writeheader(self):
+        self.writer.writerow(self.fieldnames)
+
+    def writerows(self, rows):
+        self.writer.writerows(self.values(rows))
+
+    def values(self, rows):
+        """Yields the values of each row in fieldnames order"""
+        values = record_rows(rows, self.fieldnames, checked=self.checked)
+        if self.null:
+            null = self.null
+            values = ([null if value is None or value == '' or value is MISSING
+                       else value for value in row_values]
+                      for row_values in values)
+        return values
 
-class CsvOutput(object):
 
-    def __init__(self, state_transformer):
-        self.state_transformer = state_transformer
+class CsvOutput(BaseOutput):
+    """
+    Transforms and validates rows from a StatePreparer and writes them to a
+    csv file, see BaseOutput.
+
+    Output is buffered buffer_size bytes at a time and written by RowWriter,
+    see it for line_terminator and null.
+
+    With dimensions the distinct households and mailing addresses are also
+    written by a DimensionWriter, remembering up to max_dimension_keys each.
+
+    With a Checkpoint, written rows are counted by it so it can save
+    checkpoints, and a resumed run appends to the output where it stopped.
+    """
+
+    def __init__(self, state_transformer, validation='strict', workers=1,
+                 chunk_size=1000, ordered=True, records=False, rejects=None,
+                 line_terminator='\r\n', null='', buffer_size=1 << 20,
+                 dimensions=False, max_dimension_keys=1000000,
+                 checkpoint=None):
+        super(CsvOutput, self).__init__(state_transformer,
+                                        validation=validation,
+                                        workers=workers,
+                                        chunk_size=chunk_size,
+                                        ordered=ordered,
+                                        records=records,
+                                        rejects=rejects)
+        self.line_terminator = line_terminator
+        self.null = null
+        self.buffer_size = buffer_size
+        self.dimensions = dimensions
+        self.max_dimension_keys = max_dimension_keys
+        self.dimension_writer = None
+        self.checkpoint = checkpoint
+
+    def __getstate__(self):
+        # Dimension files and checkpoints are only written by the process
+        # that writes output
+        state = self.__dict__.copy()
+        state.update(dimension_writer=None, checkpoint=None)
+        return state
 
     def __call__(self, input_iter, output_path, history=False):
         """
@@ -37,38 +256,65 @@ class CsvOutput(object):
         Should not be overwritten in the subclass, this method enforces a
         similar check on all data created
         """
-        fieldnames = sorted(BaseTransformer.col_type_dict.keys())
-        if history:
-            fieldnames = sorted(BaseTransformer.history_type_dict.keys())
-
-        with self.open(output_path, 'w') as outfile:
-            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for input_dict in input_iter:
-                try:
-                    if not history:
-                        output_dict = self.state_transformer.process_row(input_dict)
-                        output_dict = self.state_transformer.fix_missing_mailing_addr(output_dict)
-
-                        self.state_transformer.validate_output_row(output_dict)
+        resumed = False
+        if self.checkpoint is not None:
+            outfile, resumed = self.checkpoint.open_output(output_path,
+                                                           self.open)
+        else:
+            outfile = self.open(output_path, 'w')
+        with outfile:
+            writer = RowWriter(outfile, self.fieldnames(history),
+                               line_terminator=self.line_terminator,
+                               null=self.null,
+                               checked=self.validation != 'off')
+            if not resumed:
+                writer.writeheader()
+            if self.dimensions and not history:
+                self.dimension_writer = DimensionWriter(
+                    outfile.name, max_keys=self.max_dimension_keys,
+                    null=self.null
+                )
+            try:
+                profiler = self.state_transformer.profiler
+                for output_chunk in self.output_chunks(input_iter, history):
+                    if profiler is None:
+                        writer.writerows(output_chunk)
                     else:
-                        output_dict = self.state_transformer.process_row(
-                            input_dict, history=True
-                        )
-                        self.state_transformer.validate_output_row(
-                            output_dict, history=True
-                        )
-                    writer.writerow(output_dict)
-                except Exception as err:
-                    print("Exception processing row")
-                    print(input_dict)
-                    raise err
+                        start = time.perf_counter()
+                        writer.writerows(output_chunk)
+                        profiler.add('write', time.perf_counter() - start,
+                                     calls=len(output_chunk))
+                    if self.dimension_writer is not None:
+                        self.dimension_writer.writerows(output_chunk)
+                    if self.checkpoint is not None:
+                        self.checkpoint.written(self.input_rows, outfile)
+            finally:
+                if self.dimension_writer is not None:
+                    self.dimension_writer.close()
 
-    open = BasePreparer.open
+    def open(self, path_or_handle, mode='w'):
+        if hasattr(path_or_handle, 'mode'):
+            return path_or_handle
+        return open(path_or_handle, mode, buffering=self.buffer_size,
+                    newline='', errors='ignore')
 
 
 def main():
     args = parser.parse_args()
+    if args.history and (args.snapshot or args.since):
+        parser.error('--snapshot and --since only apply to voter files')
+    if (args.checkpoint or args.resume) and (
+            args.format != 'csv' or not args.ordered or args.dimensions or
+            args.snapshot or args.since):
+        parser.error('--checkpoint and --resume only work with ordered csv '
+                     'output, without --dimensions, --snapshot or --since')
+    if args.shards and (args.checkpoint or args.resume or args.dimensions or
+                        args.snapshot or args.since):
+        parser.error('--shards doesn\'t work with --checkpoint, --resume, '
+                     '--dimensions, --snapshot or --since')
+    if args.shards and args.format != 'csv' and not args.manifest:
+        parser.error('only csv shards can be joined, use --manifest for '
+                     '{}'.format(args.format))
     states = args.states.split(',')
     state_mods = load_states(states)
     for i, s in enumerate(state_mods):
@@ -77,23 +323,133 @@ def main():
         output_path = args.output_path
 
         state_transformer = s.transformer.StateTransformer()
+        if args.profile:
+            state_transformer.profiler = Profiler(
+                sample_every=args.profile_every
+            )
+        if args.address_cache:
+            state_transformer.address_cache = AddressCache(
+                args.address_cache, max_entries=args.address_cache_size
+            )
+        if args.address_lru_size > 0:
+            state_transformer.usaddress_lru = LRUCache(
+                'usaddress_tag LRU', max_entries=args.address_lru_size
+            )
+            state_transformer.usaddress_dict_lru = LRUCache(
+                'convert_usaddress_dict LRU', max_entries=args.address_lru_size
+            )
         state_preparer = getattr(s.transformer,
                                  'StatePreparer',
                                  BasePreparer)(input_path,
                                                state,
                                                s.transformer,
                                                state_transformer,
-                                               history=args.history)
+                                               history=args.history,
+                                               records=args.records)
 
         if os.path.isdir(output_path):
             if not args.history:
-                output_file = '{}_output.csv'.format(state)
+                output_file = '{}_output.{}'.format(state, args.format)
             else:
-                output_file = '{}_history_output.csv'.format(state)
+                output_file = '{}_history_output.{}'.format(state, args.format)
             output_path = os.path.join(output_path, output_file)
 
-        writer = CsvOutput(state_transformer)
-        writer(state_preparer.process(), output_path, history=args.history)
+        workers = args.workers
+        sharded = args.shards and state_preparer.partitions() is not None
+        if args.shards and not sharded:
+            print('Warn - {}: input can\'t be split into shards, running '
+                  'without --shards'.format(state))
+        if sharded:
+            # Shards are transformed in workers, each in one process
+            workers = 1
+        elif workers > 1 and not state_transformer.parallel_safe:
+            print('Warn - {}: transformer depends on the order of rows, '
+                  'running with 1 worker'.format(state))
+            workers = 1
+
+        rejects = None
+        if (args.rejects or args.max_errors is not None or
+                args.max_error_rate is not None):
+            rejects = RejectWriter(rejects_path(output_path),
+                                   max_errors=args.max_errors,
+                                   max_error_rate=args.max_error_rate)
+        checkpoint = None
+        if args.checkpoint or args.resume:
+            checkpoint = Checkpoint(checkpoint_path(output_path),
+                                    state_preparer,
+                                    every=args.checkpoint_every,
+                                    rejects=rejects)
+        output_args = dict(validation=args.validation,
+                           workers=workers,
+                           chunk_size=args.chunk_size,
+                           ordered=args.ordered,
+                           records=args.records,
+                           rejects=rejects)
+        if args.format == 'csv':
+            writer = CsvOutput(state_transformer,
+                               line_terminator=LINE_TERMINATORS[args.line_terminator],
+                               null=args.null,
+                               buffer_size=args.buffer_size,
+                               dimensions=args.dimensions,
+                               max_dimension_keys=args.dimension_keys,
+                               checkpoint=checkpoint,
+                               **output_args)
+        else:
+            output_class = ParquetOutput if args.format == 'parquet' else ArrowOutput
+            writer = output_class(state_transformer,
+                                  row_group_size=args.row_group_size,
+                                  compression=args.compression,
+                                  **output_args)
+        if args.resume:
+            input_iter = checkpoint.resume()
+        else:
+            if rejects is not None:
+                rejects.open()
+            input_iter = state_preparer.process()
+        delta_index = None
+        if args.snapshot or args.since:
+            previous_path = None
+            if args.since:
+                previous_output = args.since
+                if os.path.isdir(previous_output):
+                    previous_output = os.path.join(
+                        previous_output, '{}_output.{}'.format(state, args.format)
+                    )
+                previous_path = snapshot_path(previous_output)
+            delta_index = DeltaIndex(state_transformer,
+                                     snapshot_path(output_path),
+                                     previous_path)
+            input_iter = delta_index.filter(input_iter)
+        try:
+            if sharded:
+                ShardedOutput(writer, workers=args.workers,
+                              manifest=args.manifest)(state_preparer,
+                                                      output_path,
+                                                      history=args.history)
+            else:
+                writer(input_iter, output_path, history=args.history)
+        finally:
+            if rejects is not None:
+                rejects.close()
+                print(rejects.summary())
+        if checkpoint is not None:
+            checkpoint.finish()
+        if delta_index is not None:
+            delta_index.close(removed_path(output_path) if args.since else None)
+            print(delta_index.summary())
+
+        if state_transformer.address_cache is not None:
+            state_transformer.address_cache.close()
+        caches = state_transformer.caches()
+        if getattr(writer, 'dimension_writer', None) is not None:
+            caches += writer.dimension_writer.caches()
+        for cache in caches:
+            print(cache.summary())
+        if state_transformer.profiler is not None:
+            report_path = (args.profile_report or
+                           '{}_profile.json'.format(output_base(output_path)))
+            state_transformer.profiler.write_report(report_path)
+            print(state_transformer.profiler.table())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,180 @@
+import re
+import datetime
+
+"""
+# Date parsing
+
+datetime.strptime has to match the date string against a regex built from
+the format every time it's called, which makes it one of the slowest parts
+of transforming a row. The formats in voter files only use %Y, %m and %d, so
+DateParser compiles them into string slicing instead:
+
+- Formats with a separator between fields ('%m/%d/%Y', '%Y-%m-%d') are
+  split on it, so months and days without a leading zero still work
+- Formats without one ('%Y%m%d', '%m%d%Y') are sliced at fixed offsets
+
+Parsed dates are memoized, since birth and registration dates repeat a
+lot. Any string the fast path can't handle, including every invalid one, is
+passed to strptime, so results and errors are the same as strptime's.
+
+## Example usage
+
+>>> parse = get_date_parser('%m/%d/%Y')
+>>> parse('8/5/2008')
+datetime.date(2008, 8, 5)
+"""
+
+FORMAT_TOKEN = re.compile(r'%(.)|([^%]+)')
+FIELD_WIDTHS = {'Y': 4, 'm': 2, 'd': 2}
+
+
+class DateParser(object):
+    """
+    Parses date strings in date_format into datetime.date, like
+    datetime.datetime.strptime(date_str, date_format).date().
+
+    Up to max_memo parsed strings are kept in memory.
+    """
+
+    def __init__(self, date_format, max_memo=100000):
+        self.date_format = date_format
+        self.max_memo = max_memo
+        self.memo = {}
+        self.stats = {'fast': 0, 'strptime': 0}
+        self._fast_parse = self._compile()
+
+    def _compile(self):
+        """
+        Returns a function that parses the date strings it can and returns
+        None for the rest, or None if the format isn't supported
+        """
+        tokens = FORMAT_TOKEN.findall(self.date_format)
+        directives = [d for d, _ in tokens if d]
+        if not directives or any(d not in FIELD_WIDTHS for d in directives) \
+                or len(set(directives)) != len(directives):
+            return None
+
+        # '%m/%d/%Y': fields separated by the same single character
+        if len(tokens) == 2 * len(directives) - 1 and all(
+                literal == tokens[1][1] and len(literal) == 1
+                for _, literal in tokens[1::2]):
+            separator = tokens[1][1] if len(tokens) > 1 else None
+            return self._separated_parser(directives, separator)
+
+        # '%Y%m%d': fields and literals at fixed offsets
+        fields = {}
+        literals = []
+        offset = 0
+        for directive, literal in tokens:
+            if directive:
+                fields[directive] = (offset, offset + FIELD_WIDTHS[directive])
+                offset += FIELD_WIDTHS[directive]
+            else:
+                literals.append((literal, offset, offset + len(literal)))
+                offset += len(literal)
+        return self._fixed_parser(fields, literals, offset)
+
+    @staticmethod
+    def _separated_parser(directives, separator):
+        num_fields = len(directives)
+        # strptime allows one or two digits for %m and %d, four for %Y
+        lengths = [(4, 4) if d == 'Y' else (1, 2) for d in directives]
+        order = [directives.index(d) if d in directives else None
+                 for d in 'Ymd']
+        defaults = [1900, 1, 1]
+        date = datetime.date
+
+        if num_fields == 3:
+            year, month, day = order
+
+            def parse_ymd(date_str):
+                parts = date_str.split(separator)
+                if len(parts) != 3:
+                    return None
+                y, m, d = parts[year], parts[month], parts[day]
+                if len(y) != 4 or not 0 < len(m) <= 2 or not 0 < len(d) <= 2 \
+                        or not (y + m + d).isdigit():
+                    return None
+                return date(int(y), int(m), int(d))
+            return parse_ymd
+
+        def parse(date_str):
+            parts = date_str.split(separator)
+            if len(parts) != num_fields:
+                return None
+            for part, (min_len, max_len) in zip(parts, lengths):
+                if not min_len <= len(part) <= max_len or not part.isdigit():
+                    return None
+            return date(*[default if i is None else int(parts[i])
+                          for i, default in zip(order, defaults)])
+        return parse
+
+    @staticmethod
+    def _fixed_parser(fields, literals, width):
+        slices = [fields.get(d) for d in 'Ymd']
+        defaults = [1900, 1, 1]
+        date = datetime.date
+
+        if len(fields) == 3 and not literals:
+            (y0, y1), (m0, m1), (d0, d1) = slices
+
+            def parse_ymd(date_str):
+                if len(date_str) != width or not date_str.isdigit():
+                    return None
+                return date(int(date_str[y0:y1]), int(date_str[m0:m1]),
+                            int(date_str[d0:d1]))
+            return parse_ymd
+
+        def parse(date_str):
+            if len(date_str) != width:
+                return None
+            for literal, start, end in literals:
+                if date_str[start:end] != literal:
+                    return None
+            values = []
+            for field, default in zip(slices, defaults):
+                if field is None:
+                    values.append(default)
+                    continue
+                part = date_str[field[0]:field[1]]
+                if not part.isdigit():
+                    return None
+                values.append(int(part))
+            return date(*values)
+        return parse
+
+    def __call__(self, date_str):
+        try:
+            return self.memo[date_str]
+        except (KeyError, TypeError):
+            pass
+        parsed = self.parse(date_str)
+        if len(self.memo) < self.max_memo:
+            self.memo[date_str] = parsed
+        return parsed
+
+    def parse(self, date_str):
+        """Parses date_str without looking it up in the memo table"""
+        parsed = None
+        if self._fast_parse is not None and type(date_str) is str:
+            try:
+                parsed = self._fast_parse(date_str)
+            except ValueError:
+                parsed = None
+        if parsed is None:
+            self.stats['strptime'] += 1
+            return datetime.datetime.strptime(date_str, self.date_format).date()
+        self.stats['fast'] += 1
+        return parsed
+
+
+_date_parsers = {}
+
+
+def get_date_parser(date_format):
+    """Returns the shared DateParser for date_format"""
+    try:
+        return _date_parsers[date_format]
+    except KeyError:
+        parser = _date_parsers[date_format] = DateParser(date_format)
+        return parser
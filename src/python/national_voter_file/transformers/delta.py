@@ -0,0 +1,174 @@
+import os
+import csv
+import hashlib
+import sqlite3
+from collections import Counter
+
+from national_voter_file.transformers.output import output_base
+
+"""
+# Incremental runs
+
+States publish their whole file every month, but few voters change from one
+month to the next. DeltaIndex keeps the STATE_VOTER_REF and a hash of the
+input row of every voter in a SQLite file next to the output (see
+snapshot_path). Given the index of the previous run, rows whose voter and
+hash were already in it are skipped before they're transformed, so only new
+and changed voters are parsed and written. Voters in the previous index but
+not in this run are written to a removed file (see removed_path).
+
+The hash is of the input row, so rows are only skipped when the state's file
+hasn't changed for that voter; rerun without an index after changing how a
+state is transformed.
+
+## Example usage
+
+>>> index = DeltaIndex(state_transformer, snapshot_path('ny_output.csv'),
+...                    snapshot_path('last_month/ny_output.csv'))
+>>> writer(index.filter(state_preparer.process()), 'ny_output.csv')
+>>> index.close(removed_path('ny_output.csv'))
+>>> print(index.summary())
+
+The new index is written to a temporary file and only replaces the one at
+path on close(), so a run can use the index it's replacing as the previous
+one, and a failed run leaves it as it was.
+"""
+
+STATUSES = ['new', 'changed', 'unchanged', 'removed']
+
+
+def snapshot_path(output_path):
+    """Returns the path of the index of an output file"""
+    return '{}_snapshot.sqlite'.format(output_base(output_path))
+
+
+def removed_path(output_path):
+    """Returns the path of the voters removed since the previous output"""
+    return '{}_removed.csv'.format(output_base(output_path))
+
+
+def row_hash(input_dict):
+    """
+    Returns a signed 64 bit hash of the values of an input row, in the order
+    of their columns' names, as dicts don't keep their order before Python
+    3.6. Extra values (under None) come first.
+    """
+    joined = '\x1f'.join(str(input_dict[column]) for column
+                          in sorted(input_dict, key=lambda column: (
+                              column is not None, column or '')))
+    digest = hashlib.md5(joined.encode('utf-8')).digest()[:8]
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class DeltaIndex(object):
+    """
+    Index of the (STATE_VOTER_REF, row hash) of every input row of a run,
+    written to path, which classifies rows against the index at
+    previous_path. Without a previous index every row is new.
+
+    STATE_VOTER_REF is taken from the row with the state transformer's
+    extract_state_voter_ref, before the rest of the row is transformed. A
+    voter with several rows is unchanged only for rows that were all in the
+    previous index.
+    """
+
+    name = 'Delta'
+
+    def __init__(self, state_transformer, path, previous_path=None,
+                 flush_every=10000):
+        self.state_transformer = state_transformer
+        self.path = path
+        self.previous_path = previous_path
+        self.flush_every = flush_every
+        self.stats = Counter()
+        self._new_rows = []
+        self._temp_path = '{}.new'.format(path)
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._conn = sqlite3.connect(self._temp_path)
+        self._conn.execute('PRAGMA journal_mode=OFF')
+        self._conn.execute('CREATE TABLE voters (ref TEXT, hash INTEGER, '
+                           'PRIMARY KEY (ref, hash)) WITHOUT ROWID')
+        self._previous = None
+        if previous_path is not None:
+            if os.path.exists(previous_path):
+                self._previous = sqlite3.connect(
+                    'file:{}?mode=ro'.format(previous_path), uri=True
+                )
+            else:
+                print('Warn - {} not found, every row is new'.format(
+                    previous_path
+                ))
+
+    def filter(self, input_iter):
+        """Yields the rows of input_iter that are new or changed"""
+        for input_dict in input_iter:
+            if self.classify(input_dict) != 'unchanged':
+                yield input_dict
+
+    def classify(self, input_dict):
+        """
+        Adds a row to the index and returns whether it's 'new', 'changed' or
+        'unchanged' since the previous index
+        """
+        ref = self.state_transformer.extract_state_voter_ref(
+            input_dict
+        )['STATE_VOTER_REF'] or ''
+        hashcode = row_hash(input_dict)
+        self._new_rows.append((ref, hashcode))
+        if len(self._new_rows) >= self.flush_every:
+            self.flush()
+
+        status = 'new'
+        if self._previous is not None:
+            hashes = [previous_hash for previous_hash, in self._previous.execute(
+                'SELECT hash FROM voters WHERE ref = ?', (ref,)
+            )]
+            if hashcode in hashes:
+                status = 'unchanged'
+            elif hashes:
+                status = 'changed'
+        self.stats[status] += 1
+        return status
+
+    def flush(self):
+        with self._conn:
+            self._conn.executemany('INSERT OR IGNORE INTO voters VALUES (?, ?)',
+                                   self._new_rows)
+        self._new_rows = []
+
+    def removed(self):
+        """Yields the refs in the previous index that weren't in this run"""
+        if self._previous is None:
+            return
+        self.flush()
+        cursor = self._previous.execute(
+            'SELECT DISTINCT ref FROM voters ORDER BY ref'
+        )
+        for ref, in cursor:
+            if self._conn.execute('SELECT 1 FROM voters WHERE ref = ?',
+                                  (ref,)).fetchone() is None:
+                self.stats['removed'] += 1
+                yield ref
+
+    def close(self, removed_path=None):
+        """
+        Writes the removed voters to removed_path, if given, and replaces the
+        index at path with this run's
+        """
+        self.flush()
+        if removed_path is not None:
+            with open(removed_path, 'w', newline='') as removed_file:
+                writer = csv.writer(removed_file, lineterminator='\n')
+                writer.writerow(['STATE_VOTER_REF'])
+                writer.writerows([ref] for ref in self.removed())
+        if self._previous is not None:
+            self._previous.close()
+            self._previous = None
+        self._conn.close()
+        os.replace(self._temp_path, self.path)
+
+    def summary(self):
+        return '{}: {}'.format(self.name, ', '.join(
+            '{} {}'.format(self.stats[status], status) for status in STATUSES
+        ))
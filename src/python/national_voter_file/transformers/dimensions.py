@@ -0,0 +1,91 @@
+import csv
+
+from national_voter_file.transformers.address_cache import LRUCache
+from national_voter_file.transformers.output import output_base
+from national_voter_file.transformers.postgres_output import (
+    HOUSEHOLD_COLS,
+    HOUSEHOLD_KEY_COLS,
+    MAILING_ADDRESS_KEY_COLS,
+    address_hash
+)
+from national_voter_file.transformers.records import MISSING
+
+"""
+Writes the distinct households and mailing addresses of output rows to their
+own csv files next to the output, so loading only has to insert the new ones
+instead of looking up every row.
+
+Each file has the HASHCODE of the address (see postgres_output.address_hash)
+and the output columns of HOUSEHOLD_DIM or MAILING_ADDRESS_DIM, cut to the
+width of their dimension columns. Seen hashes are kept in an LRU of
+max_keys, so a file can repeat an address that was evicted; loading dedupes
+those. Empty values are written as null, which should be the null of the
+output file so both load the same.
+"""
+
+# name, key columns (dimension column, output column, width), other columns
+DIMENSIONS = [
+    ('households', HOUSEHOLD_KEY_COLS, HOUSEHOLD_COLS),
+    ('mailing_addresses', MAILING_ADDRESS_KEY_COLS, []),
+]
+
+
+def dimension_paths(output_path):
+    """Returns the dimension file paths of an output file, by name"""
+    base = output_base(output_path)
+    return dict((name, '{}_{}.csv'.format(base, name))
+                for name, _, _ in DIMENSIONS)
+
+
+def cut(value, width):
+    """Returns a column value as it's saved in its dimension, or None"""
+    if value is None or value is MISSING:
+        return None
+    value = str(value)
+    return value[:width] if isinstance(width, int) else value
+
+
+class DimensionWriter(object):
+    """
+    Writes the first time each household and mailing address is seen in
+    output rows to the files of dimension_paths(output_path).
+    """
+
+    def __init__(self, output_path, max_keys=1000000, null=''):
+        self.null = null
+        self.paths = dimension_paths(output_path)
+        self.dimensions = []
+        for name, key_cols, other_cols in DIMENSIONS:
+            outfile = open(self.paths[name], 'w', newline='')
+            writer = csv.writer(outfile, lineterminator='\n')
+            writer.writerow(['HASHCODE'] + [out for _, out, _ in
+                                            key_cols + other_cols])
+            self.dimensions.append((
+                key_cols,
+                other_cols,
+                LRUCache('{} dimension'.format(name), max_entries=max_keys),
+                outfile,
+                writer
+            ))
+
+    def writerows(self, rows):
+        for key_cols, other_cols, seen, _, writer in self.dimensions:
+            new_rows = []
+            for row in rows:
+                key = [cut(row.get(out), width) for _, out, width in key_cols]
+                hashcode = address_hash(key)
+                if seen.get(hashcode) is not None:
+                    continue
+                seen.put(hashcode, True)
+                values = key + [cut(row.get(out), width)
+                                for _, out, width in other_cols]
+                new_rows.append([hashcode] + [self.null if value is None
+                                              else value for value in values])
+            writer.writerows(new_rows)
+
+    def caches(self):
+        return [seen for _, _, seen, _, _ in self.dimensions]
+
+    def close(self):
+        for _, _, _, outfile, _ in self.dimensions:
+            outfile.close()
@@ -0,0 +1,221 @@
+import mmap
+import struct
+from operator import itemgetter, methodcaller
+
+"""
+# Fixed-width records
+
+Some states, like Michigan, send files whose fields are at fixed offsets of
+each line with no delimiters. A FixedWidthLayout reads them from (start,
+end) offsets such as a preparer's col_indices, a block of many lines at a
+time:
+
+- Blocks that are ASCII, as voter files nearly always are, are decoded
+  once and every line is cut into its fields by a single itemgetter of
+  slices, instead of slicing and decoding each field of each line.
+- Other blocks are cut field by field from each line's bytes as before, or,
+  with use_struct=True, by structs compiled from the offsets when all their
+  lines are the same length. Fields that overlap the field before them,
+  which happens in Michigan's layout, are read by a second struct over the
+  same record.
+
+Every way gives the same values: each field's bytes, stripped of ASCII
+whitespace and decoded as UTF-8, in the order of the offsets. Fields past
+the end of a short line are empty.
+
+batches reads blocks from a binary file such as a zip member, and
+buffer_batches cuts them out of a buffer such as an mmap of an uncompressed
+file without copying it. read_file does that for a path.
+
+## Example usage
+
+>>> layout = FixedWidthLayout(((0, 5), (5, 8)))
+>>> list(layout.buffer_batches(b'JANE 12\\nJOHN   7\\n'))
+[[('JANE', '12'), ('JOHN', '7')]]
+"""
+
+BLOCK_SIZE = 1 << 20
+
+# Longer lines are read without structs
+MAX_RECORD_SIZE = 1 << 16
+
+# What bytes.strip() strips. str.strip() also strips these separators,
+# which is quicker than passing it WHITESPACE when a block has none of them
+WHITESPACE = ' \t\n\r\x0b\x0c'
+SEPARATORS = '\x1c\x1d\x1e\x1f'
+
+
+def _tuple_getter(items):
+    """Returns an itemgetter of items that always returns a tuple"""
+    if len(items) == 1:
+        item = items[0]
+        return lambda row: (row[item],)
+    return itemgetter(*items)
+
+
+class FixedWidthLayout(object):
+    """
+    Reads lines of fields at the (start, end) offsets of col_indices as
+    tuples of str, see the notes above. Lines end with a newline, and a
+    carriage return before it is stripped with the last field.
+    """
+
+    def __init__(self, col_indices, use_struct=False):
+        self.col_indices = tuple(tuple(c) for c in col_indices)
+        self.use_struct = use_struct
+        self._slices = _tuple_getter([slice(*c) for c in self.col_indices])
+        # (structs, reorder) for each record length seen
+        self._structs = {}
+
+    def batches(self, infile, block_size=BLOCK_SIZE):
+        """
+        Yields a list of tuples of field values for each block of about
+        block_size bytes read from infile, opened in binary mode
+        """
+        rest = b''
+        while True:
+            data = infile.read(block_size)
+            if not data:
+                break
+            block = rest + data if rest else data
+            end = block.rfind(b'\n') + 1
+            if not end:
+                rest = block
+                continue
+            rest = block[end:]
+            yield self.records(block[:end] if rest else block)
+        if rest:
+            yield self.records(rest)
+
+    def buffer_batches(self, buffer, block_size=BLOCK_SIZE):
+        """
+        Yields lists of tuples of field values like batches, from blocks of
+        a bytes or mmap buffer that aren't copied to be read
+        """
+        start = 0
+        size = len(buffer)
+        with memoryview(buffer) as view:
+            while start < size:
+                end = buffer.rfind(b'\n', start, start + block_size) + 1
+                if not end:
+                    # A line longer than block_size, or the last line
+                    # without a newline
+                    end = buffer.find(b'\n', start + block_size) + 1 or size
+                with view[start:end] as block:
+                    records = self.records(block)
+                yield records
+                start = end
+
+    def read_file(self, path, block_size=BLOCK_SIZE):
+        """Yields lists of tuples of field values from an mmap of path"""
+        with open(path, 'rb') as infile:
+            try:
+                buffer = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                return
+            with buffer:
+                batches = self.buffer_batches(buffer, block_size)
+                try:
+                    for batch in batches:
+                        yield batch
+                finally:
+                    # Releases its view of buffer before it's closed
+                    batches.close()
+
+    def records(self, block):
+        """
+        Returns the tuples of field values of the lines of block, a bytes-like
+        object of whole lines
+        """
+        try:
+            text = str(block, 'ascii')
+        except UnicodeDecodeError:
+            records = self.struct_records(block) if self.use_struct else None
+            if records is None:
+                records = self.bytes_records(bytes(block))
+            return records
+        lines = text.split('\n')
+        if not lines[-1]:
+            lines.pop()
+        slices = self._slices
+        strip = str.strip
+        if any(separator in text for separator in SEPARATORS):
+            strip = methodcaller('strip', WHITESPACE)
+        return [tuple(map(strip, slices(line))) for line in lines]
+
+    def bytes_records(self, block):
+        """Returns the records of block cut from each line's bytes"""
+        lines = block.split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        return [tuple(line[start:end].strip().decode('utf-8')
+                      for start, end in self.col_indices)
+                for line in lines]
+
+    def struct_records(self, block):
+        """
+        Returns the records of block cut by structs, or None if its lines
+        aren't all the same length or are too short for the fields
+        """
+        record_size = bytes(block[:MAX_RECORD_SIZE]).find(b'\n') + 1
+        num_records = len(block) // record_size if record_size else 0
+        if (not num_records or len(block) != num_records * record_size or
+                bytes(block[record_size - 1::record_size]) !=
+                b'\n' * num_records):
+            return None
+        structs = self.compile(record_size)
+        if structs is None:
+            return None
+        layers, reorder = structs
+        if reorder is None:
+            records = layers[0].iter_unpack(block)
+        else:
+            records = (reorder(sum(fields, ())) for fields in
+                       zip(*[layer.iter_unpack(block) for layer in layers]))
+        decode = bytes.decode
+        strip = bytes.strip
+        return [tuple(map(decode, map(strip, fields))) for fields in records]
+
+    def compile(self, record_size):
+        """
+        Returns the structs of each layer of fields that don't overlap, for
+        records of record_size bytes including their newline, and an
+        itemgetter putting their fields back in order (None if there's one
+        layer), or None if the fields don't fit in the records
+        """
+        if record_size not in self._structs:
+            self._structs[record_size] = self._compile(record_size)
+        return self._structs[record_size]
+
+    def _compile(self, record_size):
+        if max(end for _, end in self.col_indices) > record_size:
+            return None
+        # Each field goes in the first layer it doesn't overlap
+        layers = []
+        for i, (start, end) in sorted(enumerate(self.col_indices),
+                                      key=lambda field: field[1]):
+            for layer in layers:
+                if start >= layer[-1][2]:
+                    layer.append((i, start, end))
+                    break
+            else:
+                layers.append([(i, start, end)])
+        structs = []
+        order = []
+        for layer in layers:
+            fmt = ['=']
+            position = 0
+            for i, start, end in layer:
+                if start > position:
+                    fmt.append('{}x'.format(start - position))
+                fmt.append('{}s'.format(end - start))
+                position = end
+                order.append(i)
+            if record_size > position:
+                fmt.append('{}x'.format(record_size - position))
+            structs.append(struct.Struct(''.join(fmt)))
+        if len(structs) == 1 and order == sorted(order):
+            return structs, None
+        positions = [order.index(i) for i in range(len(order))]
+        return structs, _tuple_getter(positions)
@@ -0,0 +1,251 @@
+import os
+import json
+import multiprocessing
+import queue
+from collections import deque
+from itertools import islice
+
+from national_voter_file.transformers.base import BaseTransformer
+
+
+class BaseOutput(object):
+    """
+    Transforms and validates rows from a StatePreparer. Subclasses write the
+    rows out in some format by implementing __call__, getting the rows from
+    output_chunks.
+
+    With workers > 1, rows are sent in chunks of chunk_size to a pool of
+    worker processes, each holding its own copy of state_transformer. At most
+    two chunks per worker are waiting at any time, so the input is only read
+    as fast as the workers get through it. Chunks are written in input order
+    unless ordered is False, in which case they're written as they finish.
+
+    With workers = 1, rows are transformed in chunks of chunk_size as well.
+
+    With records=True, output rows are Records (see records.py), which are
+    written by position rather than looked up by column name.
+
+    With a RejectWriter (see rejects.py) as rejects, rows that fail are
+    written to it and left out instead of stopping the run.
+
+    input_rows counts the input rows of the chunks output_chunks has yielded.
+    """
+
+    def __init__(self, state_transformer, validation='strict', workers=1,
+                 chunk_size=1000, ordered=True, records=False, rejects=None):
+        self.state_transformer = state_transformer
+        self.validation = validation
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+        self.records = records
+        self.rejects = rejects
+        self.input_rows = 0
+        self._rejected = []
+
+    def __call__(self, input_iter, output_path, history=False):
+        """
+        Transforms the rows from input_iter and writes them to output_path
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def fieldnames(history=False):
+        """Returns the output columns in the order they're written"""
+        if history:
+            return sorted(BaseTransformer.history_type_dict.keys())
+        return sorted(BaseTransformer.col_type_dict.keys())
+
+    def output_chunks(self, input_iter, history=False):
+        """Yields lists of validated output rows, in chunks of chunk_size"""
+        self.input_rows = 0
+        if self.workers > 1:
+            for output_chunk in self.transform_parallel(input_iter, history):
+                yield output_chunk
+        else:
+            for input_chunk in chunks(input_iter, self.chunk_size):
+                output_chunk = self.transform_chunk(input_chunk, history)
+                self.chunk_done(len(input_chunk), self.take_rejected())
+                yield output_chunk
+
+    def transform_row(self, input_dict, history=False):
+        """
+        Runs a single input row through the state transformer and validates
+        the result
+        """
+        validate_output_row = self.state_transformer.output_validator(
+            history, self.validation
+        )
+        # process_row sets failed_step to the extract method that failed
+        step = 'process_row'
+        try:
+            if not history:
+                output_dict = self.state_transformer.process_row(input_dict)
+                step = 'fix_missing_mailing_addr'
+                output_dict = self.state_transformer.fix_missing_mailing_addr(output_dict)
+            else:
+                output_dict = self.state_transformer.process_row(
+                    input_dict, history=True
+                )
+            step = 'validate_output_row'
+            if self.records:
+                output_dict = validate_output_row.record_type.from_dict(
+                    output_dict
+                )
+            validate_output_row(output_dict)
+            return output_dict
+        except Exception as err:
+            if not hasattr(err, 'failed_step'):
+                err.failed_step = step
+            if self.rejects is None:
+                print("Exception processing row")
+                print(input_dict)
+            raise err
+
+    def transform_chunk(self, input_chunk, history=False):
+        transform_row = self.transform_row
+        if self.state_transformer.profiler is not None:
+            transform_row = self.state_transformer.profiler.sampled(
+                transform_row, self.state_transformer
+            )
+        if self.rejects is None:
+            return [transform_row(input_dict, history) for input_dict in input_chunk]
+        output_chunk = []
+        for input_dict in input_chunk:
+            try:
+                output_chunk.append(transform_row(input_dict, history))
+            except Exception as err:
+                self._rejected.append(rejected_row(input_dict, err))
+        return output_chunk
+
+    def take_rejected(self):
+        """Returns the rows rejected since the last call and forgets them"""
+        rejected, self._rejected = self._rejected, []
+        return rejected
+
+    def chunk_done(self, num_rows, rejected):
+        """
+        Counts a chunk of num_rows input rows as output and writes its
+        rejected rows
+        """
+        self.input_rows += num_rows
+        if self.rejects is not None:
+            self.rejects.add(rejected, num_rows)
+
+    def transform_parallel(self, input_iter, history=False):
+        """
+        Yields lists of output rows, one per chunk of input rows, transformed
+        in self.workers processes
+        """
+        max_pending = 2 * self.workers
+        pool = multiprocessing.Pool(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(self,)
+        )
+        try:
+            if self.ordered:
+                pending = deque()
+                for input_chunk in chunks(input_iter, self.chunk_size):
+                    pending.append(pool.apply_async(_transform_chunk,
+                                                    (input_chunk, history)))
+                    if len(pending) >= max_pending:
+                        yield self.chunk_result(pending.popleft().get())
+                while pending:
+                    yield self.chunk_result(pending.popleft().get())
+            else:
+                finished = queue.Queue()
+                num_pending = 0
+                for input_chunk in chunks(input_iter, self.chunk_size):
+                    pool.apply_async(_transform_chunk, (input_chunk, history),
+                                     callback=finished.put,
+                                     error_callback=finished.put)
+                    num_pending += 1
+                    if num_pending >= max_pending:
+                        num_pending -= 1
+                        yield self.chunk_result(finished.get())
+                while num_pending:
+                    num_pending -= 1
+                    yield self.chunk_result(finished.get())
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+
+    def chunk_result(self, result):
+        """
+        Takes what a worker returned for a chunk, raising it if it's an error,
+        and returns the output rows after adding up the worker's stats
+        """
+        if isinstance(result, BaseException):
+            raise result
+        output_chunk, num_rows, rejected, cache_stats = result
+        for cache in stat_sources(self.state_transformer):
+            cache.stats.update(cache_stats[cache.name])
+        self.chunk_done(num_rows, rejected)
+        return output_chunk
+
+
+def stat_sources(state_transformer):
+    """
+    Returns the caches and profiler of state_transformer, whose stats are
+    counted in worker processes and added up in the parent
+    """
+    sources = state_transformer.caches()
+    if state_transformer.profiler is not None:
+        sources.append(state_transformer.profiler)
+    return sources
+
+
+def rejected_row(input_dict, err):
+    """
+    Returns the row written to a RejectWriter for an input row that raised
+    err: its class, message, failed step and the input row as JSON
+    """
+    return [type(err).__name__, str(err), getattr(err, 'failed_step', ''),
+            json.dumps(input_dict, default=str)]
+
+
+def output_base(output_path):
+    """
+    Returns the path files written alongside an output file are named from,
+    e.g. data/ny for data/ny_output.csv
+    """
+    base = os.path.splitext(output_path)[0]
+    if base.endswith('_output'):
+        base = base[:-len('_output')]
+    return base
+
+
+def chunks(iterable, size):
+    """Yields lists of up to size items from iterable"""
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+#### Worker process functions for BaseOutput.transform_parallel
+
+_worker_output = None
+
+def _init_worker(output):
+    # output is a pickled copy of the parent's, with its state_transformer
+    # and caches, so subclasses can do their own work per chunk
+    global _worker_output
+    _worker_output = output
+
+def _transform_chunk(input_chunk, history):
+    output_chunk = _worker_output.transform_chunk(input_chunk, history)
+    state_transformer = _worker_output.state_transformer
+    if state_transformer.address_cache is not None:
+        # Workers are stopped without warning, so save new addresses as we go
+        state_transformer.address_cache.flush()
+    cache_stats = dict((cache.name, cache.take_stats())
+                       for cache in stat_sources(state_transformer))
+    return (output_chunk, len(input_chunk), _worker_output.take_rejected(),
+            cache_stats)
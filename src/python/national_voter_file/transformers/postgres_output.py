@@ -0,0 +1,731 @@
+import io
+import os
+import csv
+import struct
+import hashlib
+import tempfile
+import uuid
+from multiprocessing.util import Finalize
+from operator import itemgetter
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+from national_voter_file.transformers.output import BaseOutput
+from national_voter_file.transformers.records import MISSING, record_rows
+from national_voter_file.transformers.versions import (MAX_DATE,
+                                                       MIN_DATE,
+                                                       external_sort,
+                                                       merge_versions)
+
+"""
+# Loading into Postgres
+
+Replaces the ProcessPreparedVoterFile Pentaho job. Output rows are copied
+into an unlogged staging table with COPY FROM STDIN, then the dimensions and
+VOTER_REPORT_FACT are resolved from it with a handful of set-based
+statements in one transaction, instead of a lookup per row:
+
+1. HOUSEHOLD_DIM gets a row for each new RAW_ADDR1, RAW_ADDR2, RAW_CITY,
+   RAW_ZIP and STATE_NAME, and the parsed address columns of rows parsed
+   by usaddress (VALIDATION_STATUS 2) are updated
+2. MAILING_ADDRESS_DIM gets a row for each new mailing address
+3. VOTER_DIM is versioned by STATE_VOTER_REF (type 2): a voter seen for
+   the first time is valid from 1900-01-01, a voter whose columns changed
+   has its current version closed at the report date and a new version
+   valid from it, and a voter without a version valid on the report date
+   gets a version after their last one, valid from it. Inactive voters'
+   refs get their birthdate appended.
+4. VOTER_REPORT_FACT gets a row per output row for the report date, with
+   its jurisdiction, precinct and party keys
+
+Columns are cut to the width of the column they're saved in, the same as
+the Pentaho transformations did.
+
+HASHCODE of HOUSEHOLD_DIM and MAILING_ADDRESS_DIM is the first 8 bytes of
+the md5 of the key columns joined by \\x1f (NULL as ''), as a signed bigint,
+computed the same in SQL (hash_sql) and Python (address_hash). Rows are
+matched to households and mailing addresses by their key columns rather
+than HASHCODE though, so the ones Pentaho's CombinationLookup saved with
+its own hashcodes are found too.
+
+With dimension files (see dimensions.py) new households and mailing
+addresses are inserted from those instead of from every output row.
+
+load_csv with merge_voters=True works out the new versions of step 3 by
+merging the sorted output file against an export of the voters in
+VOTER_DIM (see versions.py), then copies in the versions to close and
+insert, instead of comparing every voter in SQL.
+
+PostgresOutput copies rows as they're transformed; with workers > 1 every
+worker copies its own chunks over one connection it keeps for the run.
+load_csv loads an output file written by CsvOutput.
+
+psycopg2 isn't installed with the rest of the requirements, so it's only
+needed to use these.
+
+## Example usage
+
+>>> writer = PostgresOutput(StateTransformer(), '2017-01-01', 3, workers=4)
+>>> writer(state_preparer.process(), 'host=localhost dbname=VOTER')
+
+>>> load_csv('ny_output.csv', 'host=localhost dbname=VOTER', '2017-01-01', 3)
+"""
+
+# (dimension column, output column, width or type) for each dimension
+HOUSEHOLD_COLS = [
+    ('ADDRESS_NUMBER', 'ADDRESS_NUMBER', 15),
+    ('ADDRESS_NUMBER_PREFIX', 'ADDRESS_NUMBER_PREFIX', 2),
+    ('ADDRESS_NUMBER_SUFFIX', 'ADDRESS_NUMBER_SUFFIX', 5),
+    ('BUILDING_NAME', 'BUILDING_NAME', 50),
+    ('CORNER_OF', 'CORNER_OF', 50),
+    ('INTERSECTION_SEPARATOR', 'INTERSECTION_SEPARATOR', 5),
+    ('LANDMARK_NAME', 'LANDMARK_NAME', 50),
+    ('NOT_ADDRESS', 'NOT_ADDRESS', 30),
+    ('OCCUPANCY_TYPE', 'OCCUPANCY_TYPE', 20),
+    ('OCCUPANCY_IDENTIFIER', 'OCCUPANCY_IDENTIFIER', 20),
+    ('PLACE_NAME', 'PLACE_NAME', 50),
+    ('STREET_NAME', 'STREET_NAME', 50),
+    ('STREET_NAME_PRE_DIRECTIONAL', 'STREET_NAME_PRE_DIRECTIONAL', 10),
+    ('STREET_NAME_PRE_MODIFIER', 'STREET_NAME_PRE_MODIFIER', 10),
+    ('STREET_NAME_PRE_TYPE', 'STREET_NAME_PRE_TYPE', 10),
+    ('STREET_NAME_POST_DIRECTIONAL', 'STREET_NAME_POST_DIRECTIONAL', 10),
+    ('STREET_NAME_POST_MODIFIER', 'STREET_NAME_POST_MODIFIER', 10),
+    ('STREET_NAME_POST_TYPE', 'STREET_NAME_POST_TYPE', 10),
+    ('SUBADDRESS_IDENTIFIER', 'SUBADDRESS_IDENTIFIER', 10),
+    ('SUBADDRESS_TYPE', 'SUBADDRESS_TYPE', 10),
+    ('USPS_BOX_GROUP_ID', 'USPS_BOX_GROUP_ID', 10),
+    ('USPS_BOX_GROUP_TYPE', 'USPS_BOX_GROUP_TYPE', 2),
+    ('USPS_BOX_ID', 'USPS_BOX_ID', 10),
+    ('USPS_BOX_TYPE', 'USPS_BOX_TYPE', 10),
+    ('ZIP_CODE', 'ZIP_CODE', 10),
+    ('VALIDATION_STATUS', 'VALIDATION_STATUS', 'SMALLINT'),
+]
+HOUSEHOLD_KEY_COLS = [
+    ('RAW_ADDR1', 'RAW_ADDR1', 110),
+    ('RAW_ADDR2', 'RAW_ADDR2', 50),
+    ('RAW_CITY', 'RAW_CITY', 50),
+    ('RAW_ZIP', 'RAW_ZIP', 10),
+    ('STATE_NAME', 'STATE_NAME', 15),
+]
+MAILING_ADDRESS_KEY_COLS = [
+    ('ADDRESS_LINE1', 'MAIL_ADDRESS_LINE1', 110),
+    ('ADDRESS_LINE2', 'MAIL_ADDRESS_LINE2', 50),
+    ('CITY', 'MAIL_CITY', 50),
+    ('"STATE"', 'MAIL_STATE', 20),
+    ('ZIP_CODE', 'MAIL_ZIP_CODE', 10),
+    ('COUNTRY', 'MAIL_COUNTRY', 30),
+]
+# A change in any of these makes a new version of the voter
+VOTER_COLS = [
+    ('COUNTY_VOTER_REF', 'COUNTY_VOTER_REF', 20),
+    ('FIRST_NAME', 'FIRST_NAME', 50),
+    ('MIDDLE_NAME', 'MIDDLE_NAME', 50),
+    ('LAST_NAME', 'LAST_NAME', 50),
+    ('NAME_SUFFIX', 'NAME_SUFFIX', 10),
+    ('GENDER', 'GENDER', 1),
+    ('RACE', 'RACE', 1),
+    ('BIRTHDATE', 'BIRTHDATE', 'DATE'),
+    ('BIRTH_STATE', 'BIRTH_STATE', 2),
+    ('REGISTRATION_DATE', 'REGISTRATION_DATE', 'DATE'),
+    ('REGISTRATION_STATUS', 'REGISTRATION_STATUS', 15),
+    ('ABSTENTEE_TYPE', 'ABSENTEE_TYPE', 1),
+    ('EMAIL', 'EMAIL', 50),
+    ('PHONE', 'PHONE', 15),
+    ('DO_NOT_CALL_STATUS', 'DO_NOT_CALL_STATUS', 1),
+    ('LANGUAGE_CHOICE', 'LANGUAGE_CHOICE', 3),
+]
+# (fact column, JURISDICTION_DIM.ENTITY_TYPE, output column of its
+# VOTER_FILE_CODE or None)
+JURISDICTION_KEYS = [
+    ('STATE_KEY', 'state', None),
+    ('COUNTY_KEY', 'county', 'COUNTYCODE'),
+    ('CONGRESSIONAL_DIST_KEY', 'congress', 'CONGRESSIONAL_DIST'),
+    ('LOWER_HOUSE_DIST_KEY', 'lower house', 'LOWER_HOUSE_DIST'),
+    ('UPPER_HOUSE_DIST_KEY', 'upper house', 'UPPER_HOUSE_DIST'),
+]
+LOOKUP_COLS = ['PARTY', 'PRECINCT_SPLIT', 'COUNTYCODE', 'CONGRESSIONAL_DIST',
+               'LOWER_HOUSE_DIST', 'UPPER_HOUSE_DIST']
+
+COPY_FORMATS = ('binary', 'text')
+
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('!h', -1)
+PGCOPY_NULL = struct.pack('!i', -1)
+TEXT_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n',
+                              '\r': '\\r'})
+
+
+class PostgresOutput(BaseOutput):
+    """
+    Transforms and validates rows from a StatePreparer and loads them into
+    the warehouse as the report of reporter_key on report_date, see
+    BaseOutput and the notes above.
+
+    copy_format is how rows are sent to COPY, binary or text.
+    """
+
+    def __init__(self, state_transformer, report_date, reporter_key,
+                 validation='strict', workers=1, chunk_size=1000,
+                 ordered=True, records=False, rejects=None,
+                 copy_format='binary'):
+        if psycopg2 is None:
+            raise ImportError('PostgresOutput needs psycopg2, install it with '
+                              'pip install psycopg2')
+        if copy_format not in COPY_FORMATS:
+            raise ValueError('Copy format must be one of {}, found {}'.format(
+                ', '.join(COPY_FORMATS), copy_format
+            ))
+        super(PostgresOutput, self).__init__(state_transformer,
+                                             validation=validation,
+                                             workers=workers,
+                                             chunk_size=chunk_size,
+                                             ordered=ordered,
+                                             records=records,
+                                             rejects=rejects)
+        self.report_date = report_date
+        self.reporter_key = reporter_key
+        self.copy_format = copy_format
+        self.dsn = None
+        self.staging_table = None
+        self._connection = None
+        self._connection_pid = None
+        self._close_connection = None
+
+    def __getstate__(self):
+        # Connections stay in the process that opened them
+        state = self.__dict__.copy()
+        state.update(_connection=None, _connection_pid=None,
+                     _close_connection=None)
+        return state
+
+    def __call__(self, input_iter, dsn, history=False):
+        """Transforms the rows from input_iter and loads them into dsn"""
+        if history:
+            raise ValueError('PostgresOutput only loads voter files, '
+                             'not vote history')
+        self.dsn = dsn
+        connection = psycopg2.connect(dsn)
+        try:
+            self.staging_table = create_staging(connection,
+                                                self.fieldnames(history))
+            try:
+                for _ in self.output_chunks(input_iter, history):
+                    pass
+                resolve_staging(connection, self.staging_table,
+                                self.report_date, self.reporter_key)
+            finally:
+                self.close()
+                drop_staging(connection, self.staging_table)
+        finally:
+            connection.close()
+
+    def transform_chunk(self, input_chunk, history=False):
+        """
+        Transforms input_chunk and copies it into the staging table. Nothing
+        is returned, so workers only send back their cache stats.
+        """
+        output_chunk = super(PostgresOutput, self).transform_chunk(input_chunk,
+                                                                   history)
+        connection = self.connection()
+        copy_rows(connection, self.staging_table, self.fieldnames(history),
+                  output_chunk, copy_format=self.copy_format,
+                  checked=self.validation != 'off')
+        connection.commit()
+        return []
+
+    def connection(self):
+        """Returns this process' connection, connecting the first time"""
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = psycopg2.connect(self.dsn)
+            self._connection_pid = os.getpid()
+            # Worker processes never get to close(), so close on exit too
+            self._close_connection = Finalize(self, self._connection.close,
+                                              exitpriority=0)
+        return self._connection
+
+    def close(self):
+        if self._connection_pid == os.getpid():
+            self._close_connection()
+        self._connection = None
+        self._connection_pid = None
+        self._close_connection = None
+
+
+def load_csv(csv_path, dsn, report_date, reporter_key, null='',
+             dimension_paths=None, merge_voters=False, max_sort_rows=1000000):
+    """
+    Loads an output file of CsvOutput into the warehouse as the report of
+    reporter_key on report_date. null is what empty values were written as.
+
+    dimension_paths are the dimension files written with it by
+    DimensionWriter, by dimension name, see dimensions.dimension_paths.
+
+    With merge_voters, VOTER_DIM versions are merged in Python, sorting
+    max_sort_rows voters at a time in memory, see versions.py.
+    """
+    if psycopg2 is None:
+        raise ImportError('load_csv needs psycopg2, install it with '
+                          'pip install psycopg2')
+    connection = psycopg2.connect(dsn)
+    staging_tables = []
+    try:
+        staging_table = copy_csv(connection, csv_path, null)
+        staging_tables.append(staging_table)
+        dimension_tables = {}
+        for name, path in (dimension_paths or {}).items():
+            dimension_tables[name] = copy_csv(connection, path, null)
+            staging_tables.append(dimension_tables[name])
+        voter_rows = None
+        if merge_voters:
+            voter_rows = read_voters(csv_path, null)
+        resolve_staging(connection, staging_table, report_date, reporter_key,
+                        dimension_tables, voter_rows=voter_rows,
+                        max_sort_rows=max_sort_rows)
+    finally:
+        for staging_table in staging_tables:
+            drop_staging(connection, staging_table)
+        connection.close()
+
+
+def copy_csv(connection, csv_path, null=''):
+    """Copies a csv file into a new staging table and returns its name"""
+    with open(csv_path, newline='') as csv_file:
+        columns = next(csv.reader(csv_file))
+        staging_table = create_staging(connection, columns)
+        csv_file.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                'COPY {} ({}) FROM STDIN WITH CSV HEADER NULL {}'.format(
+                    staging_table, ', '.join(columns), quote_literal(null)
+                ),
+                csv_file
+            )
+    connection.commit()
+    return staging_table
+
+
+def read_voters(csv_path, null=''):
+    """Yields the output rows of a csv file, with null values as None"""
+    with open(csv_path, newline='') as csv_file:
+        for row in csv.DictReader(csv_file):
+            yield dict((col, None if value == null else value)
+                       for col, value in row.items())
+
+
+def create_staging(connection, columns):
+    """
+    Creates an unlogged table of text columns to copy output rows into and
+    returns its name
+    """
+    staging_table = 'nvf_staging_{}'.format(uuid.uuid4().hex[:12])
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE UNLOGGED TABLE {} ({})'.format(
+            staging_table, ', '.join('{} TEXT'.format(col) for col in columns)
+        ))
+    connection.commit()
+    return staging_table
+
+
+def drop_staging(connection, staging_table):
+    connection.rollback()
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS {}'.format(staging_table))
+    connection.commit()
+
+
+def copy_rows(connection, staging_table, columns, rows, copy_format='binary',
+              checked=True):
+    """
+    Copies output rows (dicts or Records) into staging_table. Empty values
+    are copied as NULL.
+    """
+    values = record_rows(rows, columns, checked=checked)
+    if copy_format == 'binary':
+        data = copy_binary(values, len(columns))
+        options = ' WITH BINARY'
+    else:
+        data = copy_text(values)
+        options = ''
+    with connection.cursor() as cursor:
+        cursor.copy_expert('COPY {} ({}) FROM STDIN{}'.format(
+            staging_table, ', '.join(columns), options
+        ), data)
+
+
+def copy_binary(values, num_columns):
+    """Returns a file of rows of values in COPY's binary format"""
+    data = io.BytesIO()
+    write = data.write
+    pack_length = struct.Struct('!i').pack
+    row_header = struct.pack('!h', num_columns)
+    write(PGCOPY_HEADER)
+    for row_values in values:
+        write(row_header)
+        for value in row_values:
+            if value is None or value == '' or value is MISSING:
+                write(PGCOPY_NULL)
+            else:
+                value = str(value).encode('utf-8')
+                write(pack_length(len(value)))
+                write(value)
+    write(PGCOPY_TRAILER)
+    data.seek(0)
+    return data
+
+
+def copy_text(values):
+    """Returns a file of rows of values in COPY's text format"""
+    data = io.StringIO()
+    write = data.write
+    for row_values in values:
+        write('\t'.join('\\N' if value is None or value == '' or value is MISSING
+                        else str(value).translate(TEXT_ESCAPES)
+                        for value in row_values))
+        write('\n')
+    data.seek(0)
+    return data
+
+
+def quote_literal(value):
+    return "'{}'".format(value.replace("'", "''"))
+
+
+def column_sql(output_col, width):
+    """Casts or cuts a staged column to the width or type it's saved as"""
+    if isinstance(width, int):
+        return 'LEFT({0}, {1}) AS {0}'.format(output_col, width)
+    return '{0}::{1} AS {0}'.format(output_col, width)
+
+
+def hash_sql(output_cols):
+    """SQL for the HASHCODE of the columns of a prepared row"""
+    return ("('x' || LEFT(MD5(CONCAT_WS(CHR(31), {})), 16))::BIT(64)::BIGINT"
+            .format(', '.join("COALESCE({}, '')".format(col)
+                              for col in output_cols)))
+
+
+def address_hash(values):
+    """
+    Returns the HASHCODE of a household or mailing address from the values of
+    its key columns, already cut to width, like hash_sql
+    """
+    joined = '\x1f'.join('' if value is None else value for value in values)
+    return struct.unpack('>q', hashlib.md5(joined.encode('utf-8')).digest()[:8])[0]
+
+
+def same_sql(left, left_cols, right, right_cols):
+    """SQL comparing two lists of columns, where NULL is the same as NULL"""
+    return '({}) IS NOT DISTINCT FROM ({})'.format(
+        ', '.join('{}.{}'.format(left, col) for col in left_cols),
+        ', '.join('{}.{}'.format(right, col) for col in right_cols)
+    )
+
+
+def key_sql(left, left_cols, right, right_cols):
+    """
+    SQL matching the key columns of a dimension, where NULL is the same as
+    '' like in its HASHCODE, which unlike same_sql can be hash joined
+    """
+    return ' AND '.join("COALESCE({}.{}, '') = COALESCE({}.{}, '')".format(
+        left, left_col, right, right_col
+    ) for left_col, right_col in zip(left_cols, right_cols))
+
+
+def resolve_staging(connection, staging_table, report_date, reporter_key,
+                    dimension_tables=None, voter_rows=None,
+                    max_sort_rows=1000000):
+    """
+    Resolves the dimensions and facts of the rows in staging_table, in one
+    transaction. New households and mailing addresses come from
+    dimension_tables['households'] and dimension_tables['mailing_addresses']
+    when they're given. When voter_rows, the output rows of staging_table,
+    are given, VOTER_DIM is versioned with merge_voters.
+    """
+    household_key = [out for _, out, _ in HOUSEHOLD_KEY_COLS]
+    household_dim_key = [dim for dim, _, _ in HOUSEHOLD_KEY_COLS]
+    mailing_key = [out for _, out, _ in MAILING_ADDRESS_KEY_COLS]
+    mailing_dim_key = [dim for dim, _, _ in MAILING_ADDRESS_KEY_COLS]
+    voter_cols = [out for _, out, _ in VOTER_COLS]
+    voter_dim_cols = [dim for dim, _, _ in VOTER_COLS]
+    params = dict(report_date=report_date, reporter_key=reporter_key,
+                  min_date=MIN_DATE, max_date=MAX_DATE)
+
+    prepared_cols = [column_sql(out, width) for _, out, width in
+                     HOUSEHOLD_COLS + HOUSEHOLD_KEY_COLS +
+                     MAILING_ADDRESS_KEY_COLS + VOTER_COLS]
+    prepared_cols.extend(LOOKUP_COLS)
+    prepared_cols.append(
+        "LEFT(CASE WHEN REGISTRATION_STATUS = 'ACTIVE' THEN STATE_VOTER_REF "
+        "ELSE STATE_VOTER_REF || COALESCE('-' || BIRTHDATE, '') END, 31) "
+        "AS STATE_VOTER_REF"
+    )
+    statements = [
+        ('CREATE TEMP TABLE nvf_prepared ON COMMIT DROP AS '
+         'SELECT *, {} AS HOUSEHOLD_HASH, {} AS MAILING_HASH '
+         'FROM (SELECT {} FROM {}) staged').format(
+             hash_sql(household_key), hash_sql(mailing_key),
+             ', '.join(prepared_cols), staging_table
+         ),
+        'ANALYZE nvf_prepared',
+    ]
+    households = mailing_addresses = 'nvf_prepared'
+    dimension_tables = dimension_tables or {}
+    if 'households' in dimension_tables:
+        households = 'nvf_households'
+        statements.append(
+            'CREATE TEMP TABLE nvf_households ON COMMIT DROP AS '
+            'SELECT HASHCODE::BIGINT AS HOUSEHOLD_HASH, {} FROM {}'.format(
+                ', '.join(column_sql(out, width) for _, out, width in
+                          HOUSEHOLD_KEY_COLS + HOUSEHOLD_COLS),
+                dimension_tables['households']
+            )
+        )
+    if 'mailing_addresses' in dimension_tables:
+        mailing_addresses = 'nvf_mailing_addresses'
+        statements.append(
+            'CREATE TEMP TABLE nvf_mailing_addresses ON COMMIT DROP AS '
+            'SELECT HASHCODE::BIGINT AS MAILING_HASH, {} FROM {}'.format(
+                ', '.join(column_sql(out, width) for _, out, width in
+                          MAILING_ADDRESS_KEY_COLS),
+                dimension_tables['mailing_addresses']
+            )
+        )
+    statements += [
+        # Households
+        ('INSERT INTO HOUSEHOLD_DIM ({0}, HASHCODE) '
+         'SELECT DISTINCT {1}, HOUSEHOLD_HASH FROM ' + households + ' p '
+         'WHERE NOT EXISTS (SELECT 1 FROM HOUSEHOLD_DIM h WHERE {2})').format(
+             ', '.join(household_dim_key), ', '.join(household_key),
+             key_sql('h', household_dim_key, 'p', household_key)
+         ),
+        ('UPDATE HOUSEHOLD_DIM h SET ({0}) = ({1}) FROM ('
+         'SELECT DISTINCT ON (HOUSEHOLD_HASH, {2}) * FROM ' + households + ' '
+         "WHERE VALIDATION_STATUS = 2) p "
+         'WHERE {3} AND NOT {4}').format(
+             ', '.join(dim for dim, _, _ in HOUSEHOLD_COLS),
+             ', '.join('p.{}'.format(out) for _, out, _ in HOUSEHOLD_COLS),
+             ', '.join(household_key),
+             key_sql('h', household_dim_key, 'p', household_key),
+             same_sql('h', [dim for dim, _, _ in HOUSEHOLD_COLS],
+                      'p', [out for _, out, _ in HOUSEHOLD_COLS])
+         ),
+
+        # Mailing addresses
+        ('INSERT INTO MAILING_ADDRESS_DIM ({0}, HASHCODE) '
+         'SELECT DISTINCT {1}, MAILING_HASH FROM ' + mailing_addresses + ' p '
+         'WHERE NOT EXISTS (SELECT 1 FROM MAILING_ADDRESS_DIM m '
+         'WHERE {2})').format(
+             ', '.join(mailing_dim_key), ', '.join(mailing_key),
+             key_sql('m', mailing_dim_key, 'p', mailing_key)
+         ),
+    ]
+    voter_statements = [
+        ('CREATE TEMP TABLE nvf_voter ON COMMIT DROP AS '
+         'SELECT DISTINCT ON (STATE_VOTER_REF) STATE_VOTER_REF, {} '
+         'FROM nvf_prepared ORDER BY STATE_VOTER_REF').format(
+             ', '.join(voter_cols)
+         ),
+        ('WITH closed AS ('
+         'UPDATE VOTER_DIM d SET VALID_TO = %(report_date)s FROM nvf_voter v '
+         'WHERE d.STATE_VOTER_REF = v.STATE_VOTER_REF '
+         'AND d.VALID_FROM <= %(report_date)s AND d.VALID_TO > %(report_date)s '
+         'AND NOT {2} RETURNING d.STATE_VOTER_REF, d.VERSION) '
+         'INSERT INTO VOTER_DIM (STATE_VOTER_REF, {0}, VERSION, VALID_FROM, '
+         'VALID_TO) '
+         'SELECT v.STATE_VOTER_REF, {1}, closed.VERSION + 1, %(report_date)s, '
+         '%(max_date)s FROM nvf_voter v '
+         'JOIN closed ON closed.STATE_VOTER_REF = v.STATE_VOTER_REF').format(
+             ', '.join(voter_dim_cols),
+             ', '.join('v.{}'.format(col) for col in voter_cols),
+             same_sql('d', voter_dim_cols, 'v', voter_cols)
+         ),
+        ('INSERT INTO VOTER_DIM (STATE_VOTER_REF, {0}, VERSION, VALID_FROM, '
+         'VALID_TO) '
+         'SELECT v.STATE_VOTER_REF, {1}, (SELECT MAX(d.VERSION) + 1 '
+         'FROM VOTER_DIM d WHERE d.STATE_VOTER_REF = v.STATE_VOTER_REF), '
+         '%(report_date)s, %(max_date)s FROM nvf_voter v '
+         'WHERE EXISTS (SELECT 1 FROM VOTER_DIM d '
+         'WHERE d.STATE_VOTER_REF = v.STATE_VOTER_REF) '
+         'AND NOT EXISTS (SELECT 1 FROM VOTER_DIM d '
+         'WHERE d.STATE_VOTER_REF = v.STATE_VOTER_REF '
+         'AND d.VALID_FROM <= %(report_date)s '
+         'AND d.VALID_TO > %(report_date)s)').format(
+             ', '.join(voter_dim_cols),
+             ', '.join('v.{}'.format(col) for col in voter_cols)
+         ),
+        ('INSERT INTO VOTER_DIM (STATE_VOTER_REF, {0}, VERSION, VALID_FROM, '
+         'VALID_TO) '
+         'SELECT STATE_VOTER_REF, {1}, 1, %(min_date)s, %(max_date)s '
+         'FROM nvf_voter v WHERE NOT EXISTS (SELECT 1 FROM VOTER_DIM d '
+         'WHERE d.STATE_VOTER_REF = v.STATE_VOTER_REF)').format(
+             ', '.join(voter_dim_cols), ', '.join(voter_cols)
+         ),
+    ]
+    fact_statements = [
+        ('CREATE TEMP TABLE nvf_jurisdiction ON COMMIT DROP AS '
+         'SELECT STATE_NAME, ENTITY_TYPE, VOTER_FILE_CODE, JURISDICTION_ID '
+         'FROM JURISDICTION_DIM '
+         'WHERE STATE_NAME IN (SELECT DISTINCT STATE_NAME FROM nvf_prepared)'),
+        fact_sql(household_key, household_dim_key, mailing_key,
+                 mailing_dim_key),
+    ]
+
+    with connection:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT DATE_ID FROM DATE_DIM WHERE DATE_VALUE = %s',
+                           [report_date])
+            date_row = cursor.fetchone()
+            if date_row is None:
+                raise ValueError('Report date {} is not in DATE_DIM'.format(
+                    report_date
+                ))
+            params['date_key'] = date_row[0]
+            for statement in statements:
+                cursor.execute(statement, params)
+            if voter_rows is None:
+                for statement in voter_statements:
+                    cursor.execute(statement, params)
+            else:
+                merge_voters(cursor, voter_rows, report_date, max_sort_rows)
+            for statement in fact_statements:
+                cursor.execute(statement, params)
+
+
+def prepared_voters(output_rows):
+    """
+    Yields [STATE_VOTER_REF, voter columns...] of output rows the way
+    resolve_staging prepares them, with '' for NULL. Rows without a
+    STATE_VOTER_REF aren't versioned.
+    """
+    for row in output_rows:
+        ref = row.get('STATE_VOTER_REF')
+        if not ref:
+            continue
+        if row.get('REGISTRATION_STATUS') != 'ACTIVE' and row.get('BIRTHDATE'):
+            ref = '{}-{}'.format(ref, row['BIRTHDATE'])
+        values = [ref[:31]]
+        for _, out, width in VOTER_COLS:
+            value = row.get(out)
+            if value is None or value is MISSING:
+                value = ''
+            value = str(value)
+            values.append(value[:width] if isinstance(width, int) else value)
+        yield values
+
+
+def merge_voters(cursor, voter_rows, report_date, max_sort_rows=1000000):
+    """
+    Versions VOTER_DIM by merging the sorted output rows in voter_rows with
+    an export of the voters in VOTER_DIM that are in nvf_prepared, then
+    copying in the versions to close and the new versions to insert
+    """
+    voter_dim_cols = [dim for dim, _, _ in VOTER_COLS]
+    export_cols = ["TO_CHAR(d.{}, 'YYYY-MM-DD')".format(dim)
+                   if width == 'DATE' else 'd.{}::TEXT'.format(dim)
+                   for dim, _, width in VOTER_COLS]
+    with tempfile.TemporaryFile('w+', newline='') as current_file, \
+            tempfile.TemporaryFile('w+', newline='') as closed_file, \
+            tempfile.TemporaryFile('w+', newline='') as versions_file:
+        # Sorted by code point like external_sort, current version first
+        cursor.copy_expert(
+            'COPY (SELECT DISTINCT ON (d.STATE_VOTER_REF COLLATE "C") '
+            'd.STATE_VOTER_REF, d.VERSION, '
+            'd.VALID_FROM <= {0} AND d.VALID_TO > {0}, {1} FROM VOTER_DIM d '
+            'WHERE d.STATE_VOTER_REF IN '
+            '(SELECT STATE_VOTER_REF FROM nvf_prepared) '
+            'ORDER BY d.STATE_VOTER_REF COLLATE "C", 3 DESC, d.VERSION DESC) '
+            'TO STDOUT WITH CSV'.format(quote_literal(report_date),
+                                        ', '.join(export_cols)),
+            current_file
+        )
+        current_file.seek(0)
+
+        voters = external_sort(prepared_voters(voter_rows), key=itemgetter(0),
+                               max_rows=max_sort_rows)
+        closed_writer = csv.writer(closed_file)
+        versions_writer = csv.writer(versions_file)
+        for closed, version in merge_versions(voters,
+                                              csv.reader(current_file),
+                                              report_date):
+            if closed is not None:
+                closed_writer.writerow(closed)
+            versions_writer.writerow(version)
+        closed_file.seek(0)
+        versions_file.seek(0)
+
+        cursor.execute('CREATE TEMP TABLE nvf_voter_closed '
+                       '(STATE_VOTER_REF TEXT, VERSION INTEGER) ON COMMIT DROP')
+        cursor.copy_expert('COPY nvf_voter_closed FROM STDIN WITH CSV',
+                           closed_file)
+        cursor.execute(
+            'CREATE TEMP TABLE nvf_voter_versions (STATE_VOTER_REF TEXT, {}, '
+            'VERSION INTEGER, VALID_FROM DATE, VALID_TO DATE) '
+            'ON COMMIT DROP'.format(', '.join('{} TEXT'.format(out) for
+                                              _, out, _ in VOTER_COLS))
+        )
+        cursor.copy_expert('COPY nvf_voter_versions FROM STDIN WITH CSV',
+                           versions_file)
+    cursor.execute('UPDATE VOTER_DIM d SET VALID_TO = %s '
+                   'FROM nvf_voter_closed c '
+                   'WHERE d.STATE_VOTER_REF = c.STATE_VOTER_REF '
+                   'AND d.VERSION = c.VERSION', [report_date])
+    cursor.execute(
+        'INSERT INTO VOTER_DIM (STATE_VOTER_REF, {}, VERSION, VALID_FROM, '
+        'VALID_TO) SELECT STATE_VOTER_REF, {}, VERSION, VALID_FROM, VALID_TO '
+        'FROM nvf_voter_versions'.format(
+            ', '.join(voter_dim_cols),
+            ', '.join('{}::{}'.format(out, width) if width == 'DATE' else out
+                      for _, out, width in VOTER_COLS)
+        )
+    )
+
+
+def fact_sql(household_key, household_dim_key, mailing_key, mailing_dim_key):
+    """
+    SQL inserting a VOTER_REPORT_FACT per prepared row. Lookups that find
+    more than one row take the first, like Pentaho's database lookups.
+    """
+    jurisdiction_joins = []
+    for i, (_, entity_type, output_col) in enumerate(JURISDICTION_KEYS):
+        alias = 'j{}'.format(i)
+        group_cols = ['STATE_NAME']
+        join_on = ['{}.STATE_NAME = p.STATE_NAME'.format(alias)]
+        if output_col is not None:
+            group_cols.append('VOTER_FILE_CODE')
+            join_on.append('{}.VOTER_FILE_CODE = p.{}'.format(alias,
+                                                             output_col))
+        jurisdiction_joins.append(
+            'LEFT JOIN (SELECT {1}, MIN(JURISDICTION_ID) AS JURISDICTION_ID '
+            'FROM nvf_jurisdiction WHERE ENTITY_TYPE = {2} GROUP BY {1}) {0} '
+            'ON {3}'.format(alias, ', '.join(group_cols),
+                            quote_literal(entity_type), ' AND '.join(join_on))
+        )
+    return (
+        'INSERT INTO VOTER_REPORT_FACT (VOTER_REPORT_DATE, DATE_KEY, '
+        'REPORTER_KEY, VOTER_KEY, HOUSEHOLD_KEY, MAILING_ADDRESS_KEY, '
+        'PARTY_KEY, PRECINCT_KEY, {0}) '
+        'SELECT %(report_date)s, %(date_key)s, %(reporter_key)s, v.VOTER_ID, '
+        'h.HOUSEHOLD_ID, m.MAILING_ADDRESS_ID, party.PARTY_ID, '
+        'precinct.PRECINCT_ID, {1} FROM nvf_prepared p '
+        'JOIN VOTER_DIM v ON v.STATE_VOTER_REF = p.STATE_VOTER_REF '
+        'AND v.VALID_FROM <= %(report_date)s AND v.VALID_TO > %(report_date)s '
+        'JOIN HOUSEHOLD_DIM h ON {2} '
+        'LEFT JOIN MAILING_ADDRESS_DIM m ON {3} '
+        'LEFT JOIN (SELECT PARTY_CODE, MIN(PARTY_ID) AS PARTY_ID FROM PARTY_DIM '
+        'GROUP BY PARTY_CODE) party ON party.PARTY_CODE = p.PARTY '
+        'LEFT JOIN (SELECT STATE_ABBREVIATION, PRECINCT_CODE, '
+        'MIN(PRECINCT_ID) AS PRECINCT_ID FROM PRECINCT_DIM '
+        'GROUP BY STATE_ABBREVIATION, PRECINCT_CODE) precinct '
+        'ON precinct.PRECINCT_CODE = p.PRECINCT_SPLIT '
+        'AND precinct.STATE_ABBREVIATION = p.STATE_NAME {4}'
+    ).format(
+        ', '.join(fact_col for fact_col, _, _ in JURISDICTION_KEYS),
+        ', '.join('j{}.JURISDICTION_ID'.format(i)
+                  for i in range(len(JURISDICTION_KEYS))),
+        key_sql('h', household_dim_key, 'p', household_key),
+        key_sql('m', mailing_dim_key, 'p', mailing_key),
+        ' '.join(jurisdiction_joins)
+    )
@@ -0,0 +1,218 @@
+import json
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+
+"""
+# Profiling
+
+When a state is slow it's not obvious which part of a row is to blame.
+A Profiler set as a transformer's profiler times every sample_every-th row:
+each extract_ or hist_ method, fix_missing_mailing_addr, validation and the
+helpers in HOT_PATHS that extract methods call, counting calls and
+exceptions as well. CsvOutput also times writing every chunk.
+
+Timed wrappers are only put on the transformer for the rows being sampled,
+so other rows run exactly the same code as without a profiler, and nothing
+changes without one.
+
+Totals are estimated from the sampled rows (see report) and printed with
+table at the end of csv_transformer runs with --profile.
+
+## Example usage
+
+>>> state_transformer.profiler = Profiler(sample_every=100)
+>>> CsvOutput(state_transformer)(state_preparer.process(), 'ny_output.csv')
+>>> print(state_transformer.profiler.table())
+"""
+
+# Transformer methods called by extract methods that are timed on their own,
+# so their time is also part of the extract methods that call them
+HOT_PATHS = ['convert_date', 'usaddress_tag', 'convert_usaddress_dict',
+             'structured_address']
+
+# Timed on every call rather than sampled rows
+UNSAMPLED = ['write']
+
+
+class Profiler(object):
+    """
+    Counts the calls, exceptions and seconds of the steps of sampled rows,
+    see the notes above. stats are kept as '<step>:calls', '<step>:errors'
+    and '<step>:seconds', plus the rows seen and sampled, and are added up
+    from worker processes like cache stats.
+    """
+
+    name = 'Profiler'
+
+    def __init__(self, sample_every=100):
+        self.sample_every = sample_every
+        self.stats = Counter()
+        self._countdown = sample_every
+        self._plans = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(stats=Counter(), _plans={})
+        return state
+
+    def sampled(self, transform_row, state_transformer):
+        """
+        Returns transform_row(input_dict, history) that times every
+        sample_every-th row with state_transformer's steps timed
+        """
+        @wraps(transform_row)
+        def sample_row(input_dict, history=False):
+            self.stats['rows'] += 1
+            self._countdown -= 1
+            if self._countdown:
+                return transform_row(input_dict, history)
+            self._countdown = self.sample_every
+            self.stats['sampled_rows'] += 1
+            patched = self.patch(state_transformer, history)
+            try:
+                return self.call('transform_row', transform_row, input_dict,
+                                 history)
+            finally:
+                for name in patched:
+                    delattr(state_transformer, name)
+        return sample_row
+
+    def patch(self, state_transformer, history):
+        """
+        Puts timed versions of the steps on state_transformer and returns
+        the names of the attributes set
+        """
+        timed = {
+            'row_plan': self.timed_row_plan(type(state_transformer)),
+            'fix_missing_mailing_addr': self.timed(
+                'fix_missing_mailing_addr',
+                state_transformer.fix_missing_mailing_addr
+            ),
+            'output_validator': self.timed_validator(
+                state_transformer.output_validator
+            ),
+        }
+        for name in HOT_PATHS:
+            timed[name] = self.timed(name, getattr(state_transformer, name))
+        for name, func in timed.items():
+            setattr(state_transformer, name, func)
+        return list(timed)
+
+    def timed_row_plan(self, cls):
+        """Returns a row_plan for cls whose steps are timed"""
+        def row_plan(history=False):
+            if (cls, history) not in self._plans:
+                plan = cls.row_plan(history)
+                self._plans[(cls, history)] = plan._replace(steps=tuple(
+                    step._replace(func=self.timed(step.name, step.func))
+                    for step in plan.steps
+                ))
+            return self._plans[(cls, history)]
+        return row_plan
+
+    def timed_validator(self, output_validator):
+        def timed_output_validator(history=False, mode='strict'):
+            return TimedValidator(self, output_validator(history, mode))
+        return timed_output_validator
+
+    def timed(self, name, func):
+        """Returns func timed as name"""
+        @wraps(func)
+        def timed_func(*args, **kwargs):
+            return self.call(name, func, *args, **kwargs)
+        return timed_func
+
+    def call(self, name, func, *args, **kwargs):
+        """Calls func, counting it and its time as name"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            self.stats[name + ':errors'] += 1
+            raise
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds, calls=1):
+        self.stats[name + ':calls'] += calls
+        self.stats[name + ':seconds'] += seconds
+
+    def take_stats(self):
+        """Returns the stats counted since the last call and resets them"""
+        stats, self.stats = self.stats, Counter()
+        return stats
+
+    def report(self):
+        """
+        Returns the stats of each step, with its seconds for all rows
+        estimated as if every row had been sampled
+        """
+        steps = defaultdict(dict)
+        for key, value in self.stats.items():
+            if ':' in key:
+                name, stat = key.rsplit(':', 1)
+                steps[name][stat] = value
+        scale = (self.stats['rows'] / self.stats['sampled_rows']
+                 if self.stats['sampled_rows'] else 0)
+        report = {
+            'sample_every': self.sample_every,
+            'rows': self.stats['rows'],
+            'sampled_rows': self.stats['sampled_rows'],
+            'steps': {},
+        }
+        for name, step in steps.items():
+            calls = step.get('calls', 0)
+            seconds = step.get('seconds', 0)
+            report['steps'][name] = {
+                'calls': calls,
+                'errors': step.get('errors', 0),
+                'seconds': seconds,
+                'mean_ms': 1000 * seconds / calls if calls else 0,
+                'estimated_seconds': (seconds if name in UNSAMPLED
+                                      else seconds * scale),
+            }
+        return report
+
+    def write_report(self, path):
+        with open(path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2, sort_keys=True)
+
+    def table(self):
+        """Returns the report as a table, slowest steps first"""
+        report = self.report()
+        steps = sorted(report['steps'].items(),
+                       key=lambda item: -item[1]['estimated_seconds'])
+        total = report['steps'].get('transform_row', {}).get(
+            'estimated_seconds', 0
+        ) + report['steps'].get('write', {}).get('estimated_seconds', 0)
+        lines = [
+            '{}: sampled {} of {} rows'.format(self.name,
+                                               report['sampled_rows'],
+                                               report['rows']),
+            '{:<36} {:>9} {:>7} {:>10} {:>11} {:>6}'.format(
+                'step', 'calls', 'errors', 'mean ms', 'est. total s', '%'
+            ),
+        ]
+        for name, step in steps:
+            lines.append('{:<36} {:>9} {:>7} {:>10.3f} {:>11.2f} {:>6.1%}'.format(
+                name, step['calls'], step['errors'], step['mean_ms'],
+                step['estimated_seconds'],
+                step['estimated_seconds'] / total if total else 0
+            ))
+        return '\n'.join(lines)
+
+
+class TimedValidator(object):
+    """An OutputValidator whose calls are timed as validate_output_row"""
+
+    def __init__(self, profiler, validator):
+        self.profiler = profiler
+        self.validator = validator
+
+    def __call__(self, output_dict):
+        return self.profiler.call('validate_output_row', self.validator,
+                                  output_dict)
+
+    def __getattr__(self, name):
+        return getattr(self.validator, name)
@@ -0,0 +1,234 @@
+import csv
+from collections.abc import MutableMapping
+from operator import itemgetter
+
+"""
+# Compact records
+
+Output rows are built up as dicts by BaseTransformer.process_row, since
+extract methods return dicts, but after that every row has the same columns.
+A Record keeps the values of a row in a list in a fixed column order, so
+OutputValidator can check it by position and CsvOutput can hand it straight
+to csv.writer instead of going through csv.DictWriter. Records are smaller
+than dicts, which matters for the chunks of rows passed between processes.
+
+Records can still be used like dicts ({column: value}). Columns a Record
+type doesn't have are kept in a dict on the side, and columns that haven't
+been set hold MISSING and behave as if they weren't there.
+
+Input rows stay dicts: extract methods look up columns by name many times
+per row, which a dict does faster than any Python class can. read_records
+builds them without csv.DictReader's per-row overhead.
+
+## Example usage
+
+>>> VoterRecord = record_type(['FIRST_NAME', 'LAST_NAME'])
+>>> voter = VoterRecord()
+>>> voter.update({'FIRST_NAME': 'JANE'})
+>>> voter.get('FIRST_NAME'), 'LAST_NAME' in voter, voter.row
+('JANE', False, ['JANE', MISSING])
+"""
+
+
+class _Missing(object):
+    """Value of a column that hasn't been set. Written as an empty string."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __str__(self):
+        return ''
+
+    def __reduce__(self):
+        return 'MISSING'
+
+MISSING = _Missing()
+
+
+class Record(MutableMapping):
+    """
+    A row of values in the order of the class's columns, with a dict
+    interface. Use record_type to make a Record class for a list of columns.
+
+    Attributes:
+        row: list of values, one per column, MISSING if not set
+        extra: dict of values for columns not in columns, or None
+    """
+
+    __slots__ = ('row', 'extra')
+    columns = ()
+    index = {}
+
+    def __init__(self, row=None, extra=None):
+        self.row = [MISSING] * len(self.columns) if row is None else row
+        self.extra = extra
+
+    def __getitem__(self, col):
+        i = self.index.get(col)
+        if i is None:
+            if self.extra is None:
+                raise KeyError(col)
+            return self.extra[col]
+        value = self.row[i]
+        if value is MISSING:
+            raise KeyError(col)
+        return value
+
+    def get(self, col, default=None):
+        i = self.index.get(col)
+        if i is None:
+            if self.extra is None:
+                return default
+            return self.extra.get(col, default)
+        value = self.row[i]
+        return default if value is MISSING else value
+
+    def __setitem__(self, col, value):
+        i = self.index.get(col)
+        if i is None:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[col] = value
+        else:
+            self.row[i] = value
+
+    def __delitem__(self, col):
+        i = self.index.get(col)
+        if i is None or self.row[i] is MISSING:
+            if self.extra is None:
+                raise KeyError(col)
+            del self.extra[col]
+        else:
+            self.row[i] = MISSING
+
+    def __contains__(self, col):
+        i = self.index.get(col)
+        if i is None:
+            return self.extra is not None and col in self.extra
+        return self.row[i] is not MISSING
+
+    def __iter__(self):
+        row = self.row
+        for col, i in self.index.items():
+            if row[i] is not MISSING:
+                yield col
+        if self.extra:
+            for col in self.extra:
+                yield col
+
+    def __len__(self):
+        return (len(self.index) - self.row.count(MISSING) +
+                (len(self.extra) if self.extra else 0))
+
+    @classmethod
+    def from_dict(cls, row_dict):
+        """Returns a record of the values in row_dict"""
+        if row_dict.keys() == cls.index.keys():
+            return cls(list(map(row_dict.__getitem__, cls.columns)))
+        record = cls()
+        record.update(row_dict)
+        return record
+
+    def update(self, other=(), **kwargs):
+        if kwargs or not hasattr(other, 'items'):
+            return MutableMapping.update(self, other, **kwargs)
+        row = self.row
+        index = self.index
+        for col, value in other.items():
+            i = index.get(col)
+            if i is None:
+                self[col] = value
+            else:
+                row[i] = value
+
+    def copy(self):
+        return type(self)(list(self.row),
+                          dict(self.extra) if self.extra is not None else None)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __reduce__(self):
+        return (_unpickle_record, (self.columns, self.row, self.extra))
+
+
+_record_types = {}
+
+
+def record_type(columns):
+    """Returns the Record class for columns, which is made once per process"""
+    columns = tuple(columns)
+    try:
+        return _record_types[columns]
+    except KeyError:
+        index = {}
+        for i, col in enumerate(columns):
+            # Like a dict, the last of any repeated columns wins
+            index[col] = i
+        cls = _record_types[columns] = type('Record', (Record,), {
+            '__slots__': (),
+            'columns': columns,
+            'index': index,
+        })
+        return cls
+
+
+def _unpickle_record(columns, row, extra):
+    return record_type(columns)(row, extra)
+
+
+def read_records(infile, delimiter=',', fieldnames=None):
+    """
+    Yields a dict for every row of a csv file, the same as csv.DictReader:
+    columns are named by fieldnames, or the first row if it's None, missing
+    values are None, extra values are a list under None, and empty rows are
+    skipped. Well-formed rows are zipped straight into a dict, which saves
+    DictReader's per-row checks.
+    """
+    reader = csv.reader(infile, delimiter=delimiter)
+    if fieldnames is None:
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return
+    num_fields = len(fieldnames)
+    for row in reader:
+        if len(row) == num_fields:
+            yield dict(zip(fieldnames, row))
+        elif not row:
+            continue
+        elif len(row) < num_fields:
+            row.extend([None] * (num_fields - len(row)))
+            yield dict(zip(fieldnames, row))
+        else:
+            row_dict = dict(zip(fieldnames, row))
+            row_dict[None] = row[num_fields:]
+            yield row_dict
+
+
+def record_rows(records, fieldnames, checked=False):
+    """
+    Yields the values of each record or dict in fieldnames order, raising a
+    ValueError for any other columns like csv.DictWriter does.
+
+    With checked=True every row is taken to have exactly the columns in
+    fieldnames, as rows that passed OutputValidator do, so dicts are turned
+    into tuples by a single itemgetter and matching records aren't checked.
+    """
+    fieldnames = tuple(fieldnames)
+    row_type = record_type(fieldnames)
+    if checked:
+        getter = itemgetter(*fieldnames)
+        for record in records:
+            yield record.row if type(record) is row_type else getter(record)
+        return
+    for record in records:
+        if type(record) is row_type and not record.extra:
+            yield record.row
+            continue
+        wrong_fields = [col for col in record if col not in fieldnames]
+        if wrong_fields:
+            raise ValueError('dict contains fields not in fieldnames: ' +
+                             ', '.join(repr(col) for col in wrong_fields))
+        yield [record.get(col, '') for col in fieldnames]
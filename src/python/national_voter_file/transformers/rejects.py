@@ -0,0 +1,133 @@
+import csv
+from collections import Counter
+
+from national_voter_file.transformers.output import output_base
+
+"""
+# Rejected rows
+
+By default an exception in any row stops the run. Given a RejectWriter,
+BaseOutput writes rows that fail to a rejects file instead and keeps going,
+until more rows fail than the error budget allows:
+
+- max_errors: most rows that can fail, or None
+- max_error_rate: most rows that can fail per input row, once min_rows
+  rows have been transformed, or None
+
+Each rejected row has the exception's class and message, the step of the
+transformer it failed in (an extract_ or hist_ method, fix_missing_mailing_addr
+or validate_output_row) and the input row as JSON, see output.rejected_row.
+
+## Example usage
+
+>>> rejects = RejectWriter(rejects_path('ny_output.csv'), max_errors=100)
+>>> rejects.open()
+>>> CsvOutput(state_transformer, rejects=rejects)(rows, 'ny_output.csv')
+>>> rejects.close()
+>>> print(rejects.summary())
+"""
+
+COLUMNS = ['ERROR_TYPE', 'ERROR_MESSAGE', 'FAILED_STEP', 'INPUT_ROW']
+
+
+class ErrorBudgetExceeded(Exception):
+    pass
+
+
+def rejects_path(output_path):
+    """Returns the path of the rejected rows of an output file"""
+    return '{}_rejects.csv'.format(output_base(output_path))
+
+
+class RejectWriter(object):
+    """
+    Writes the rows that failed to path and counts them by error type,
+    raising ErrorBudgetExceeded once they're over budget, see the notes
+    above.
+
+    Only the process writing output writes rejects, so the file isn't
+    pickled for worker processes.
+    """
+
+    def __init__(self, path, max_errors=None, max_error_rate=None,
+                 min_rows=1000):
+        self.path = path
+        self.max_errors = max_errors
+        self.max_error_rate = max_error_rate
+        self.min_rows = min_rows
+        self.rows = 0
+        self.errors = Counter()
+        self._file = None
+        self._writer = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_file=None, _writer=None)
+        return state
+
+    def open(self, state=None):
+        """
+        Opens the rejects file, or with state from checkpoint_state, reopens
+        it as it was then
+        """
+        if state is None:
+            self._file = open(self.path, 'w', newline='')
+            self._writer = csv.writer(self._file, lineterminator='\n')
+            self._writer.writerow(COLUMNS)
+            return
+        self._file = open(self.path, 'r+', newline='')
+        self._file.seek(state['bytes'])
+        self._file.truncate()
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        self.rows = state['rows']
+        self.errors = Counter(state['errors'])
+
+    def checkpoint_state(self):
+        self._file.flush()
+        return {'bytes': self._file.tell(), 'rows': self.rows,
+                'errors': dict(self.errors)}
+
+    def add(self, rejected, rows):
+        """
+        Writes the rejected rows of a chunk of rows input rows and checks
+        the error budget
+        """
+        self.rows += rows
+        if rejected:
+            self._writer.writerows(rejected)
+            self.errors.update(row[0] for row in rejected)
+        self.check(sum(self.errors.values()), self.rows)
+
+    def check(self, num_errors, rows):
+        """Raises ErrorBudgetExceeded if num_errors of rows is over budget"""
+        if self.max_errors is not None and num_errors > self.max_errors:
+            raise ErrorBudgetExceeded(
+                '{} rows failed, more than the {} allowed, see {}'.format(
+                    num_errors, self.max_errors, self.path
+                )
+            )
+        if (self.max_error_rate is not None and rows >= self.min_rows and
+                num_errors > self.max_error_rate * rows):
+            raise ErrorBudgetExceeded(
+                '{} of {} rows failed, more than the {:.2%} allowed, '
+                'see {}'.format(num_errors, rows, self.max_error_rate,
+                                self.path)
+            )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def summary(self):
+        num_errors = sum(self.errors.values())
+        summary = 'Rejected {} of {} rows ({:.2%})'.format(
+            num_errors, self.rows, num_errors / self.rows if self.rows else 0
+        )
+        if num_errors:
+            summary += ': ' + ', '.join(
+                '{} {}'.format(count, error_type)
+                for error_type, count in self.errors.most_common()
+            )
+        return summary
@@ -0,0 +1,197 @@
+import csv
+import json
+import os
+import shutil
+import multiprocessing
+
+from national_voter_file.transformers.output import output_base, stat_sources
+from national_voter_file.transformers.rejects import (ErrorBudgetExceeded,
+                                                      RejectWriter,
+                                                      rejects_path)
+
+"""
+# Sharded output
+
+Some inputs are made of parts that don't depend on each other, like
+Pennsylvania's county files, which each come with their own zones. A
+preparer lists them with partitions() and reads one with
+process_partition(), see BasePreparer.
+
+ShardedOutput transforms each partition in a worker process of its own, with
+a copy of an output (e.g. a CsvOutput) writing it to a shard in
+<state>_shards/. Transformers that depend on the order of rows
+(parallel_safe = False) can still be run this way, as each partition is
+transformed in order and starts from the state the transformer had before
+the run (see BaseTransformer.checkpoint_state). The largest partitions are
+started first.
+
+Once every shard is written they're joined into the output in partition
+order, with one header. With manifest=True they're kept instead, and
+<state>_manifest.json lists each shard with its partition and rows, which
+works for any output format.
+
+With a RejectWriter on the output, each shard writes its rejected rows to
+its own rejects file with the same error budget, and they're added to the
+output's as the shards are joined. The budget of the whole run is checked
+as each shard is written, so a run that's over it stops without waiting
+for the rest.
+
+## Example usage
+
+>>> output = CsvOutput(state_transformer)
+>>> ShardedOutput(output, workers=8)(state_preparer, 'pa_output.csv')
+"""
+
+
+def shard_dir(output_path):
+    """Returns the directory the shards of an output file are written to"""
+    return '{}_shards'.format(output_base(output_path))
+
+
+def manifest_path(output_path):
+    """Returns the path of the manifest of an output file's shards"""
+    return '{}_manifest.json'.format(output_base(output_path))
+
+
+class ShardedOutput(object):
+    """
+    Writes each of a StatePreparer's partitions to a shard with a copy of
+    output in one of workers processes, see the notes above.
+    """
+
+    def __init__(self, output, workers=1, manifest=False):
+        self.output = output
+        self.workers = workers
+        self.manifest = manifest
+
+    def __call__(self, state_preparer, output_path, history=False):
+        partitions = state_preparer.partitions()
+        directory = shard_dir(output_path)
+        os.makedirs(directory, exist_ok=True)
+        extension = os.path.splitext(output_path)[1]
+        paths = [os.path.join(directory, '{:03d}{}'.format(i, extension))
+                 for i in range(len(partitions))]
+        rejects = self.output.rejects
+        budget = None
+        if rejects is not None:
+            budget = (rejects.max_errors, rejects.max_error_rate)
+        initial_state = self.output.state_transformer.checkpoint_state()
+
+        order = sorted(range(len(partitions)), key=lambda i: (
+            -state_preparer.partition_size(partitions[i]), i
+        ))
+        tasks = [(i, self.output, state_preparer, partitions[i], paths[i],
+                  history, initial_state, budget) for i in order]
+        if self.workers > 1 and len(tasks) > 1:
+            with multiprocessing.Pool(min(self.workers, len(tasks))) as pool:
+                results = self.collect(
+                    pool.imap_unordered(_write_indexed_shard, tasks), paths
+                )
+        else:
+            results = self.collect(map(_write_indexed_shard, tasks), paths)
+
+        self.output.input_rows = 0
+        for i in range(len(partitions)):
+            input_rows, cache_stats, rejected = results[i]
+            self.output.input_rows += input_rows
+            for cache in stat_sources(self.output.state_transformer):
+                cache.stats.update(cache_stats[cache.name])
+            if rejects is not None:
+                rejects.add(rejected, input_rows)
+
+        if self.manifest:
+            self.write_manifest(output_path, partitions, paths, results)
+        else:
+            join_shards(paths, output_path)
+            shutil.rmtree(directory)
+
+    def collect(self, shard_results, paths):
+        """
+        Returns {partition index: (input rows, cache stats, rejected rows)}
+        of the shards as they're written, checking the run's error budget
+        after each one
+        """
+        rejects = self.output.rejects
+        results = {}
+        num_errors = rows = 0
+        for i, (input_rows, cache_stats) in shard_results:
+            if rejects is None:
+                results[i] = (input_rows, cache_stats, [])
+                continue
+            shard_rejects = rejects_path(paths[i])
+            with open(shard_rejects, newline='') as rejects_file:
+                rejected = list(csv.reader(rejects_file))[1:]
+            os.remove(shard_rejects)
+            results[i] = (input_rows, cache_stats, rejected)
+            num_errors += len(rejected)
+            rows += input_rows
+            try:
+                rejects.check(sum(rejects.errors.values()) + num_errors,
+                              rejects.rows + rows)
+            except ErrorBudgetExceeded:
+                # Keep what was rejected so far for the error to point to
+                for j in sorted(results):
+                    try:
+                        rejects.add(results[j][2], results[j][0])
+                    except ErrorBudgetExceeded:
+                        pass
+                raise
+        return results
+
+    def write_manifest(self, output_path, partitions, paths, results):
+        manifest = {
+            'output': os.path.basename(output_path),
+            'shards': [{'partition': partition,
+                        'path': os.path.relpath(path,
+                                                os.path.dirname(output_path)),
+                        'input_rows': results[i][0]}
+                       for i, (partition, path) in enumerate(zip(partitions,
+                                                                 paths))],
+        }
+        with open(manifest_path(output_path), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+
+def join_shards(paths, output_path):
+    """
+    Writes csv shards one after another to output_path, with the header
+    of the first
+    """
+    with open(output_path, 'wb') as output_file:
+        for i, path in enumerate(paths):
+            with open(path, 'rb') as shard_file:
+                if i:
+                    shard_file.readline()
+                shutil.copyfileobj(shard_file, output_file, 1 << 20)
+
+
+def _write_indexed_shard(task):
+    return task[0], _write_shard(*task[1:])
+
+
+def _write_shard(output, state_preparer, partition, shard_path, history,
+                 initial_state, budget):
+    """
+    Writes the rows of partition to shard_path, returning the input rows
+    and the stats of the transformer's caches
+    """
+    state_transformer = output.state_transformer
+    state_transformer.restore_state(initial_state)
+    # Without worker processes output is the caller's, so it gets its
+    # rejects back
+    rejects = output.rejects
+    if budget is not None:
+        output.rejects = RejectWriter(rejects_path(shard_path), *budget)
+        output.rejects.open()
+    try:
+        output(state_preparer.process_partition(partition), shard_path,
+               history=history)
+    finally:
+        if budget is not None:
+            output.rejects.close()
+            output.rejects = rejects
+    if state_transformer.address_cache is not None:
+        state_transformer.address_cache.flush()
+    cache_stats = dict((cache.name, cache.take_stats())
+                       for cache in stat_sources(state_transformer))
+    return output.input_rows, cache_stats
@@ -0,0 +1,258 @@
+"""
+USPS address tables, from Publication 28 appendix C.
+
+STREET_SUFFIXES maps every accepted spelling of a street suffix (upper case)
+to its standard abbreviation, DIRECTIONALS does the same for directionals
+and UNIT_DESIGNATORS for secondary unit designators.
+"""
+
+# Standard abbreviation: other common spellings
+_STREET_SUFFIXES = {
+    'ALY': ['ALLEY', 'ALLEE', 'ALLY'],
+    'ANX': ['ANNEX', 'ANEX', 'ANNX'],
+    'ARC': ['ARCADE'],
+    'AVE': ['AVENUE', 'AV', 'AVEN', 'AVENU', 'AVN', 'AVNUE'],
+    'BYU': ['BAYOU', 'BAYOO'],
+    'BCH': ['BEACH'],
+    'BND': ['BEND'],
+    'BLF': ['BLUFF', 'BLUF'],
+    'BLFS': ['BLUFFS'],
+    'BTM': ['BOTTOM', 'BOT', 'BOTTM'],
+    'BLVD': ['BOULEVARD', 'BOUL', 'BOULV'],
+    'BR': ['BRANCH', 'BRNCH'],
+    'BRG': ['BRIDGE', 'BRDGE'],
+    'BRK': ['BROOK'],
+    'BRKS': ['BROOKS'],
+    'BG': ['BURG'],
+    'BGS': ['BURGS'],
+    'BYP': ['BYPASS', 'BYPA', 'BYPAS', 'BYPS'],
+    'CP': ['CAMP', 'CMP'],
+    'CYN': ['CANYON', 'CANYN', 'CNYN'],
+    'CPE': ['CAPE'],
+    'CSWY': ['CAUSEWAY', 'CAUSWA'],
+    'CTR': ['CENTER', 'CEN', 'CENT', 'CENTR', 'CENTRE', 'CNTER', 'CNTR'],
+    'CTRS': ['CENTERS'],
+    'CIR': ['CIRCLE', 'CIRC', 'CIRCL', 'CRCL', 'CRCLE'],
+    'CIRS': ['CIRCLES'],
+    'CLF': ['CLIFF'],
+    'CLFS': ['CLIFFS'],
+    'CLB': ['CLUB'],
+    'CMN': ['COMMON'],
+    'CMNS': ['COMMONS'],
+    'COR': ['CORNER'],
+    'CORS': ['CORNERS'],
+    'CRSE': ['COURSE'],
+    'CT': ['COURT'],
+    'CTS': ['COURTS'],
+    'CV': ['COVE'],
+    'CVS': ['COVES'],
+    'CRK': ['CREEK'],
+    'CRES': ['CRESCENT', 'CRSENT', 'CRSNT'],
+    'CRST': ['CREST'],
+    'XING': ['CROSSING', 'CRSSNG'],
+    'XRD': ['CROSSROAD'],
+    'XRDS': ['CROSSROADS'],
+    'CURV': ['CURVE'],
+    'DL': ['DALE'],
+    'DM': ['DAM'],
+    'DV': ['DIVIDE', 'DIV', 'DVD'],
+    'DR': ['DRIVE', 'DRIV', 'DRV'],
+    'DRS': ['DRIVES'],
+    'EST': ['ESTATE'],
+    'ESTS': ['ESTATES'],
+    'EXPY': ['EXPRESSWAY', 'EXP', 'EXPR', 'EXPRESS', 'EXPW'],
+    'EXT': ['EXTENSION', 'EXTN', 'EXTNSN'],
+    'EXTS': ['EXTENSIONS'],
+    'FALL': [],
+    'FLS': ['FALLS'],
+    'FRY': ['FERRY', 'FRRY'],
+    'FLD': ['FIELD'],
+    'FLDS': ['FIELDS'],
+    'FLT': ['FLAT'],
+    'FLTS': ['FLATS'],
+    'FRD': ['FORD'],
+    'FRDS': ['FORDS'],
+    'FRST': ['FOREST', 'FORESTS'],
+    'FRG': ['FORGE', 'FORG'],
+    'FRGS': ['FORGES'],
+    'FRK': ['FORK'],
+    'FRKS': ['FORKS'],
+    'FT': ['FORT', 'FRT'],
+    'FWY': ['FREEWAY', 'FREEWY', 'FRWAY', 'FRWY'],
+    'GDN': ['GARDEN', 'GARDN', 'GRDEN', 'GRDN'],
+    'GDNS': ['GARDENS', 'GRDNS'],
+    'GTWY': ['GATEWAY', 'GATEWY', 'GATWAY', 'GTWAY'],
+    'GLN': ['GLEN'],
+    'GLNS': ['GLENS'],
+    'GRN': ['GREEN'],
+    'GRNS': ['GREENS'],
+    'GRV': ['GROVE', 'GROV'],
+    'GRVS': ['GROVES'],
+    'HBR': ['HARBOR', 'HARB', 'HARBR', 'HRBOR'],
+    'HBRS': ['HARBORS'],
+    'HVN': ['HAVEN'],
+    'HTS': ['HEIGHTS', 'HT'],
+    'HWY': ['HIGHWAY', 'HIGHWY', 'HIWAY', 'HIWY', 'HWAY'],
+    'HL': ['HILL'],
+    'HLS': ['HILLS'],
+    'HOLW': ['HOLLOW', 'HLLW', 'HOLLOWS', 'HOLWS'],
+    'INLT': ['INLET'],
+    'IS': ['ISLAND', 'ISLND'],
+    'ISS': ['ISLANDS', 'ISLNDS'],
+    'ISLE': ['ISLES'],
+    'JCT': ['JUNCTION', 'JCTION', 'JCTN', 'JUNCTN', 'JUNCTON'],
+    'JCTS': ['JUNCTIONS', 'JCTNS'],
+    'KY': ['KEY'],
+    'KYS': ['KEYS'],
+    'KNL': ['KNOLL', 'KNOL'],
+    'KNLS': ['KNOLLS'],
+    'LK': ['LAKE'],
+    'LKS': ['LAKES'],
+    'LAND': [],
+    'LNDG': ['LANDING', 'LNDNG'],
+    'LN': ['LANE'],
+    'LGT': ['LIGHT'],
+    'LGTS': ['LIGHTS'],
+    'LF': ['LOAF'],
+    'LCK': ['LOCK'],
+    'LCKS': ['LOCKS'],
+    'LDG': ['LODGE', 'LDGE', 'LODG'],
+    'LOOP': ['LOOPS'],
+    'MALL': [],
+    'MNR': ['MANOR'],
+    'MNRS': ['MANORS'],
+    'MDW': ['MEADOW'],
+    'MDWS': ['MEADOWS', 'MEDOWS'],
+    'MEWS': [],
+    'ML': ['MILL'],
+    'MLS': ['MILLS'],
+    'MSN': ['MISSION', 'MISSN', 'MSSN'],
+    'MTWY': ['MOTORWAY'],
+    'MT': ['MOUNT', 'MNT'],
+    'MTN': ['MOUNTAIN', 'MNTAIN', 'MNTN', 'MOUNTIN', 'MTIN'],
+    'MTNS': ['MOUNTAINS', 'MNTNS'],
+    'NCK': ['NECK'],
+    'ORCH': ['ORCHARD', 'ORCHRD'],
+    'OVAL': ['OVL'],
+    'OPAS': ['OVERPASS'],
+    'PARK': ['PRK', 'PARKS'],
+    'PKWY': ['PARKWAY', 'PARKWY', 'PKWAY', 'PKY', 'PARKWAYS', 'PKWYS'],
+    'PASS': [],
+    'PSGE': ['PASSAGE'],
+    'PATH': ['PATHS'],
+    'PIKE': ['PIKES'],
+    'PNE': ['PINE'],
+    'PNES': ['PINES'],
+    'PL': ['PLACE'],
+    'PLN': ['PLAIN'],
+    'PLNS': ['PLAINS'],
+    'PLZ': ['PLAZA', 'PLZA'],
+    'PT': ['POINT'],
+    'PTS': ['POINTS'],
+    'PRT': ['PORT'],
+    'PRTS': ['PORTS'],
+    'PR': ['PRAIRIE', 'PRR'],
+    'RADL': ['RADIAL', 'RAD', 'RADIEL'],
+    'RAMP': [],
+    'RNCH': ['RANCH', 'RANCHES', 'RNCHS'],
+    'RPD': ['RAPID'],
+    'RPDS': ['RAPIDS'],
+    'RST': ['REST'],
+    'RDG': ['RIDGE', 'RDGE'],
+    'RDGS': ['RIDGES'],
+    'RIV': ['RIVER', 'RVR', 'RIVR'],
+    'RD': ['ROAD'],
+    'RDS': ['ROADS'],
+    'RTE': ['ROUTE'],
+    'ROW': [],
+    'RUE': [],
+    'RUN': [],
+    'SHL': ['SHOAL'],
+    'SHLS': ['SHOALS'],
+    'SHR': ['SHORE', 'SHOAR'],
+    'SHRS': ['SHORES', 'SHOARS'],
+    'SKWY': ['SKYWAY'],
+    'SPG': ['SPRING', 'SPNG', 'SPRNG'],
+    'SPGS': ['SPRINGS', 'SPNGS', 'SPRNGS'],
+    'SPUR': ['SPURS'],
+    'SQ': ['SQUARE', 'SQR', 'SQRE', 'SQU'],
+    'SQS': ['SQUARES', 'SQRS'],
+    'STA': ['STATION', 'STATN', 'STN'],
+    'STRA': ['STRAVENUE', 'STRAV', 'STRAVEN', 'STRAVN', 'STRVN', 'STRVNUE'],
+    'STRM': ['STREAM', 'STREME'],
+    'ST': ['STREET', 'STRT', 'STR'],
+    'STS': ['STREETS'],
+    'SMT': ['SUMMIT', 'SUMIT', 'SUMITT'],
+    'TER': ['TERRACE', 'TERR'],
+    'TRWY': ['THROUGHWAY'],
+    'TRCE': ['TRACE', 'TRACES'],
+    'TRAK': ['TRACK', 'TRACKS', 'TRK', 'TRKS'],
+    'TRFY': ['TRAFFICWAY'],
+    'TRL': ['TRAIL', 'TRAILS', 'TRLS'],
+    'TRLR': ['TRAILER', 'TRLRS'],
+    'TUNL': ['TUNNEL', 'TUNEL', 'TUNLS', 'TUNNELS', 'TUNNL'],
+    'TPKE': ['TURNPIKE', 'TRNPK', 'TURNPK'],
+    'UPAS': ['UNDERPASS'],
+    'UN': ['UNION'],
+    'UNS': ['UNIONS'],
+    'VLY': ['VALLEY', 'VALLY', 'VLLY'],
+    'VLYS': ['VALLEYS'],
+    'VIA': ['VIADUCT', 'VDCT', 'VIADCT'],
+    'VW': ['VIEW'],
+    'VWS': ['VIEWS'],
+    'VLG': ['VILLAGE', 'VILL', 'VILLAG', 'VILLG', 'VILLIAGE'],
+    'VLGS': ['VILLAGES'],
+    'VL': ['VILLE'],
+    'VIS': ['VISTA', 'VIST', 'VST', 'VSTA'],
+    'WALK': ['WALKS'],
+    'WALL': [],
+    'WAY': ['WY'],
+    'WAYS': [],
+    'WL': ['WELL'],
+    'WLS': ['WELLS'],
+}
+
+STREET_SUFFIXES = dict(
+    (spelling, abbreviation)
+    for abbreviation, spellings in _STREET_SUFFIXES.items()
+    for spelling in [abbreviation] + spellings
+)
+
+DIRECTIONALS = {
+    'N': 'N', 'NORTH': 'N',
+    'S': 'S', 'SOUTH': 'S',
+    'E': 'E', 'EAST': 'E',
+    'W': 'W', 'WEST': 'W',
+    'NE': 'NE', 'NORTHEAST': 'NE',
+    'NW': 'NW', 'NORTHWEST': 'NW',
+    'SE': 'SE', 'SOUTHEAST': 'SE',
+    'SW': 'SW', 'SOUTHWEST': 'SW',
+}
+
+UNIT_DESIGNATORS = {
+    'APT': 'APT', 'APARTMENT': 'APT',
+    'BSMT': 'BSMT', 'BASEMENT': 'BSMT',
+    'BLDG': 'BLDG', 'BUILDING': 'BLDG',
+    'DEPT': 'DEPT', 'DEPARTMENT': 'DEPT',
+    'FL': 'FL', 'FLOOR': 'FL',
+    'FRNT': 'FRNT', 'FRONT': 'FRNT',
+    'HNGR': 'HNGR', 'HANGAR': 'HNGR',
+    'KEY': 'KEY',
+    'LBBY': 'LBBY', 'LOBBY': 'LBBY',
+    'LOT': 'LOT',
+    'LOWR': 'LOWR', 'LOWER': 'LOWR',
+    'OFC': 'OFC', 'OFFICE': 'OFC',
+    'PH': 'PH', 'PENTHOUSE': 'PH',
+    'PIER': 'PIER',
+    'REAR': 'REAR',
+    'RM': 'RM', 'ROOM': 'RM',
+    'SIDE': 'SIDE',
+    'SLIP': 'SLIP',
+    'SPC': 'SPC', 'SPACE': 'SPC',
+    'STOP': 'STOP',
+    'STE': 'STE', 'SUITE': 'STE',
+    'TRLR': 'TRLR', 'TRAILER': 'TRLR',
+    'UNIT': 'UNIT',
+    'UPPR': 'UPPR', 'UPPER': 'UPPR',
+    '#': '#',
+}
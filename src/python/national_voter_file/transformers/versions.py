@@ -0,0 +1,115 @@
+import csv
+import heapq
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+from national_voter_file.transformers.output import chunks
+
+"""
+# Voter versions
+
+VOTER_DIM keeps a version of each voter per change (type 2): VERSION counts
+up from 1, and each version is valid from VALID_FROM until VALID_TO.
+merge_versions works out what a report changes by merging the report's
+voters against the voters already in VOTER_DIM, both sorted by
+STATE_VOTER_REF, instead of looking each voter up:
+
+- a voter that isn't in VOTER_DIM gets version 1, valid from min_date
+- a voter whose version valid on the report date has different columns has
+  that version closed at the report date and a new version valid from it
+- a voter in VOTER_DIM without a version valid on the report date, e.g.
+  one that was closed when they left an earlier report, gets a version
+  after their last one, valid from the report date
+- anything else is left as it is
+
+Reports are sorted with external_sort, which sorts max_rows at a time in
+memory and merges the sorted runs back from temporary files, so memory
+stays the same however big the state is.
+
+Strings are compared by code point, so rows sorted by Postgres need
+COLLATE "C" to be in the same order.
+
+## Example usage
+
+>>> voters = external_sort(report_rows, key=itemgetter(0))
+>>> for closed, version in merge_versions(voters, current_rows, '2017-02-01'):
+...     closed_writer.writerow(closed) if closed else None
+...     versions_writer.writerow(version)
+"""
+
+MIN_DATE = '1900-01-01'
+MAX_DATE = '2199-12-31'
+
+
+def _decorated_run(run, run_index, key):
+    for n, row in enumerate(csv.reader(run)):
+        yield key(row), run_index, n, row
+
+
+def external_sort(rows, key, max_rows=1000000, temp_dir=None):
+    """
+    Yields rows (lists of strings) sorted by key. Rows with the same key
+    stay in the order they came in.
+    """
+    runs = []
+    try:
+        for chunk in chunks(rows, max_rows):
+            chunk.sort(key=key)
+            if not runs and len(chunk) < max_rows:
+                # Fits in memory
+                for row in chunk:
+                    yield row
+                return
+            run = tempfile.TemporaryFile('w+', newline='', dir=temp_dir)
+            csv.writer(run).writerows(chunk)
+            run.seek(0)
+            runs.append(run)
+        # heapq.merge only takes a key from Python 3.5, so it merges rows
+        # decorated with their key, run and position, which also keeps rows
+        # with equal keys in the order they came in
+        for _, _, _, row in heapq.merge(*[_decorated_run(run, i, key)
+                                          for i, run in enumerate(runs)]):
+            yield row
+    finally:
+        for run in runs:
+            run.close()
+
+
+def merge_versions(voters, current_voters, report_date, min_date=MIN_DATE,
+                   max_date=MAX_DATE):
+    """
+    Merges a report's voters with the ones in VOTER_DIM and yields a
+    (closed, version) pair per voter that changed: closed is the
+    [STATE_VOTER_REF, VERSION] to close at report_date, or None, and version
+    is the [STATE_VOTER_REF, columns..., VERSION, VALID_FROM, VALID_TO] to
+    insert.
+
+    Inputs:
+        voters: [STATE_VOTER_REF, columns...] of the report, sorted by
+            STATE_VOTER_REF. Only the first row of a voter is used.
+        current_voters: [STATE_VOTER_REF, VERSION, IS_CURRENT, columns...]
+            per voter in VOTER_DIM, sorted by STATE_VOTER_REF, where
+            IS_CURRENT is 't' if the version is valid on report_date, or
+            else their last version. Empty columns are '' in both.
+    """
+    current_voters = iter(current_voters)
+    current = next(current_voters, None)
+    last_ref = None
+    for ref, same_ref in groupby(voters, key=itemgetter(0)):
+        if last_ref is not None and ref < last_ref:
+            raise ValueError('Voters are not sorted by STATE_VOTER_REF, '
+                             'found {} after {}'.format(ref, last_ref))
+        last_ref = ref
+        columns = next(same_ref)[1:]
+        while current is not None and current[0] < ref:
+            current = next(current_voters, None)
+        if current is None or current[0] != ref:
+            yield None, [ref] + columns + [1, min_date, max_date]
+        elif current[2] != 't':
+            yield None, [ref] + columns + [int(current[1]) + 1, report_date,
+                                           max_date]
+        elif current[3:] != columns:
+            version = int(current[1])
+            yield ([ref, version],
+                   [ref] + columns + [version + 1, report_date, max_date])
@@ -6,6 +6,8 @@ import gzip
 from zipfile import ZipFile
 from io import BytesIO, TextIOWrapper
 from datetime import date
+from national_voter_file.transformers.archives import (UnstreamableMember,
+                                                       iter_zip_members)
 from national_voter_file.transformers.base import (DATA_DIR,
                                                    BasePreparer,
                                                    BaseTransformer)
@@ -50,21 +52,35 @@ class StatePreparer(BasePreparer):
         prefix = self.voter_pre
         file_list = [f for f in zip_obj.namelist() if prefix in f and f.endswith('.zip')]
 
+        # Inner zips are streamed rather than read into memory, see
+        # archives.py
         for f in file_list:
-            z_data = ZipFile(BytesIO(zip_obj.read(f)))
-            for z_f in z_data.namelist():
-                with z_data.open(z_f) as zdf:
-                    reader = csv.DictReader(TextIOWrapper(zdf), delimiter=self.sep)
-                    for row in reader:
-                        yield row
+            streamed = set()
+            try:
+                with zip_obj.open(f) as z_data:
+                    for name, zdf in iter_zip_members(z_data):
+                        reader = self.dict_iterator(TextIOWrapper(zdf))
+                        for row in reader:
+                            yield row
+                        streamed.add(name)
+            except UnstreamableMember:
+                # The rest of this zip is read into memory instead
+                z_data = ZipFile(BytesIO(zip_obj.read(f)))
+                for name in z_data.namelist():
+                    if name in streamed:
+                        continue
+                    with z_data.open(name) as zdf:
+                        reader = self.dict_iterator(TextIOWrapper(zdf))
+                        for row in reader:
+                            yield row
 
     def yield_hist_rows(self, zip_obj):
         prefix = self.hist_pre
         file_list = [f for f in zip_obj.namelist() if prefix in f and f.endswith('.gz')]
 
         for f in file_list:
-            with gzip.open(BytesIO(zip_obj.read(f)), 'rt') as gf:
-                reader = csv.DictReader(gf, delimiter=self.sep)
+            with zip_obj.open(f) as gz_data, gzip.open(gz_data, 'rt') as gf:
+                reader = self.dict_iterator(gf)
                 for row in reader:
                     yield row
 
@@ -114,6 +130,17 @@ class StateTransformer(BaseTransformer):
         'ABSENTEE_TYPE': None
     }
 
+    address_component_map = {
+        'ADDRESS_NUMBER': 'HOUSE_NUM',
+        'ADDRESS_NUMBER_SUFFIX': 'HOUSE_SUFFIX',
+        'STREET_NAME_PRE_DIRECTIONAL': 'PRE_DIR',
+        'STREET_NAME': 'STREET_NAME',
+        'STREET_NAME_POST_TYPE': 'STREET_TYPE',
+        'STREET_NAME_POST_DIRECTIONAL': 'POST_DIR',
+        'OCCUPANCY_TYPE': 'UNIT_TYPE',
+        'OCCUPANCY_IDENTIFIER': 'UNIT_NUM'
+    }
+
     #### Demographics methods ##################################################
 
     def extract_gender(self, input_dict):
@@ -129,8 +156,8 @@ class StateTransformer(BaseTransformer):
     #### Address methods #######################################################
 
     def extract_registration_address(self, input_dict):
-        # TODO: Currently parsing with usaddress, but CO has almost all fields,
-        # might be worth just taking as is
+        # CO has almost all fields, so they're taken as is when well-formed
+        # and only parsed with usaddress otherwise
         address_str = ' '.join([
             input_dict['HOUSE_NUM'],
             input_dict['HOUSE_SUFFIX'],
@@ -150,16 +177,17 @@ class StateTransformer(BaseTransformer):
             'RAW_ZIP': input_dict['RESIDENTIAL_ZIP_CODE']
         }
 
-        usaddress_dict = self.usaddress_tag(address_str)[0]
+        converted_addr, validation_status = self.parse_registration_address(
+            input_dict, address_str
+        )
 
-        if usaddress_dict:
-            converted_addr = self.convert_usaddress_dict(usaddress_dict)
+        if converted_addr:
             converted_addr.update(raw_dict)
             converted_addr.update({
                 'PLACE_NAME': input_dict['RESIDENTIAL_CITY'],
                 'STATE_NAME': input_dict['RESIDENTIAL_STATE'],
                 'ZIP_CODE': input_dict['RESIDENTIAL_ZIP_CODE'],
-                'VALIDATION_STATUS': '2'
+                'VALIDATION_STATUS': validation_status
             })
         else:
             converted_addr = self.constructEmptyResidentialAddress()
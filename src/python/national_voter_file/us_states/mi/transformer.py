@@ -8,6 +8,7 @@ from datetime import date
 from national_voter_file.transformers.base import (DATA_DIR,
                                                    BasePreparer,
                                                    BaseTransformer)
+from national_voter_file.transformers.fixed_width import FixedWidthLayout
 import usaddress
 
 __all__ = ['default_file', 'StatePreparer', 'StateTransformer']
@@ -101,6 +102,12 @@ class StatePreparer(BasePreparer):
         if not self.transformer:
             self.transformer = StateTransformer()
 
+        # Read with structs when a file isn't ASCII, see fixed_width.py
+        self.voter_layout = FixedWidthLayout(self.col_indices, use_struct=True)
+        self.election_layout = FixedWidthLayout(self.election_indices)
+        self.history_layout = FixedWidthLayout(self.history_indices,
+                                               use_struct=True)
+
     def process(self):
         """
         Process zip into separate files and use separate history generator for
@@ -122,13 +129,12 @@ class StatePreparer(BasePreparer):
             yield row
 
     def yield_zip_rows(self, zip_obj, input_path):
+        fields = self.transformer.input_fields
         with zip_obj.open(input_path, 'r') as infile:
-            for row in infile:
-                # Use column indices to split rows, yield dict in row format
-                yield dict(zip(
-                    self.transformer.input_fields,
-                    [row[slice(*c)].strip().decode('utf-8') for c in self.col_indices]
-                ))
+            # Use column indices to split rows, yield dict in row format
+            for batch in self.voter_layout.batches(infile):
+                for values in batch:
+                    yield dict(zip(fields, values))
 
     def yield_history_rows(self, input_path, zip_obj=None, elec_code_file=None):
         # For processing zip and raw .lst files
@@ -136,29 +142,27 @@ class StatePreparer(BasePreparer):
             elec_code_file = os.path.join(DATA_DIR, 'Michigan', 'electionscd.lst')
         # Create mapping of election codes and values
         ec_map = {}
-        ei = self.election_indices
-        with open(elec_code_file, 'r') as ec:
-            for row in ec:
-                ec_map[row[slice(*ei[0])].strip()] = {
-                    'ELECTION_DATE': row[slice(*ei[1])],
-                    'ELECTION_TYPE': row[slice(*ei[2])]
+        for batch in self.election_layout.read_file(elec_code_file):
+            for code, election_date, election_type in batch:
+                ec_map[code] = {
+                    'ELECTION_DATE': election_date,
+                    'ELECTION_TYPE': election_type
                 }
 
         if zip_obj is not None:
-            open_f = zip_obj.open
+            with zip_obj.open(input_path, 'r') as infile:
+                for hist_dict in self.yield_history_dicts(
+                        self.history_layout.batches(infile), ec_map):
+                    yield hist_dict
         else:
-            open_f = open
-
-        with open_f(input_path, 'r') as infile:
-            for row in infile:
-                row_vals = []
-                for c in self.history_indices:
-                    val = row[slice(*c)].strip()
-                    if hasattr(val, 'decode'):
-                        val = val.decode('utf-8')
-                    row_vals.append(val)
-
-                hist_dict = dict(zip(self.history_fields, row_vals))
+            for hist_dict in self.yield_history_dicts(
+                    self.history_layout.read_file(input_path), ec_map):
+                yield hist_dict
+
+    def yield_history_dicts(self, batches, ec_map):
+        for batch in batches:
+            for values in batch:
+                hist_dict = dict(zip(self.history_fields, values))
                 el_vals = ec_map[hist_dict.pop('ELECTION_CODE')]
                 hist_dict.update(el_vals)
                 yield hist_dict
@@ -191,6 +195,17 @@ class StateTransformer(BaseTransformer):
         'REGISTRATION_STATUS': 'REGISTRATION_STATUS'
     }
 
+    address_component_map = {
+        'ADDRESS_NUMBER_PREFIX': 'HOUSE_NUM_CHARACTER',
+        'ADDRESS_NUMBER': 'RESIDENCE_STREET_NUMBER',
+        'ADDRESS_NUMBER_SUFFIX': 'HOUSE_SUFFIX',
+        'STREET_NAME_PRE_DIRECTIONAL': 'PRE_DIRECTION',
+        'STREET_NAME': 'STREET_NAME',
+        'STREET_NAME_POST_TYPE': 'STREET_TYPE',
+        'STREET_NAME_POST_DIRECTIONAL': 'SUFFIX_DIRECTION'
+    }
+    address_occupancy_col = 'RESIDENCE_EXTENSION'
+
     input_fields = [
         'LAST_NAME',
         'FIRST_NAME',
@@ -264,10 +279,9 @@ class StateTransformer(BaseTransformer):
 
     def extract_registration_address(self, input_dict):
         """
-        Relies on the usaddress package.
-
-        Call the self.convert_usaddress_dict() method on the output of
-        usaddress.tag. We provide example code in the method to make this clear.
+        Takes the address from its components (see address_component_map)
+        when they're well-formed, and relies on the usaddress package
+        otherwise.
 
         Inputs:
             input_dict: dictionary of form {colname: value} from raw data
@@ -324,16 +338,16 @@ class StateTransformer(BaseTransformer):
             'RAW_ZIP': input_dict['ZIP']
         }
 
-        usaddress_dict = self.usaddress_tag(address_str)[0]
-
-        if usaddress_dict:
-            converted_addr = self.convert_usaddress_dict(usaddress_dict)
+        converted_addr, validation_status = self.parse_registration_address(
+            input_dict, address_str
+        )
 
+        if converted_addr:
             converted_addr.update({
                 'PLACE_NAME': input_dict['CITY'],
                 'STATE_NAME': input_dict['STATE'],
                 'ZIP_CODE': input_dict['ZIP'],
-                'VALIDATION_STATUS': '2'
+                'VALIDATION_STATUS': validation_status
             })
             converted_addr.update(raw_dict)
         else:
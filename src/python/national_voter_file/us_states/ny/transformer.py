@@ -105,6 +105,16 @@ class StateTransformer(BaseTransformer):
 
     }
 
+    # RSTREETNAME includes the street type
+    address_component_map = {
+        'ADDRESS_NUMBER': 'RADDNUMBER',
+        'ADDRESS_NUMBER_SUFFIX': 'RHALFCODE',
+        'STREET_NAME_PRE_DIRECTIONAL': 'RPREDIRECTION',
+        'STREET_NAME': 'RSTREETNAME',
+        'STREET_NAME_POST_DIRECTIONAL': 'RPOSTDIRECTION',
+        'OCCUPANCY_IDENTIFIER': 'RAPARTMENT'
+    }
+
     #### Contact methods #######################################################
 
     def extract_name(self, input_dict):
@@ -165,15 +175,19 @@ class StateTransformer(BaseTransformer):
             'RAW_ZIP': input_dict['RZIP5']
         }
 
-        usaddress_dict = self.usaddress_tag(address_str)[0]
-        if usaddress_dict:
-            converted_addr = self.convert_usaddress_dict(usaddress_dict)
+        converted_addr, validation_status = self.parse_registration_address(
+            input_dict, address_str
+        )
+        if converted_addr:
+            # RAPARTMENT only has the apartment number
+            if validation_status == '3' and converted_addr['OCCUPANCY_IDENTIFIER']:
+                converted_addr['OCCUPANCY_TYPE'] = 'Apt'
 
             converted_addr.update({
                 'PLACE_NAME':input_dict['RCITY'],
                 'STATE_NAME':"NY",
                 'ZIP_CODE':input_dict['RZIP5'],
-                'VALIDATION_STATUS': '2'
+                'VALIDATION_STATUS': validation_status
             })
 
             converted_addr.update(raw_dict)
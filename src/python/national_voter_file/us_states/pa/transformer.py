@@ -2,7 +2,10 @@ import csv
 import os
 import re
 import sys
+import json
 import zipfile
+from io import TextIOWrapper
+from itertools import islice
 
 
 from national_voter_file.transformers.base import (DATA_DIR,
@@ -14,6 +17,99 @@ __all__ = ['default_file', 'StatePreparer', 'StateTransformer']
 
 default_file = 'Statewide.zip'
 
+
+def zip_index_path(input_path):
+    """Returns the path a voter zip file's CityZipIndex is saved to"""
+    return '{}_zip_index.json'.format(os.path.splitext(input_path)[0])
+
+
+def input_signature(input_path):
+    """Returns what's saved with an index to tell if its input has changed"""
+    stat = os.stat(input_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class CityZipIndex(object):
+    """
+    The ZIP codes the voters of each city of each county are registered
+    with, for filling in voters without a ZIP code. It's built from the whole
+    voter file before any voter is transformed, so every voter in a city gets
+    the same ZIP code wherever they are in the file and whichever process
+    transforms them. Cities with more than one ZIP code are ambiguous, and
+    their voters aren't given one.
+
+    It's saved as JSON next to the voter file, and only built again when
+    that changes.
+    """
+    version = 1
+
+    def __init__(self, zips=None):
+        # {county: {city: sorted ZIP codes}}
+        self.zips = zips if zips is not None else {}
+
+    def add(self, county, city, zip_code):
+        zips = self.zips.setdefault(county, {}).setdefault(city, [])
+        if zip_code not in zips:
+            zips.append(zip_code)
+            zips.sort()
+
+    def zip_code(self, county, city):
+        """Returns the only ZIP code of city in county, or None"""
+        zips = self.zips.get(county, {}).get(city)
+        if zips and len(zips) == 1:
+            return zips[0]
+        return None
+
+    @classmethod
+    def scan(cls, zip_file, county_files, fieldnames, sep):
+        """
+        Builds the index from the county files of zip_file, reading them
+        with csv.reader and looking at the city, ZIP code and county only
+        """
+        index = cls()
+        city, zip_code, county = [fieldnames.index(name) for name in
+                                  ['_REGISTRATION_CITY', 'ZIP_CODE',
+                                   'COUNTYCODE']]
+        last = max(city, zip_code, county)
+        for county_file in county_files:
+            with zip_file.open(county_file) as member:
+                reader = csv.reader(TextIOWrapper(member, encoding='utf8',
+                                                  errors='ignore'),
+                                    delimiter=sep)
+                for row in reader:
+                    if len(row) > last and row[zip_code]:
+                        index.add(row[county], row[city], row[zip_code])
+        return index
+
+    @classmethod
+    def load(cls, path, input_path):
+        """
+        Returns the index saved at path for input_path, or None if there
+        isn't one or input_path has changed since
+        """
+        try:
+            with open(path) as index_file:
+                saved = json.load(index_file)
+        except (OSError, ValueError):
+            return None
+        if (saved.get('version') != cls.version or
+                saved.get('input') != input_signature(input_path)):
+            return None
+        return cls(saved['zips'])
+
+    def save(self, path, input_path):
+        """Saves the index for input_path, unless path can't be written"""
+        tmp_path = '{}.tmp'.format(path)
+        try:
+            with open(tmp_path, 'w') as index_file:
+                json.dump({'version': self.version,
+                           'input': input_signature(input_path),
+                           'zips': self.zips}, index_file)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+
 class StatePreparer(BasePreparer):
     """
     This class prepares the data to be parsed by row by the StateTransformer
@@ -46,6 +142,9 @@ class StatePreparer(BasePreparer):
         super(StatePreparer, self).__init__(input_path, *args, **kwargs)
 
         self.voter_zip_file_path = self.input_path
+        # (county file, rows before it) for each county file started, so
+        # checkpoints can say where a row count is in the zip file
+        self.county_starts = []
 
         if not self.transformer:
             self.transformer = StateTransformer()
@@ -54,15 +153,74 @@ class StatePreparer(BasePreparer):
         z = zipfile.ZipFile(self.voter_zip_file_path)
         return self.voters(z)
 
-    def voters(self, zip_file):
-        county_files = [f for f in zip_file.namelist()
-                        if self.voter_file_re.match(f)]
+    def resume(self, position):
+        """
+        Starts from the county file of position without reading the ones
+        before it. Their zones are restored with the transformer.
+        """
+        z = zipfile.ZipFile(self.voter_zip_file_path)
+        return self.voters(z, position)
+
+    def checkpoint(self, rows):
+        county, start = [(county, start) for county, start
+                         in self.county_starts if start <= rows][-1]
+        return {'rows': rows, 'county_file': county,
+                'county_rows': rows - start}
+
+    def partitions(self):
+        """Counties are transformed on their own with their own zones"""
+        with zipfile.ZipFile(self.voter_zip_file_path) as z:
+            # Loaded here so workers get it with the transformer
+            self.load_zip_index(z)
+            return self.county_files(z)
+
+    def process_partition(self, partition):
+        z = zipfile.ZipFile(self.voter_zip_file_path)
+        return self.voters(z, county_files=[partition])
+
+    def partition_size(self, partition):
+        with zipfile.ZipFile(self.voter_zip_file_path) as z:
+            return z.getinfo(partition).file_size
+
+    def county_files(self, zip_file):
+        return [f for f in zip_file.namelist() if self.voter_file_re.match(f)]
+
+    def load_zip_index(self, zip_file):
+        """
+        Gives the transformer the CityZipIndex of the whole voter file,
+        saved next to it or scanned from it, before any voter is transformed
+        """
+        if self.transformer.zip_index is not None:
+            return
+        path = zip_index_path(self.voter_zip_file_path)
+        index = CityZipIndex.load(path, self.voter_zip_file_path)
+        if index is None:
+            index = CityZipIndex.scan(zip_file, self.county_files(zip_file),
+                                      self.transformer.input_fields, self.sep)
+            index.save(path, self.voter_zip_file_path)
+        self.transformer.zip_index = index
+
+    def voters(self, zip_file, position=None, county_files=None):
+        self.load_zip_index(zip_file)
+        if county_files is None:
+            county_files = self.county_files(zip_file)
+        rows = 0
+        if position is not None:
+            county_files = county_files[
+                county_files.index(position['county_file']):
+            ]
+            rows = position['rows'] - position['county_rows']
 
         #one file here, so it doesn't get overwritten, per-county
         for county in county_files:
             self.process_county_zones(zip_file, county)
+            self.county_starts.append((county, rows))
             reader = self.dict_iterator(self.open(zip_file.open(county)))
+            if position is not None and county == position['county_file']:
+                rows += position['county_rows']
+                reader = islice(reader, position['county_rows'], None)
             for row in reader:
+                rows += 1
                 yield row
 
     def process_county_zones(self, zip_handle, county_voter_filename):
@@ -171,13 +329,31 @@ class StateTransformer(BaseTransformer):
         'precinct': 1,
         'precinct_split': 13,
     }
-    zip_cache = {}
+    # Set by the preparer before any row is transformed, see CityZipIndex
+    zip_index = None
+
+    # County zones are loaded by the preparer as it reads each county, which
+    # doesn't make it to worker processes
+    parallel_safe = False
 
     def _set_county_zonetype(self, zonedict, key):
         self.zonecode_column_by_county.setdefault(zonedict['county'], {}).update({
             key: int(zonedict['column'])
         })
 
+    def checkpoint_state(self):
+        # The zip_index is built from the whole file again when resuming
+        return {
+            'zonecode_column_by_county': self.zonecode_column_by_county,
+        }
+
+    def restore_state(self, state):
+        # Shared by the class, so it's updated in place
+        self.zonecode_column_by_county.clear()
+        self.zonecode_column_by_county.update(
+            state['zonecode_column_by_county']
+        )
+
     def load_county_zones(self, reader):
         """
         Loads county-specific "District" column # for district-type columns
@@ -267,14 +443,13 @@ class StateTransformer(BaseTransformer):
             converted_addr = self.convert_usaddress_dict(usaddress_dict)
             converted_addr['VALIDATION_STATUS'] = '2'
 
-        if input_dict['ZIP_CODE']:
-            # cache zip codes for empties
-            self.zip_cache.setdefault(input_dict['_REGISTRATION_CITY'],
-                                      set()).add(input_dict['ZIP_CODE'])
-        else:
-            backup_zips = self.zip_cache.get(input_dict['_REGISTRATION_CITY'])
-            if backup_zips and len(backup_zips) == 1:  #don't use zip if ambiguous
-                input_dict['_MATCH_ZIP_CODE'] = list(backup_zips)[0]
+        if not input_dict['ZIP_CODE'] and self.zip_index is not None:
+            # None if the city's ZIP code is ambiguous
+            backup_zip = self.zip_index.zip_code(
+                input_dict['COUNTYCODE'], input_dict['_REGISTRATION_CITY']
+            )
+            if backup_zip:
+                input_dict['_MATCH_ZIP_CODE'] = backup_zip
         converted_addr.update({
             'PLACE_NAME': input_dict['_REGISTRATION_CITY'],
             'RAW_ADDR1': address_str,